@@ -1,27 +1,17 @@
-from openai import OpenAI
-from flask import jsonify
-from app.models import Preferences,Menu,Conversation,Dish,User,Restaurant
-from app import db
-from app.functions import get_user_desc_string, get_conversation_history, save_message, get_menu_for_chatbot, get_filtered_menu_for_chatbot, get_restaurant_details,count_tokens
+from app import app
+from app.functions import get_user_desc_string, run_in_app_context, get_cached_menu_for_chatbot, get_cached_filtered_menu_for_chatbot, get_cached_compact_menu_for_chatbot, get_cached_matching_dishes_for_chatbot, count_tokens, COMPACT_MENU_HEADER
+from app.chat_context import load_chat_context
+from app.chat_store import save_chat_turn, ChatTurnNotSavedError
+from app.history import get_budgeted_history
+from app.reply_parser import StreamingReplyParser, parse_reply
+from app.ai_client import get_openai_client, get_async_openai_client, record_prompt_usage
+from app.resilience import resilient_completion, resilient_stream, resilient_completion_async, resilient_stream_async, LLMUnavailableError
+from app.response_cache import response_cache, get_response_cache_key
+from app.retrieval import get_dish_index, get_relevant_menu_for_chatbot
+from app.intent_router import route_chat, fallback_reply
 
-    
-def chatbot_chat(user_id: int, rest_id: int, user_input: str, session_id: int, api_key):
-    
-    client = OpenAI(api_key=api_key)
-
-    user = User.query.filter_by(id=user_id).first()
-    user_description = user.user_description
 
-    history = get_conversation_history(user_id, rest_id,session_id)
-
-    filtered_menu = get_filtered_menu_for_chatbot(rest_id, user_id)
-    unfiltered_menu = get_menu_for_chatbot(rest_id)
-    restaurant_details = get_restaurant_details(rest_id)
-
-    messages = [
-    {
-        "role": "system",
-        "content": """
+SYSTEM_PROMPT = """
             You are a restaurant assistant chatbot. Use past chat history, user preferences, and menu details to recommend dishes based on the user's context. Be attentive to allergies and preferences. Stay on topic and be friendly.
             Instructions for Output:
             1.When recommending dishes, return only "dishes" with dish_id values (do not include dish id in text).
@@ -32,42 +22,252 @@ def chatbot_chat(user_id: int, rest_id: int, user_input: str, session_id: int, a
             6.Don't use markup tags.
             7.At any cost do not go out of context of being a restaurant chatbot!
         """
-    },
-    {"role": "system", "content": f"The user description is: {user_description}"},
-    {"role": "system", "content": f"The restaurant details are: {restaurant_details}"},
-    {"role": "system", "content": f"The filtered menu is: {filtered_menu}"},
-    {"role": "system", "content": f"The unfiltered menu is: {unfiltered_menu}"},
-    {
-        "role": "system",
-        "content": """
+
+OUTPUT_FORMAT_PROMPT = """
             If no dishes are needed, return empty list. Always return in JSON format with "text" and "dishes" keys.
             Example: {\"text\": \"Sure, here are the sweet dishes:\", \"dishes\": [{\"dish_id\": 1}, {\"dish_id\": 2}, {\"dish_id\": 3}]
             Im using the output to feed to a function so the response must be constantly in the example format.
         """
-    }
-]
-    messages= history + messages
+
+def build_chat_messages(context, user_input: str, client):
+    """Prompt for one chat turn and the number of leading messages shared by every user of the restaurant.
+
+    Content is ordered from most to least shared (instructions, restaurant, full menu, then the
+    user, then the session) so the provider's prompt cache can reuse the restaurant prefix.
+    Large menus are not sent whole: only the dishes retrieved for this turn follow the history.
+    """
+    rest_id, user_id, menu_version = context.rest_id, context.user_id, context.menu_version
+    index = get_dish_index(rest_id, menu_version) if app.config['RETRIEVAL_ENABLED'] else None
+    use_retrieval = index is not None and len(index) > app.config['RETRIEVAL_MIN_DISHES']
+    if use_retrieval:
+        menu_message = (f"The menu has {len(index)} dishes. Only the ones most relevant to the conversation "
+                        f"are listed with each request.\n{COMPACT_MENU_HEADER}")
+        user_menu = None
+    elif context.menu_encoding == "compact":
+        menu = get_cached_compact_menu_for_chatbot(rest_id, menu_version)
+        user_menu = get_cached_matching_dishes_for_chatbot(rest_id, user_id, menu_version, context.preference_mask)
+        menu_message = f"The menu is: {menu}"
+    else:
+        menu = get_cached_menu_for_chatbot(rest_id, menu_version)
+        user_menu = f"The filtered menu is: {get_cached_filtered_menu_for_chatbot(rest_id, user_id, menu_version, context.preference_mask)}"
+        menu_message = f"The unfiltered menu is: {menu}"
+
+    shared = [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "system", "content": OUTPUT_FORMAT_PROMPT},
+        {"role": "system", "content": f"The restaurant details are: {context.restaurant_details}"},
+        {"role": "system", "content": menu_message},
+    ]
+
+    history = get_budgeted_history(context, client)
+
+    messages = shared + [{"role": "system", "content": f"The user description is: {context.user_description}"}]
+    if user_menu:
+        messages.append({"role": "system", "content": user_menu})
+    messages += history
+    if use_retrieval:
+        messages.append({"role": "system", "content": get_relevant_menu_for_chatbot(index, context.preference_mask, user_input, history)})
     messages.append({"role": "user", "content": user_input})
-    print(count_tokens(messages))
+    return messages, len(shared)
+
+def chatbot_chat(user_id: int, rest_id: int, user_input: str, session_id: int, api_key):
+    """Reply to one chat turn as a ChatReply. API errors propagate to the route."""
+    routed = route_chat(user_id, rest_id, user_input)
+    if routed:
+        save_chat_turn(user_id, rest_id, session_id, user_input, routed)
+        return routed
+
+    context = load_chat_context(user_id, rest_id, session_id)
+    cache_key = get_response_cache_key(context, user_input)
+    cached = response_cache.get(cache_key) if cache_key else None
+    if cached:
+        save_chat_turn(user_id, rest_id, session_id, user_input, cached)
+        return cached
+
+    client = get_openai_client(api_key)
+    messages, shared_count = build_chat_messages(context, user_input, client)
 
     try:
-        chat_completion = client.chat.completions.create(
+        chat_completion = resilient_completion(
+            client, "chat", rest_id=rest_id, user_id=user_id, session_id=session_id,
             messages= messages,
             model ="gpt-4o",
             temperature= 0,
             max_tokens= 2500
         )
-        response = chat_completion.choices[0].message.content.strip()
+    except LLMUnavailableError as e:
+        print(f"Chat model unavailable, answering from the menu: {e}")
+        reply = fallback_reply(user_id, rest_id, user_input)
+        save_chat_turn(user_id, rest_id, session_id, user_input, reply)
+        return reply
+    reply = parse_reply(chat_completion.choices[0].message.content.strip())
+    record_prompt_usage(rest_id, chat_completion.usage, count_tokens(messages[:shared_count]))
+
+    if cache_key and reply.valid:
+        response_cache.set(cache_key, reply)
+    print(reply.raw)
+    save_chat_turn(user_id, rest_id, session_id, user_input, reply)
+    return reply
+
+def chatbot_chat_stream(user_id: int, rest_id: int, user_input: str, session_id: int, api_key):
+    """Streams ("text", delta), ("dishes", dish_ids) and finally ("done", ChatReply) events."""
+    # Answered without the model by the intent router or the response cache
+    cached = route_chat(user_id, rest_id, user_input)
+    if not cached:
+        context = load_chat_context(user_id, rest_id, session_id)
+        cache_key = get_response_cache_key(context, user_input)
+        cached = response_cache.get(cache_key) if cache_key else None
+    if cached:
+        yield "text", cached.text
+        yield "dishes", cached.dish_ids
+        save_chat_turn(user_id, rest_id, session_id, user_input, cached)
+        yield "done", cached
+        return
+
+    parser = StreamingReplyParser()
+    client = get_openai_client(api_key)
+    messages, shared_count = build_chat_messages(context, user_input, client)
+
+    try:
+        stream = resilient_stream(
+            client, "chat_stream", rest_id=rest_id, user_id=user_id, session_id=session_id,
+            messages= messages,
+            model ="gpt-4o",
+            temperature= 0,
+            max_tokens= 2500,
+            stream_options={"include_usage": True}
+        )
+        for chunk in stream:
+            if chunk.usage:
+                record_prompt_usage(rest_id, chunk.usage, count_tokens(messages[:shared_count]))
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if delta:
+                yield from parser.feed(delta)
+    except LLMUnavailableError as e:
+        # Raised before any output was streamed
+        print(f"Chat model unavailable, answering from the menu: {e}")
+        reply = fallback_reply(user_id, rest_id, user_input)
+        yield "text", reply.text
+        yield "dishes", reply.dish_ids
+        save_chat_turn(user_id, rest_id, session_id, user_input, reply)
+        yield "done", reply
+        return
     except Exception as e:
-        return jsonify({"error": "An error occurred while processing your request.", "details": str(e)}), 500
-        
-    save_message(user_id,rest_id,session_id,"user",user_input)
-    print(response)
-    save_message(user_id,rest_id,session_id,"assistant",response)
-    return jsonify({"reply":response}),200
+        save_interrupted_turn(user_id, rest_id, session_id, user_input, parser)
+        yield "error", str(e)
+        return
+
+    reply = parser.close()
+    if cache_key and reply.valid:
+        response_cache.set(cache_key, reply)
+    save_chat_turn(user_id, rest_id, session_id, user_input, reply)
+    yield "done", reply
+
+def save_interrupted_turn(user_id, rest_id, session_id, user_input, parser):
+    """Keep the user message and the part of the reply already streamed when the model fails mid-stream."""
+    try:
+        save_chat_turn(user_id, rest_id, session_id, user_input, parser.close())
+    except ChatTurnNotSavedError:
+        # Logged by save_chat_turn; the client still gets the stream's error event
+        pass
+
+def _prepare_chat(user_id, rest_id, user_input, session_id, api_key):
+    """Database half of a chat turn for the async path: (answer without the model, cache key, messages, shared count)."""
+    routed = route_chat(user_id, rest_id, user_input)
+    if routed:
+        return routed, None, None, 0
+    context = load_chat_context(user_id, rest_id, session_id)
+    cache_key = get_response_cache_key(context, user_input)
+    cached = response_cache.get(cache_key) if cache_key else None
+    if cached:
+        return cached, None, None, 0
+    # History summaries still use the sync client; they run here on the worker thread
+    messages, shared_count = build_chat_messages(context, user_input, get_openai_client(api_key))
+    return None, cache_key, messages, shared_count
+
+async def chatbot_chat_async(user_id: int, rest_id: int, user_input: str, session_id: int, api_key):
+    """chatbot_chat for the ASGI app (asgi.py): the model call is awaited and database work runs on worker threads.
+
+    The caller must have pushed an app context for the configuration and the llm_call inserts.
+    """
+    answered, cache_key, messages, shared_count = await run_in_app_context(_prepare_chat, user_id, rest_id, user_input, session_id, api_key)
+    if answered:
+        await run_in_app_context(save_chat_turn, user_id, rest_id, session_id, user_input, answered)
+        return answered
+
+    try:
+        chat_completion = await resilient_completion_async(
+            get_async_openai_client(api_key), "chat", rest_id=rest_id, user_id=user_id, session_id=session_id,
+            messages= messages,
+            model ="gpt-4o",
+            temperature= 0,
+            max_tokens= 2500
+        )
+    except LLMUnavailableError as e:
+        print(f"Chat model unavailable, answering from the menu: {e}")
+        reply = await run_in_app_context(fallback_reply, user_id, rest_id, user_input)
+        await run_in_app_context(save_chat_turn, user_id, rest_id, session_id, user_input, reply)
+        return reply
+    reply = parse_reply(chat_completion.choices[0].message.content.strip())
+    record_prompt_usage(rest_id, chat_completion.usage, count_tokens(messages[:shared_count]))
+
+    if cache_key and reply.valid:
+        response_cache.set(cache_key, reply)
+    await run_in_app_context(save_chat_turn, user_id, rest_id, session_id, user_input, reply)
+    return reply
+
+async def chatbot_chat_stream_async(user_id: int, rest_id: int, user_input: str, session_id: int, api_key):
+    """chatbot_chat_stream for the ASGI app; yields the same events."""
+    answered, cache_key, messages, shared_count = await run_in_app_context(_prepare_chat, user_id, rest_id, user_input, session_id, api_key)
+    if answered:
+        yield "text", answered.text
+        yield "dishes", answered.dish_ids
+        await run_in_app_context(save_chat_turn, user_id, rest_id, session_id, user_input, answered)
+        yield "done", answered
+        return
+
+    parser = StreamingReplyParser()
+    try:
+        stream = resilient_stream_async(
+            get_async_openai_client(api_key), "chat_stream", rest_id=rest_id, user_id=user_id, session_id=session_id,
+            messages= messages,
+            model ="gpt-4o",
+            temperature= 0,
+            max_tokens= 2500,
+            stream_options={"include_usage": True}
+        )
+        async for chunk in stream:
+            if chunk.usage:
+                record_prompt_usage(rest_id, chunk.usage, count_tokens(messages[:shared_count]))
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if delta:
+                for event in parser.feed(delta):
+                    yield event
+    except LLMUnavailableError as e:
+        print(f"Chat model unavailable, answering from the menu: {e}")
+        reply = await run_in_app_context(fallback_reply, user_id, rest_id, user_input)
+        yield "text", reply.text
+        yield "dishes", reply.dish_ids
+        await run_in_app_context(save_chat_turn, user_id, rest_id, session_id, user_input, reply)
+        yield "done", reply
+        return
+    except Exception as e:
+        await run_in_app_context(save_interrupted_turn, user_id, rest_id, session_id, user_input, parser)
+        yield "error", str(e)
+        return
+
+    reply = parser.close()
+    if cache_key and reply.valid:
+        response_cache.set(cache_key, reply)
+    await run_in_app_context(save_chat_turn, user_id, rest_id, session_id, user_input, reply)
+    yield "done", reply
 
 def create_user_description(user_id: int, api_key: str) -> str:
-    client = OpenAI(api_key=api_key)
+    client = get_openai_client(api_key)
     input_str = get_user_desc_string(user_id)
     messages = [
         {
@@ -80,16 +280,14 @@ def create_user_description(user_id: int, api_key: str) -> str:
         },
         {"role": "user", "content": input_str}
     ]
-    try:
-        response = client.chat.completions.create(
-            messages=messages,
-            model="gpt-3.5-turbo",
-            temperature=0.3,
-            max_tokens=100
-        )
-        return response.choices[0].message.content.strip()
-    except Exception as e:
-        print(f"Error: {e}")
-        return jsonify({"error": str(e)}), 500
+    # Errors propagate so the description job can retry
+    response = resilient_completion(
+        client, "user_description", user_id=user_id,
+        messages=messages,
+        model="gpt-3.5-turbo",
+        temperature=0.3,
+        max_tokens=100
+    )
+    return response.choices[0].message.content.strip()
     
     
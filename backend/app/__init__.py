@@ -7,20 +7,49 @@ from datetime import timedelta
 import os
 from dotenv import load_dotenv
 from app.config import Config
+from app.sqlite_tuning import install_sqlite_pragmas
+from app.db_routing import REPLICA_BIND, RoutingSession, engine_options
 load_dotenv()
 
 
 app = Flask(__name__)
 app.config.from_object(Config)
 CORS(app, supports_credentials=True)
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///db.sqlite3'
+app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get("DATABASE_URL", 'sqlite:///db.sqlite3')
+# Read-only routes (@read_replica, app/db_routing.py) query this database when it is set
+app.config['DATABASE_REPLICA_URL'] = os.environ.get("DATABASE_REPLICA_URL")
+for name in ('DB_POOL_SIZE', 'DB_MAX_OVERFLOW', 'DB_POOL_TIMEOUT', 'DB_POOL_RECYCLE'):
+    if os.environ.get(name):
+        app.config[name] = int(os.environ[name])
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(app.config['SQLALCHEMY_DATABASE_URI'], app.config)
+if app.config['DATABASE_REPLICA_URL']:
+    app.config['SQLALCHEMY_BINDS'] = {REPLICA_BIND: {
+        "url": app.config['DATABASE_REPLICA_URL'],
+        **engine_options(app.config['DATABASE_REPLICA_URL'], app.config),
+    }}
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 app.config['JWT_SECRET_KEY'] = 'Num3R0n4u7s!Num3R0n4u7s!'
 app.config['JWT_ACCESS_TOKEN_EXPIRES'] = timedelta(hours=6)
 app.config['OPENAI_API_KEY'] = os.environ.get("API_KEY")
-db = SQLAlchemy(app)
+# Point at llm_stub.py (e.g. http://127.0.0.1:8001/v1) to run the chat pipeline offline
+app.config['OPENAI_BASE_URL'] = os.environ.get("OPENAI_BASE_URL")
+app.config['QUERY_PROFILER_ENABLED'] = os.environ.get("QUERY_PROFILER") == "1"
+if os.environ.get("DESCRIPTION_WORKERS_ENABLED"):
+    app.config['DESCRIPTION_WORKERS_ENABLED'] = os.environ["DESCRIPTION_WORKERS_ENABLED"] == "1"
+db = SQLAlchemy(app, session_options={"class_": RoutingSession})
+with app.app_context():
+    for engine in db.engines.values():
+        install_sqlite_pragmas(engine, app.config['SQLITE_PRAGMAS'])
 migrate = Migrate(app, db)
 jwt = JWTManager(app)
 
 
-from app import models,routes
\ No newline at end of file
+from app import models,routes
+
+if app.config['QUERY_PROFILER_ENABLED']:
+    from app.query_profiler import init_query_profiler
+    init_query_profiler(app)
+
+if app.config['DESCRIPTION_WORKERS_ENABLED']:
+    from app.description_jobs import init_description_workers
+    init_description_workers(app)
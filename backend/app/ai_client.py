@@ -0,0 +1,148 @@
+import threading
+import time
+import httpx
+import tiktoken
+from openai import OpenAI, AsyncOpenAI
+from app import app
+
+_clients = {}
+_async_clients = {}
+_clients_lock = threading.Lock()
+_prompt_usage = {}
+_prompt_usage_lock = threading.Lock()
+_tokenizers = {}
+_tokenizer_failures = {}
+# Seconds before a tokenizer that failed to load (e.g. offline) is tried again
+_TOKENIZER_RETRY_AFTER = 60.0
+
+
+def get_openai_client(api_key=None) -> OpenAI:
+    """Process-wide OpenAI client, one per API key, sharing a keep-alive connection pool."""
+    api_key = api_key or app.config['OPENAI_API_KEY']
+    if not api_key and app.config['OPENAI_BASE_URL']:
+        # The offline stub accepts any key
+        api_key = "stub"
+    client = _clients.get(api_key)
+    if client is not None:
+        return client
+    with _clients_lock:
+        client = _clients.get(api_key)
+        if client is None:
+            client = OpenAI(
+                api_key=api_key,
+                base_url=app.config['OPENAI_BASE_URL'],
+                timeout=_timeout(),
+                max_retries=app.config['OPENAI_MAX_RETRIES'],
+                http_client=httpx.Client(
+                    timeout=_timeout(),
+                    limits=httpx.Limits(
+                        max_connections=app.config['OPENAI_MAX_CONNECTIONS'],
+                        max_keepalive_connections=app.config['OPENAI_MAX_KEEPALIVE_CONNECTIONS'],
+                        keepalive_expiry=app.config['OPENAI_KEEPALIVE_EXPIRY'],
+                    ),
+                ),
+            )
+            _clients[api_key] = client
+    return client
+
+
+def get_async_openai_client(api_key=None) -> AsyncOpenAI:
+    """AsyncOpenAI counterpart of get_openai_client for the ASGI chat path (asgi.py).
+
+    The connection pool belongs to the event loop that first used it, so call this from the serving loop only.
+    """
+    api_key = api_key or app.config['OPENAI_API_KEY']
+    if not api_key and app.config['OPENAI_BASE_URL']:
+        api_key = "stub"
+    client = _async_clients.get(api_key)
+    if client is None:
+        client = AsyncOpenAI(
+            api_key=api_key,
+            base_url=app.config['OPENAI_BASE_URL'],
+            timeout=_timeout(),
+            max_retries=app.config['OPENAI_MAX_RETRIES'],
+            http_client=httpx.AsyncClient(
+                timeout=_timeout(),
+                limits=httpx.Limits(
+                    max_connections=app.config['OPENAI_ASYNC_MAX_CONNECTIONS'],
+                    max_keepalive_connections=app.config['OPENAI_MAX_KEEPALIVE_CONNECTIONS'],
+                    keepalive_expiry=app.config['OPENAI_KEEPALIVE_EXPIRY'],
+                ),
+            ),
+        )
+        _async_clients[api_key] = client
+    return client
+
+
+def close_openai_clients():
+    with _clients_lock:
+        for client in _clients.values():
+            client.close()
+        _clients.clear()
+
+
+def _timeout():
+    return httpx.Timeout(app.config['OPENAI_TIMEOUT'], connect=app.config['OPENAI_CONNECT_TIMEOUT'])
+
+
+def get_tokenizer(model):
+    """Encoding for the model, loaded once. None when tiktoken cannot load it (e.g. offline).
+
+    Only successful loads are kept; a failed one is retried after _TOKENIZER_RETRY_AFTER seconds.
+    """
+    encoding = _tokenizers.get(model)
+    if encoding is not None:
+        return encoding
+    failed_at = _tokenizer_failures.get(model)
+    if failed_at is not None and time.monotonic() - failed_at < _TOKENIZER_RETRY_AFTER:
+        return None
+    try:
+        encoding_name = tiktoken.encoding_name_for_model(model)
+    except KeyError:
+        encoding_name = "o200k_base" if model.startswith(("gpt-4o", "o1", "o3")) else "cl100k_base"
+    try:
+        encoding = tiktoken.get_encoding(encoding_name)
+    except Exception as e:
+        _tokenizer_failures[model] = time.monotonic()
+        print(f"Tokenizer for {model} unavailable, approximating token counts: {e}")
+        return None
+    _tokenizers[model] = encoding
+    _tokenizer_failures.pop(model, None)
+    return encoding
+
+
+def record_prompt_usage(rest_id, usage, shared_prefix_tokens=None):
+    """Track how much of each prompt the provider served from its prompt cache."""
+    if usage is None:
+        return
+    prompt_tokens = usage.prompt_tokens or 0
+    details = getattr(usage, "prompt_tokens_details", None)
+    cached_tokens = (getattr(details, "cached_tokens", None) or 0) if details else 0
+    print(f"Prompt tokens for restaurant {rest_id}: {prompt_tokens} "
+          f"({cached_tokens} cached, {prompt_tokens - cached_tokens} new, shared prefix {shared_prefix_tokens})")
+    with _prompt_usage_lock:
+        stats = _prompt_usage.setdefault(rest_id, {"calls": 0, "prompt_tokens": 0, "cached_tokens": 0})
+        stats["calls"] += 1
+        stats["prompt_tokens"] += prompt_tokens
+        stats["cached_tokens"] += cached_tokens
+
+
+def prompt_usage_stats():
+    with _prompt_usage_lock:
+        restaurants = {
+            rest_id: {
+                **stats,
+                "new_tokens": stats["prompt_tokens"] - stats["cached_tokens"],
+                "cached_ratio": round(stats["cached_tokens"] / stats["prompt_tokens"], 4) if stats["prompt_tokens"] else 0.0,
+            }
+            for rest_id, stats in _prompt_usage.items()
+        }
+    prompt_tokens = sum(stats["prompt_tokens"] for stats in restaurants.values())
+    cached_tokens = sum(stats["cached_tokens"] for stats in restaurants.values())
+    return {
+        "prompt_tokens": prompt_tokens,
+        "cached_tokens": cached_tokens,
+        "new_tokens": prompt_tokens - cached_tokens,
+        "cached_ratio": round(cached_tokens / prompt_tokens, 4) if prompt_tokens else 0.0,
+        "restaurants": restaurants,
+    }
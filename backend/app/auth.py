@@ -0,0 +1,27 @@
+from functools import wraps
+from flask import jsonify
+from flask_jwt_extended import get_jwt, verify_jwt_in_request
+
+# Roles carried in the "role" claim of access tokens. Logins issue USER and RESTAURANT tokens;
+# ADMIN tokens are minted by operators, e.g. create_access_token(identity=..., additional_claims={"role": ADMIN})
+USER = 'user'
+RESTAURANT = 'restaurant'
+ADMIN = 'admin'
+
+
+def current_role():
+    """Role of the verified token. Tokens from before roles were added belong to users."""
+    return get_jwt().get('role', USER)
+
+
+def role_required(*roles):
+    """jwt_required() that also answers 403 when the token's role is not one of roles."""
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            verify_jwt_in_request()
+            if current_role() not in roles:
+                return jsonify({"message": "This account is not allowed to do that."}), 403
+            return view(*args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,71 @@
+from collections import namedtuple
+from dataclasses import dataclass
+from app import db
+from app.models import User, Preferences, Restaurant, Conversation, ConversationSummary
+from app.functions import format_restaurant_details
+from app.menu_cache import MENU_ENCODINGS
+
+ChatMessage = namedtuple("ChatMessage", ["id", "role", "content"])
+
+
+@dataclass(frozen=True)
+class ChatContext:
+    """Everything one chat turn needs from the database, loaded up front by load_chat_context."""
+    user_id: int
+    rest_id: int
+    session_id: int
+    user_description: str
+    preference_mask: int
+    # Free-text preference (e.g. allergies) the user entered, folded into user_description
+    preference_text: str
+    restaurant_details: str
+    menu_version: int
+    menu_encoding: str
+    summary: str
+    last_summarized_id: int
+    # Turns after the summary, oldest first
+    messages: tuple
+
+    @property
+    def is_first_turn(self):
+        return not self.summary and not self.messages
+
+
+def load_chat_context(user_id, rest_id, session_id):
+    """Load a ChatContext in two queries: restaurant with user, preferences and summary, then the unsummarized turns."""
+    summary_filter = (ConversationSummary.user_id == user_id, ConversationSummary.rest_id == rest_id,
+                      ConversationSummary.session_id == session_id)
+    row = (db.session.query(
+        Restaurant,
+        db.session.query(User.user_description).filter(User.id == user_id).scalar_subquery(),
+        db.session.query(Preferences.dietary_mask).filter(Preferences.user_id == user_id).limit(1).scalar_subquery(),
+        db.session.query(Preferences.preference).filter(Preferences.user_id == user_id).limit(1).scalar_subquery(),
+        db.session.query(ConversationSummary.summary).filter(*summary_filter).scalar_subquery(),
+        db.session.query(ConversationSummary.last_message_id).filter(*summary_filter).scalar_subquery(),
+    ).filter(Restaurant.id == rest_id).first())
+    if row is None:
+        rest = description = mask = preference = summary = last_summarized = None
+    else:
+        rest, description, mask, preference, summary, last_summarized = row
+
+    last_summarized = last_summarized or 0
+    turns = (db.session.query(Conversation.id, Conversation.role, Conversation.content)
+             .filter(Conversation.user_id == user_id, Conversation.rest_id == rest_id,
+                     Conversation.session_id == session_id, Conversation.id > last_summarized)
+             .order_by(Conversation.id.asc())
+             .all())
+
+    return ChatContext(
+        user_id=user_id,
+        rest_id=rest_id,
+        session_id=session_id,
+        user_description=description,
+        preference_mask=mask or 0,
+        preference_text=preference or "",
+        restaurant_details=format_restaurant_details(rest),
+        menu_version=(rest.menu_version or 0) if rest else 0,
+        menu_encoding=(rest.menu_encoding or MENU_ENCODINGS[0]) if rest else MENU_ENCODINGS[0],
+        summary=summary or "",
+        last_summarized_id=last_summarized,
+        messages=tuple(ChatMessage(turn.id, turn.role, turn.content or "") for turn in turns),
+    )
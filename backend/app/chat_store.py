@@ -0,0 +1,186 @@
+import atexit
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from flask import current_app
+from app import app, db
+from app.models import Conversation, ConversationDish, Order
+from app.reply_parser import ChatReply, parse_reply
+
+
+def _add_turns(turns):
+    """Add the messages of each (user_id, rest_id, session_id, user_input, reply) turn to db.session.
+
+    The recommended dishes of all replies go in with one executemany after the flush that assigns
+    the message ids, which is cheaper than an ORM object per dish.
+    """
+    replies = []
+    for user_id, rest_id, session_id, user_input, reply in turns:
+        if not isinstance(reply, ChatReply):
+            reply = parse_reply(reply)
+        message = Conversation(user_id=user_id, rest_id=rest_id, role="assistant", content=reply.text, session_id=session_id)
+        db.session.add(Conversation(user_id=user_id, rest_id=rest_id, role="user", content=user_input, session_id=session_id))
+        db.session.add(message)
+        replies.append((message, reply.dish_ids))
+    db.session.flush()
+    rows = [{"conversation_id": message.id, "position": position, "dish_id": dish_id}
+            for message, dish_ids in replies for position, dish_id in enumerate(dish_ids)]
+    if rows:
+        db.session.execute(ConversationDish.__table__.insert(), rows)
+
+
+def write_chat_turn(user_id, rest_id, session_id, user_input, reply):
+    """Store the user message and the reply in one transaction, so neither is kept without the other."""
+    try:
+        _add_turns([(user_id, rest_id, session_id, user_input, reply)])
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+
+class ChatTurnNotSavedError(Exception):
+    """The chat turn could not be stored, e.g. because its session, user or restaurant row is missing."""
+
+
+def chat_session_exists(user_id, rest_id, session_id):
+    """Whether session_id is an order of this user at this restaurant, so the turn's foreign keys hold."""
+    return (db.session.query(Order.id)
+            .filter_by(session_id=session_id, user_id=user_id, restaurant_id=rest_id)
+            .first()) is not None
+
+
+def save_chat_turn(user_id, rest_id, session_id, user_input, reply):
+    """Persist one chat turn, through the write-behind buffer when CHAT_WRITE_BEHIND is on.
+
+    Raises ChatTurnNotSavedError when the turn cannot be stored, so the caller can report it.
+    Returns True once the turn is stored (or queued, when the buffer does not wait).
+    """
+    try:
+        if not app.config['CHAT_WRITE_BEHIND']:
+            write_chat_turn(user_id, rest_id, session_id, user_input, reply)
+            return True
+        future = get_chat_write_buffer().submit(user_id, rest_id, session_id, user_input, reply)
+        if app.config['CHAT_WRITE_BEHIND_WAIT']:
+            future.result()
+        return True
+    except Exception as e:
+        app.logger.exception(f"Error saving chat turn for session {session_id}")
+        raise ChatTurnNotSavedError(f"Chat turn for session {session_id} was not saved: {e}") from e
+
+
+class ChatWriteBuffer:
+    """Groups chat turns from concurrent sessions into one commit.
+
+    A single writer thread takes whatever turns are queued (up to max_batch, waiting at most
+    max_delay seconds for more once the first arrives) and commits them together. Each submit
+    returns a Future resolved when its turn is committed. A batch that fails is retried turn by
+    turn so one bad turn does not lose the others.
+    """
+
+    def __init__(self, flask_app, max_batch=64, max_delay=0.005):
+        self.flask_app = flask_app
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.batches = 0
+        self.turns = 0
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="chat-writer", daemon=True)
+        self._thread.start()
+
+    def submit(self, user_id, rest_id, session_id, user_input, reply):
+        future = Future()
+        self._queue.put(((user_id, rest_id, session_id, user_input, reply), future))
+        return future
+
+    def flush(self, timeout=None):
+        """Block until everything submitted so far is committed."""
+        marker = Future()
+        self._queue.put((None, marker))
+        return marker.result(timeout)
+
+    def stats(self):
+        return {"batches": self.batches, "turns": self.turns, "queued": self._queue.qsize(),
+                "turns_per_batch": round(self.turns / self.batches, 2) if self.batches else 0.0}
+
+    def _take_batch(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_delay
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._take_batch()
+            turns = [(turn, future) for turn, future in batch if turn is not None]
+            try:
+                with self.flask_app.app_context():
+                    self._write(turns)
+            except Exception as e:
+                print(f"Chat writer error: {e}")
+                for _, future in turns:
+                    if not future.done():
+                        future.set_exception(e)
+            for turn, future in batch:
+                if turn is None:
+                    future.set_result(True)
+
+    def _write(self, turns):
+        if not turns:
+            return
+        try:
+            _add_turns([turn for turn, _ in turns])
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            for turn, future in turns:
+                try:
+                    write_chat_turn(*turn)
+                except Exception as e:
+                    # Nobody waits on the future without CHAT_WRITE_BEHIND_WAIT, so log it here too
+                    self.flask_app.logger.exception(f"Error saving chat turn for session {turn[2]}")
+                    future.set_exception(e)
+                else:
+                    future.set_result(True)
+        else:
+            for _, future in turns:
+                future.set_result(True)
+        self.batches += 1
+        self.turns += len(turns)
+
+
+_buffers = {}
+_buffers_lock = threading.Lock()
+
+
+def get_chat_write_buffer():
+    """The write-behind buffer of the current Flask app, started on first use."""
+    flask_app = current_app._get_current_object()
+    with _buffers_lock:
+        buffer = _buffers.get(flask_app)
+        if buffer is None:
+            buffer = ChatWriteBuffer(flask_app, app.config['CHAT_WRITE_BATCH_SIZE'], app.config['CHAT_WRITE_MAX_DELAY'])
+            _buffers[flask_app] = buffer
+            if len(_buffers) == 1:
+                atexit.register(flush_chat_writes, 5.0)
+        return buffer
+
+
+def flush_chat_writes(timeout=None):
+    """Wait for every buffered turn to be committed, e.g. before the process exits."""
+    with _buffers_lock:
+        buffers = list(_buffers.values())
+    for buffer in buffers:
+        buffer.flush(timeout)
+
+
+def chat_write_stats():
+    with _buffers_lock:
+        buffers = list(_buffers.values())
+    return [buffer.stats() for buffer in buffers]
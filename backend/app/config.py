@@ -2,4 +2,79 @@ class Config:
     USER_PROFILE_PICTURE_PATH= './files/user_profile_pictures/'
     RESTAURANT_PROFILE_PICTURE_PATH = './files/restaurant_profile_pictures/'
     RESTAURANT_BANNER_PATH = './files/banner_pictures/'
-    DISH_IMAGE_PATH = './files/dish_pictures/'
\ No newline at end of file
+    DISH_IMAGE_PATH = './files/dish_pictures/'
+    # Connection pool of the primary and replica engines, not used by in-memory SQLite. The
+    # DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_TIMEOUT and DB_POOL_RECYCLE environment variables override them
+    DB_POOL_SIZE = 10
+    DB_MAX_OVERFLOW = 20
+    DB_POOL_TIMEOUT = 30
+    DB_POOL_RECYCLE = 1800
+    DB_POOL_PRE_PING = True
+    # Run on every new SQLite connection (app/sqlite_tuning.py). WAL lets readers and one writer
+    # work at once, busy_timeout (ms) waits for the write lock instead of failing with "database
+    # is locked", a negative cache_size is in KiB
+    SQLITE_PRAGMAS = {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "busy_timeout": 5000,
+        "foreign_keys": "ON",
+        "cache_size": -20000,
+        "mmap_size": 268435456,
+    }
+    # Chat history sent to the model: older turns beyond the budget are folded into a summary
+    HISTORY_TOKEN_BUDGET = 2000
+    HISTORY_RECENT_TOKEN_TARGET = 1000
+    HISTORY_SUMMARY_MODEL = 'gpt-3.5-turbo'
+    HISTORY_SUMMARY_MAX_TOKENS = 250
+    # Shared OpenAI client (app/ai_client.py)
+    OPENAI_TIMEOUT = 60.0
+    OPENAI_CONNECT_TIMEOUT = 5.0
+    # Retries are done by app/resilience.py, within the call deadline
+    OPENAI_MAX_RETRIES = 0
+    OPENAI_MAX_CONNECTIONS = 100
+    OPENAI_MAX_KEEPALIVE_CONNECTIONS = 20
+    OPENAI_KEEPALIVE_EXPIRY = 30.0
+    # One event loop holds every open chat under asgi.py, so its pool is larger
+    OPENAI_ASYNC_MAX_CONNECTIONS = 500
+    # Replies to repeated context-free questions (app/response_cache.py)
+    RESPONSE_CACHE_ENABLED = True
+    RESPONSE_CACHE_TTL = 600
+    RESPONSE_CACHE_MAX_ENTRIES = 1000
+    # Menus with more dishes than this only send the top-k dishes retrieved for each turn (app/retrieval.py)
+    RETRIEVAL_ENABLED = True
+    RETRIEVAL_MIN_DISHES = 60
+    RETRIEVAL_TOP_K = 25
+    # Chat turn persistence (app/chat_store.py). With CHAT_WRITE_BEHIND turns from concurrent
+    # sessions share one commit; without CHAT_WRITE_BEHIND_WAIT the request does not wait for it
+    CHAT_WRITE_BEHIND = False
+    CHAT_WRITE_BEHIND_WAIT = True
+    CHAT_WRITE_BATCH_SIZE = 64
+    CHAT_WRITE_MAX_DELAY = 0.005
+    # Per request SQL profiling (app/query_profiler.py), switched on with QUERY_PROFILER=1. The
+    # X-Query-* headers are always added in debug mode; QUERY_PROFILER_HEADERS adds them everywhere
+    QUERY_PROFILER_HEADERS = False
+    QUERY_PROFILER_N_PLUS_ONE_THRESHOLD = 5
+    # Background user description generation (app/description_jobs.py). The workers start with the
+    # first request a process serves; DESCRIPTION_WORKERS_ENABLED=0 in the environment turns them off.
+    # A running job whose claim is older than the lease is taken to belong to a dead process
+    DESCRIPTION_WORKERS_ENABLED = True
+    DESCRIPTION_WORKERS = 2
+    DESCRIPTION_JOB_MAX_ATTEMPTS = 5
+    DESCRIPTION_JOB_RETRY_BASE = 5.0
+    DESCRIPTION_JOB_POLL_INTERVAL = 10.0
+    DESCRIPTION_JOB_LEASE_TIMEOUT = 300.0
+    # Menu, dietary and price requests answered from the Dish table without the model (app/intent_router.py)
+    INTENT_ROUTER_ENABLED = True
+    INTENT_ROUTER_THRESHOLD = 0.85
+    INTENT_ROUTER_MAX_DISHES = 50
+    # Deadlines, retries, hedging and circuit breaking of model calls (app/resilience.py)
+    LLM_DEADLINE = 30.0
+    LLM_MAX_ATTEMPTS = 3
+    LLM_RETRY_BASE_DELAY = 0.5
+    LLM_RETRY_MAX_DELAY = 4.0
+    # Seconds after which a second identical request is sent for non-streamed calls; None disables hedging.
+    # The first request runs on the caller's thread, the LLM_HEDGE_WORKERS pool only runs the second ones
+    LLM_HEDGE_AFTER = None
+    LLM_HEDGE_WORKERS = 8
+    LLM_BREAKER_FAILURE_THRESHOLD = 5
+    LLM_BREAKER_RESET_TIMEOUT = 30.0
@@ -0,0 +1,47 @@
+from functools import wraps
+from flask import g, has_request_context
+from flask_sqlalchemy.session import Session
+from sqlalchemy.engine import make_url
+from sqlalchemy.sql.dml import UpdateBase
+
+# SQLALCHEMY_BINDS key of the read replica, set from DATABASE_REPLICA_URL
+REPLICA_BIND = "replica"
+
+
+def engine_options(url, config):
+    """Pool settings from config for the engine of url. In-memory SQLite has a single static connection."""
+    url = make_url(url)
+    if url.get_backend_name() == "sqlite" and url.database in (None, "", ":memory:"):
+        return {}
+    return {
+        "pool_size": config['DB_POOL_SIZE'],
+        "max_overflow": config['DB_MAX_OVERFLOW'],
+        "pool_timeout": config['DB_POOL_TIMEOUT'],
+        "pool_recycle": config['DB_POOL_RECYCLE'],
+        "pool_pre_ping": config['DB_POOL_PRE_PING'],
+    }
+
+
+class RoutingSession(Session):
+    """db.session that runs the reads of @read_replica views on the replica bind.
+
+    Flushes and INSERT/UPDATE/DELETE statements always go to the primary, and once a request
+    has written, its later reads stay on the primary so they see the write.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and has_request_context() and g.get("db_read_replica"):
+            if self._flushing or isinstance(clause, UpdateBase):
+                g.db_read_replica = False
+            elif REPLICA_BIND in self._db.engines:
+                return self._db.engines[REPLICA_BIND]
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def read_replica(view):
+    """Serve the queries of view from the replica when DATABASE_REPLICA_URL is set, else from the primary."""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        g.db_read_replica = True
+        return view(*args, **kwargs)
+    return wrapper
@@ -0,0 +1,169 @@
+import random
+import threading
+from datetime import datetime, timedelta
+import pytz
+from sqlalchemy.orm import aliased
+from app import app, db
+from app.models import User, DescriptionJob
+
+ist = pytz.timezone('Asia/Kolkata')
+
+_wake = threading.Event()
+_stop = threading.Event()
+_workers = []
+_workers_lock = threading.Lock()
+
+
+def _now():
+    return datetime.now(ist)
+
+
+def enqueue_description_job(user_id):
+    """Queue a description refresh in the caller's transaction. Repeated edits share one pending job."""
+    job = DescriptionJob.query.filter_by(user_id=user_id, status='pending').first()
+    if job:
+        # The job reads preferences when it runs, so the latest edit is always picked up
+        job.run_after = _now()
+        job.attempts = 0
+        return job
+    job = DescriptionJob(user_id=user_id, status='pending', run_after=_now())
+    db.session.add(job)
+    return job
+
+
+def notify_description_workers():
+    """Wake idle workers after the enqueuing transaction has committed."""
+    _wake.set()
+
+
+def claim_next_job():
+    """Atomically move the oldest due pending job to running. Returns its id or None."""
+    running = aliased(DescriptionJob)
+    # One job per user at a time, so an older job can never overwrite a newer description
+    busy = (db.session.query(running.id)
+            .filter(running.user_id == DescriptionJob.user_id, running.status == 'running')
+            .exists())
+    candidates = (db.session.query(DescriptionJob.id)
+                  .filter(DescriptionJob.status == 'pending', DescriptionJob.run_after <= _now(), ~busy)
+                  .order_by(DescriptionJob.run_after, DescriptionJob.id)
+                  .limit(5)
+                  .all())
+    for (job_id,) in candidates:
+        claimed = (DescriptionJob.query
+                   .filter_by(id=job_id, status='pending')
+                   .update({DescriptionJob.status: 'running', DescriptionJob.attempts: DescriptionJob.attempts + 1,
+                            DescriptionJob.claimed_at: _now(), DescriptionJob.updated_at: _now()},
+                           synchronize_session=False))
+        db.session.commit()
+        if claimed:
+            return job_id
+    return None
+
+
+def run_description_job(job_id, generate):
+    job = db.session.get(DescriptionJob, job_id)
+    if job is None:
+        return
+    user = db.session.get(User, job.user_id)
+    if user is None:
+        db.session.delete(job)
+        db.session.commit()
+        return
+    try:
+        description = generate(user.id)
+    except Exception as e:
+        db.session.rollback()
+        job = db.session.get(DescriptionJob, job_id)
+        job.last_error = str(e)[:200]
+        if job.attempts >= app.config['DESCRIPTION_JOB_MAX_ATTEMPTS']:
+            job.status = 'failed'
+            print(f"Description job {job_id} for user {job.user_id} failed after {job.attempts} attempts: {e}")
+        else:
+            # Exponential backoff with jitter so retries of many jobs do not line up
+            delay = app.config['DESCRIPTION_JOB_RETRY_BASE'] * 2 ** (job.attempts - 1)
+            job.status = 'pending'
+            job.run_after = _now() + timedelta(seconds=delay * random.uniform(0.5, 1.5))
+            print(f"Description job {job_id} for user {job.user_id} failed, retrying in about {delay}s: {e}")
+        db.session.commit()
+        return
+
+    user.user_description = description
+    job.status = 'done'
+    job.last_error = None
+    db.session.commit()
+
+
+def requeue_stale_jobs():
+    """Make running jobs whose lease ran out pending again: the process that claimed them died.
+
+    Jobs claimed within DESCRIPTION_JOB_LEASE_TIMEOUT may belong to another live process and are left alone.
+    """
+    expired = _now() - timedelta(seconds=app.config['DESCRIPTION_JOB_LEASE_TIMEOUT'])
+    requeued = (DescriptionJob.query
+                .filter(DescriptionJob.status == 'running',
+                        (DescriptionJob.claimed_at == None) | (DescriptionJob.claimed_at < expired))
+                .update({DescriptionJob.status: 'pending', DescriptionJob.run_after: _now()},
+                        synchronize_session=False))
+    db.session.commit()
+    return requeued
+
+
+def _worker_loop():
+    from ai import create_user_description
+
+    def generate(user_id):
+        return create_user_description(user_id, app.config['OPENAI_API_KEY'])
+
+    while not _stop.is_set():
+        _wake.clear()
+        with app.app_context():
+            try:
+                job_id = claim_next_job()
+                if job_id is not None:
+                    run_description_job(job_id, generate)
+                    continue
+                requeued = requeue_stale_jobs()
+                if requeued:
+                    print(f"Requeued {requeued} description jobs whose lease expired")
+                    continue
+            except Exception as e:
+                db.session.rollback()
+                print(f"Description worker error: {e}")
+        _wake.wait(app.config['DESCRIPTION_JOB_POLL_INTERVAL'])
+
+
+def start_description_workers(count=None):
+    """Start the local worker pool. Safe to call more than once.
+
+    No database work happens here, so this can run inside a request; idle workers requeue the jobs
+    of dead processes.
+    """
+    count = app.config['DESCRIPTION_WORKERS'] if count is None else count
+    with _workers_lock:
+        if _workers:
+            return
+        _stop.clear()
+        for number in range(count):
+            worker = threading.Thread(target=_worker_loop, name=f"description-worker-{number}", daemon=True)
+            worker.start()
+            _workers.append(worker)
+
+
+def _start_on_first_request():
+    if not _workers and not _stop.is_set():
+        start_description_workers()
+
+
+def init_description_workers(flask_app):
+    """Start the workers with the first request flask_app serves. CLI commands and the debug
+    reloader's watcher process never serve one, so they run no workers. Opt-out: DESCRIPTION_WORKERS_ENABLED."""
+    flask_app.before_request(_start_on_first_request)
+
+
+def stop_description_workers(timeout=None):
+    with _workers_lock:
+        _stop.set()
+        _wake.set()
+        for worker in _workers:
+            worker.join(timeout)
+        _workers.clear()
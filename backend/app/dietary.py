@@ -0,0 +1,55 @@
+from sqlalchemy import case
+
+# Dietary attributes packed into one integer so "dish satisfies user" becomes
+# (dish_mask & required_mask) == required_mask, which SQL can evaluate directly.
+LACTOSE_FREE = 1 << 0
+HALAL = 1 << 1
+VEGAN = 1 << 2
+VEGETARIAN = 1 << 3
+GLUTEN_FREE = 1 << 4
+JAIN = 1 << 5
+SOY_FREE = 1 << 6
+
+DISH_FLAGS = {
+    "is_lactose_free": LACTOSE_FREE,
+    "is_halal": HALAL,
+    "is_vegan": VEGAN,
+    "is_vegetarian": VEGETARIAN,
+    "is_gluten_free": GLUTEN_FREE,
+    "is_jain": JAIN,
+    "is_soy_free": SOY_FREE,
+}
+
+# Preferences column -> dish bit the user needs
+PREFERENCE_FLAGS = {
+    "is_lactose_intolerant": LACTOSE_FREE,
+    "is_halal": HALAL,
+    "is_vegan": VEGAN,
+    "is_vegetarian": VEGETARIAN,
+    "is_allergic_to_gluten": GLUTEN_FREE,
+    "is_jain": JAIN,
+}
+
+
+def pack_flags(obj, flags):
+    mask = 0
+    for attr, bit in flags.items():
+        if getattr(obj, attr, None):
+            mask |= bit
+    return mask
+
+
+def dish_mask(dish):
+    return pack_flags(dish, DISH_FLAGS)
+
+
+def preference_mask(pref):
+    return pack_flags(pref, PREFERENCE_FLAGS) if pref else 0
+
+
+def mask_sql_expression(table, flags):
+    """SQL expression rebuilding the mask from the boolean columns, used for backfills."""
+    expr = 0
+    for attr, bit in flags.items():
+        expr = expr + case((getattr(table.c, attr) == True, bit), else_=0)
+    return expr
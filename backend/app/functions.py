@@ -1,5 +1,6 @@
-from app.models import User, Preferences, Restaurant, Menu, Dish, Theme, Conversation,Cart
-from app import db
+from app.models import User, Preferences, Menu, Dish, Theme, Conversation,Cart, ConversationDish, Order, OrderItem
+from app import app, db
+import asyncio
 import secrets
 import base64
 import hashlib
@@ -7,40 +8,32 @@ import os
 import string
 import random
 from datetime import datetime
-import re
-import tiktoken
-import json
-
-def format_response(response):
-    match = re.search(r'"text":\s*"([^"]*)"', response)
-    if match:
-        text_value = match.group(1)
-    else:
-        return None
-    return text_value
+from sqlalchemy import func, distinct, and_, or_
+from sqlalchemy.orm import selectinload
+from app.menu_cache import get_cached_menu_prompt
+from app.ai_client import get_tokenizer
+from app.reply_parser import ChatReply, parse_reply
+from app.dietary import DISH_FLAGS, PREFERENCE_FLAGS, mask_sql_expression, preference_mask
 
 def save_message(user_id, rest_id,session_id, role, content):
+    """Store one message; assistant messages take the ChatReply parsed from the model output.
+
+    Chat replies go through app.chat_store.save_chat_turn so both sides of a turn commit together.
+    """
     try:
         if role == 'assistant':
-            json_data = json.loads(content)['dishes']
-            print(json_data)
-            dish_ids = [item['dish_id'] for item in json_data]
-            db.session.add(Conversation(user_id=user_id, rest_id=rest_id, role=role, content=format_response(content),session_id = session_id, dish_ids=dish_ids))
+            reply = content if isinstance(content, ChatReply) else parse_reply(content)
+            db.session.add(Conversation(user_id=user_id, rest_id=rest_id, role=role, content=reply.text,session_id = session_id, dish_ids=list(reply.dish_ids)))
             db.session.commit()
         else:
             dish_ids = []
             db.session.add(Conversation(user_id=user_id, rest_id=rest_id, role=role, content=content,session_id = session_id, dish_ids=dish_ids))
             db.session.commit()
-    except:
+    except Exception as e:
         db.session.rollback()
+        print(f"Error saving {role} message for session {session_id}: {e}")
 
-def get_conversation_history(user_id,rest_id,session_id):
-    conversations = Conversation.query.filter_by(user_id=user_id,rest_id=rest_id,session_id=session_id).all()
-    return [{"role": convo.role, "content": convo.content} for convo in conversations]
-
-def get_restaurant_details(rest_id: int) -> str:
-    rest = Restaurant.query.filter_by(id=rest_id).first()
-    
+def format_restaurant_details(rest):
     if not rest:
         return "Restaurant not found."
 
@@ -52,15 +45,16 @@ def get_restaurant_details(rest_id: int) -> str:
 
 def get_filtered_menu_for_chatbot(rest_id, user_id):
     menus = Menu.query.filter_by(restaurant_id=rest_id).all()
+    dishes_by_menu = {}
+    for dish in get_dishes_for_user(user_id, rest_id=rest_id):
+        dishes_by_menu.setdefault(dish.menu_id, []).append(dish)
     menu_details = "Here is the menu based on your preferences:\n\n"
     for menu in menus:
         menu_details += (
             f"Menu ID: {menu.id}\n"
             f"Menu Name: {menu.menu_type or 'No name provided'}\n\n"
         )
-        all_dishes = Dish.query.filter_by(menu_id=menu.id).all()
-        filtered_dish_ids = sort_user_preferences(user_id, menu.id)
-        filtered_dishes = [dish for dish in all_dishes if dish.id in filtered_dish_ids]
+        filtered_dishes = dishes_by_menu.get(menu.id, [])
         if not filtered_dishes:
             menu_details += "No dishes available for this menu based on your preferences.\n\n"
             continue
@@ -76,7 +70,7 @@ def get_filtered_menu_for_chatbot(rest_id, user_id):
                 f"{'Lactose-Free' if dish.is_lactose_free else 'Not Lacto-Free'}, "
                 f"{'Halal' if dish.is_halal else 'Not Halal'}, "
                 f"{'Vegan' if dish.is_vegan else 'Not Vegan'}, "
-                f"{'Vegetarian' if dish.is_vegetarian else 'Vegetarian'}, "
+                f"{'Vegetarian' if dish.is_vegetarian else 'Not Vegetarian'}, "
                 f"{'Gluten-Free' if dish.is_gluten_free else 'Not Gluten-Free'}, "
                 f"{'Jain' if dish.is_jain else 'Not Jain'}, "
                 f"{'Soy-Free' if dish.is_soy_free else 'Not Soy-Free'}\n"
@@ -85,7 +79,7 @@ def get_filtered_menu_for_chatbot(rest_id, user_id):
     return menu_details.strip()
 
 def get_menu_for_chatbot(rest_id):
-    menus = Menu.query.filter_by(restaurant_id=rest_id).all()
+    menus = Menu.query.filter_by(restaurant_id=rest_id).options(selectinload(Menu.dishes)).all()
     
     if not menus:
         return "No menus found for this restaurant."
@@ -98,7 +92,7 @@ def get_menu_for_chatbot(rest_id):
             f"Menu ID: {menu.id}\n"
             f"Menu Name: {menu.menu_type or 'Unnamed Menu'}\n\n"
         )
-        all_dishes = Dish.query.filter_by(menu_id=menu.id).all()
+        all_dishes = sorted(menu.dishes, key=lambda dish: dish.id)
         
         if not all_dishes:
             menu_details += "  No dishes available for this menu.\n\n"
@@ -115,7 +109,7 @@ def get_menu_for_chatbot(rest_id):
                 f"{'Lactose-Free' if dish.is_lactose_free else 'Not Lacto-Free'}, "
                 f"{'Halal' if dish.is_halal else 'Not Halal'}, "
                 f"{'Vegan' if dish.is_vegan else 'Not Vegan'}, "
-                f"{'Vegetarian' if dish.is_vegetarian else 'Vegetarian'}, "
+                f"{'Vegetarian' if dish.is_vegetarian else 'Not Vegetarian'}, "
                 f"{'Gluten-Free' if dish.is_gluten_free else 'Not Gluten-Free'}, "
                 f"{'Jain' if dish.is_jain else 'Not Jain'}, "
                 f"{'Soy-Free' if dish.is_soy_free else 'Not Soy-Free'}\n"
@@ -124,6 +118,82 @@ def get_menu_for_chatbot(rest_id):
     
     return menu_details.strip()
 
+# Short codes for the compact menu encoding, in Dish column order.
+# The compact table is the same for every user; which dishes fit the user is sent separately.
+COMPACT_DIET_CODES = (
+    ("is_lactose_free", "LF"),
+    ("is_halal", "H"),
+    ("is_vegan", "VG"),
+    ("is_vegetarian", "V"),
+    ("is_gluten_free", "GF"),
+    ("is_jain", "J"),
+    ("is_soy_free", "SF"),
+)
+
+def _compact_field(value):
+    return str(value).replace("|", "/").replace("\n", " ").strip() if value is not None else ""
+
+def _compact_number(value):
+    return "" if value is None else f"{value:g}"
+
+COMPACT_MENU_HEADER = (
+    "Each dish row is id|name|description|price|protein g|fat g|carbs g|kcal|diet|available\n"
+    "diet codes: LF lactose-free, H halal, VG vegan, V vegetarian, GF gluten-free, J jain, SF soy-free"
+)
+
+def compact_dish_row(dish):
+    return "|".join([
+        str(dish.id),
+        _compact_field(dish.dish_name),
+        _compact_field(dish.description),
+        f"{dish.price:.2f}" if dish.price is not None else "",
+        _compact_number(dish.protein),
+        _compact_number(dish.fat),
+        _compact_number(dish.carbs),
+        _compact_number(dish.energy),
+        " ".join(code for attr, code in COMPACT_DIET_CODES if getattr(dish, attr)),
+        "Y" if dish.is_available else "N",
+    ])
+
+def get_compact_menu_for_chatbot(rest_id):
+    menus = Menu.query.filter_by(restaurant_id=rest_id).all()
+    if not menus:
+        return "No menus found for this restaurant."
+
+    dishes_by_menu = {}
+    for dish in Dish.query.filter_by(restaurant_id=rest_id).order_by(Dish.id).all():
+        dishes_by_menu.setdefault(dish.menu_id, []).append(dish)
+
+    lines = [COMPACT_MENU_HEADER]
+    for menu in menus:
+        lines.append(f"# Menu {menu.id}: {_compact_field(menu.menu_type or 'Unnamed Menu')}")
+        lines.extend(compact_dish_row(dish) for dish in dishes_by_menu.get(menu.id, []))
+    return "\n".join(lines)
+
+def get_matching_dishes_for_chatbot(rest_id, user_id):
+    dish_ids = [str(dish.id) for dish in get_dishes_for_user(user_id, rest_id=rest_id) if dish.menu_id is not None]
+    if not dish_ids:
+        return "No dishes on the menu match the user's dietary preferences."
+    return "Dish ids matching the user's dietary preferences: " + ", ".join(dish_ids)
+
+def get_cached_menu_for_chatbot(rest_id, version=None):
+    return get_cached_menu_prompt(rest_id, "full", lambda: get_menu_for_chatbot(rest_id), version)
+
+def get_cached_filtered_menu_for_chatbot(rest_id, user_id, version=None, pref_key=None):
+    if pref_key is None:
+        pref_key = preference_mask(Preferences.query.filter_by(user_id=user_id).first())
+    return get_cached_menu_prompt(rest_id, ("filtered", pref_key),
+                                  lambda: get_filtered_menu_for_chatbot(rest_id, user_id), version)
+
+def get_cached_compact_menu_for_chatbot(rest_id, version=None):
+    return get_cached_menu_prompt(rest_id, "compact", lambda: get_compact_menu_for_chatbot(rest_id), version)
+
+def get_cached_matching_dishes_for_chatbot(rest_id, user_id, version=None, pref_key=None):
+    if pref_key is None:
+        pref_key = preference_mask(Preferences.query.filter_by(user_id=user_id).first())
+    return get_cached_menu_prompt(rest_id, ("matching", pref_key),
+                                  lambda: get_matching_dishes_for_chatbot(rest_id, user_id), version)
+
 def get_user_desc_string(user_id):
     preferences = Preferences.query.filter_by(user_id=user_id).all()
     user_string = "Here are the user's preferences:\n\n"
@@ -143,26 +213,122 @@ def get_user_desc_string(user_id):
         )
     return user_string.strip()
 
+def get_dishes_for_user(user_id, rest_id=None, menu_id=None, extra_mask=0, max_price=None, min_price=None, on_menu=False,
+                        available_only=False, limit=None):
+    """Dishes matching every dietary restriction of the user (plus extra_mask), in a single query.
+
+    available_only leaves out the dishes the chatbot prompt lists as "Available: No".
+    """
+    required = func.coalesce(
+        db.session.query(Preferences.dietary_mask)
+        .filter(Preferences.user_id == user_id)
+        .limit(1)
+        .scalar_subquery(),
+        0
+    ).op('|')(extra_mask)
+    query = Dish.query.filter(Dish.dietary_mask.op('&')(required) == required)
+    if rest_id is not None:
+        query = query.filter(Dish.restaurant_id == rest_id)
+    if menu_id is not None:
+        query = query.filter(Dish.menu_id == menu_id)
+    if on_menu:
+        query = query.filter(Dish.menu_id.isnot(None))
+    if available_only:
+        query = query.filter(Dish.is_available == True)
+    if max_price is not None:
+        query = query.filter(Dish.price <= max_price)
+    if min_price is not None:
+        query = query.filter(Dish.price >= min_price)
+    query = query.order_by(Dish.price, Dish.id) if max_price is not None or min_price is not None else query.order_by(Dish.id)
+    if limit is not None:
+        query = query.limit(limit)
+    return query.all()
+
 def sort_user_preferences(user_id,menu_id):
-    user_preferences = Preferences.query.filter_by(user_id=user_id).first()
-    menu = Menu.query.filter_by(id=menu_id).first()
-    updated_menu =[]
-    for dish in menu.dishes:
-        dish = Dish.query.filter_by(id=dish.id).first()
-        if user_preferences.is_lactose_intolerant and not dish.is_lactose_free:
-            continue
-        if  user_preferences.is_halal and not dish.is_halal:
-            continue
-        if  user_preferences.is_vegan and not dish.is_vegan:
-            continue
-        if  user_preferences.is_vegetarian and not dish.is_vegetarian:
-            continue
-        if  user_preferences.is_allergic_to_gluten and not dish.is_allergic_to_gluten:
-            continue
-        if  user_preferences.is_jain and not dish.is_jain:
-            continue
-        updated_menu.append(dish)
-    return updated_menu
+    return get_dishes_for_user(user_id, menu_id=menu_id)
+
+def sync_dietary_masks():
+    db.session.execute(Dish.__table__.update().values(dietary_mask=mask_sql_expression(Dish.__table__, DISH_FLAGS)))
+    db.session.execute(Preferences.__table__.update().values(dietary_mask=mask_sql_expression(Preferences.__table__, PREFERENCE_FLAGS)))
+    db.session.commit()
+
+def _dish_card(dish):
+    return {
+        "dish_id": dish.id,
+        "name": dish.dish_name,
+        "image": return_link(dish.image),
+        "is_vegetarian": dish.is_vegetarian,
+        "price": dish.price
+    }
+
+def get_dish_cards(dish_ids):
+    queried_dishes = Dish.query.filter(Dish.id.in_(dish_ids)).all() if dish_ids else []
+    return [_dish_card(dish) for dish in queried_dishes]
+
+def get_message_dish_cards(message_ids):
+    """{message_id: [card, ...]} with each message's recommended dishes in order, loaded with one join.
+
+    Dishes that no longer exist are left out.
+    """
+    message_ids = list(message_ids)
+    if not message_ids:
+        return {}
+    rows = (db.session.query(ConversationDish.conversation_id, Dish.id, Dish.dish_name, Dish.image,
+                             Dish.is_vegetarian, Dish.price)
+            .join(Dish, Dish.id == ConversationDish.dish_id)
+            .filter(ConversationDish.conversation_id.in_(message_ids))
+            .order_by(ConversationDish.conversation_id, ConversationDish.position)
+            .all())
+    cards = {}
+    for row in rows:
+        cards.setdefault(row.conversation_id, []).append(_dish_card(row))
+    return cards
+
+def get_recommendation_analytics(rest_id, sort="recommended", limit=20):
+    """Per dish of the restaurant: how often the assistant recommended it, how often it was ordered,
+    and in how many chat sessions a recommended dish was then ordered. Aggregated in SQL.
+    """
+    recommended = (db.session.query(ConversationDish.dish_id.label("dish_id"),
+                                    func.count().label("recommended"),
+                                    func.count(distinct(Conversation.session_id)).label("recommended_sessions"))
+                   .join(Conversation, Conversation.id == ConversationDish.conversation_id)
+                   .filter(Conversation.rest_id == rest_id)
+                   .group_by(ConversationDish.dish_id)
+                   .subquery())
+    ordered = (db.session.query(OrderItem.dish_id.label("dish_id"),
+                                func.sum(OrderItem.quantity).label("ordered"),
+                                func.count(distinct(Order.id)).label("orders"))
+               .join(Order, Order.id == OrderItem.order_id)
+               .filter(Order.restaurant_id == rest_id)
+               .group_by(OrderItem.dish_id)
+               .subquery())
+    converted = (db.session.query(ConversationDish.dish_id.label("dish_id"),
+                                  func.count(distinct(Order.session_id)).label("converted_sessions"))
+                 .join(Conversation, Conversation.id == ConversationDish.conversation_id)
+                 .join(Order, Order.session_id == Conversation.session_id)
+                 .join(OrderItem, and_(OrderItem.order_id == Order.id, OrderItem.dish_id == ConversationDish.dish_id))
+                 .filter(Conversation.rest_id == rest_id)
+                 .group_by(ConversationDish.dish_id)
+                 .subquery())
+    columns = {
+        "recommended": func.coalesce(recommended.c.recommended, 0),
+        "recommended_sessions": func.coalesce(recommended.c.recommended_sessions, 0),
+        "ordered": func.coalesce(ordered.c.ordered, 0),
+        "orders": func.coalesce(ordered.c.orders, 0),
+        "converted_sessions": func.coalesce(converted.c.converted_sessions, 0),
+    }
+    tie_break = columns["ordered"] if sort == "recommended" else columns["recommended"]
+    rows = (db.session.query(Dish.id, Dish.dish_name, *[column.label(name) for name, column in columns.items()])
+            .outerjoin(recommended, recommended.c.dish_id == Dish.id)
+            .outerjoin(ordered, ordered.c.dish_id == Dish.id)
+            .outerjoin(converted, converted.c.dish_id == Dish.id)
+            .filter(Dish.restaurant_id == rest_id,
+                    or_(recommended.c.dish_id.isnot(None), ordered.c.dish_id.isnot(None)))
+            .order_by(columns[sort].desc(), tie_break.desc(), Dish.id)
+            .limit(limit)
+            .all())
+    return [{"dish_id": row.id, "name": row.dish_name, **{name: row._mapping[name] for name in columns}}
+            for row in rows]
 
 def generate_session_id(user_id):
     raw_id = f"{user_id}{int(datetime.utcnow().timestamp())}"
@@ -189,13 +355,14 @@ def return_link(filename):
 
 def count_tokens(messages, model="gpt-4o"):
     """Count the number of tokens in the message list using the OpenAI tokenizer."""
-    # Initialize tokenizer
-    tokenizer = tiktoken.get_encoding("gpt2" if model == "gpt-4o" else "cl100k_base")
+    tokenizer = get_tokenizer(model)
     
     # Count tokens for each message
     total_tokens = 0
     for message in messages:
-        total_tokens += len(tokenizer.encode(message["content"]))
+        content = message["content"] or ""
+        # Roughly four characters per token when the encoding could not be loaded
+        total_tokens += len(tokenizer.encode(content)) if tokenizer else len(content) // 4 + 1
     
     return total_tokens
 
@@ -209,4 +376,15 @@ def clear_cart(row_id):
                 setattr(row, column, None)
         db.session.commit()
         return "Row cleared successfully."
-    return "Row not found."
\ No newline at end of file
+    return "Row not found."
+
+async def run_in_app_context(fn, *args):
+    """Await fn(*args) on a worker thread inside its own app context.
+
+    Each call gets a fresh session that is removed when fn returns, so coroutines never hold a
+    database connection while they wait on the network.
+    """
+    def call():
+        with app.app_context():
+            return fn(*args)
+    return await asyncio.to_thread(call)
@@ -0,0 +1,75 @@
+from app import app, db
+from app.models import ConversationSummary
+from app.functions import count_tokens
+from app.resilience import resilient_completion
+
+
+def get_budgeted_history(context, client):
+    """Chat history for the prompt: a rolling summary of old turns plus the newest turns verbatim."""
+    budget = app.config['HISTORY_TOKEN_BUDGET']
+    user_id, rest_id, session_id = context.user_id, context.rest_id, context.session_id
+    conversations = context.messages
+    messages = [{"role": convo.role, "content": convo.content} for convo in conversations]
+    sizes = [count_tokens([message]) for message in messages]
+    summary_text = context.summary
+
+    if count_tokens([{"content": summary_text}]) + sum(sizes) > budget:
+        # Keep the newest turns up to the target and fold everything older into the summary,
+        # so the next few turns fit without summarizing again.
+        target = app.config['HISTORY_RECENT_TOKEN_TARGET']
+        keep_from = len(messages)
+        kept_tokens = 0
+        while keep_from > 0 and (kept_tokens + sizes[keep_from - 1] <= target or keep_from == len(messages)):
+            keep_from -= 1
+            kept_tokens += sizes[keep_from]
+
+        to_fold = messages[:keep_from]
+        if to_fold:
+            new_summary = summarize_messages(summary_text, to_fold, client,
+                                                 rest_id=rest_id, user_id=user_id, session_id=session_id)
+            if new_summary is not None:
+                summary = ConversationSummary.query.filter_by(user_id=user_id, rest_id=rest_id, session_id=session_id).first()
+                if not summary:
+                    summary = ConversationSummary(user_id=user_id, rest_id=rest_id, session_id=session_id)
+                    db.session.add(summary)
+                summary.summary = new_summary
+                summary.last_message_id = conversations[keep_from - 1].id
+                try:
+                    db.session.commit()
+                    summary_text = new_summary
+                except Exception as e:
+                    db.session.rollback()
+                    print(f"Error saving conversation summary: {e}")
+            messages = messages[keep_from:]
+
+    history = []
+    if summary_text:
+        history.append({"role": "system", "content": f"Summary of the earlier conversation: {summary_text}"})
+    return history + messages
+
+
+def summarize_messages(previous_summary, messages, client, rest_id=None, user_id=None, session_id=None):
+    transcript = "\n".join(f"{message['role']}: {message['content']}" for message in messages)
+    prompt = [
+        {
+            "role": "system",
+            "content": """You maintain a running summary of a conversation between a diner and a restaurant chatbot.
+                          Merge the new turns into the existing summary. Keep dishes discussed or recommended,
+                          allergies, dietary needs, likes and dislikes and anything the diner asked to remember.
+                          Write plain text in less than 150 words.
+                       """
+        },
+        {"role": "user", "content": f"Existing summary:\n{previous_summary or 'None'}\n\nNew turns:\n{transcript}"}
+    ]
+    try:
+        response = resilient_completion(
+            client, "summary", rest_id=rest_id, user_id=user_id, session_id=session_id,
+            messages=prompt,
+            model=app.config['HISTORY_SUMMARY_MODEL'],
+            temperature=0,
+            max_tokens=app.config['HISTORY_SUMMARY_MAX_TOKENS']
+        )
+        return response.choices[0].message.content.strip()
+    except Exception as e:
+        print(f"Error summarizing conversation: {e}")
+        return None
@@ -0,0 +1,167 @@
+import json
+import re
+import threading
+from app import app
+from app.dietary import LACTOSE_FREE, HALAL, VEGAN, VEGETARIAN, GLUTEN_FREE, JAIN, SOY_FREE
+from app.functions import get_dishes_for_user
+from app.reply_parser import ChatReply
+
+# (pattern, dish bit, label); the more specific patterns come first
+_DIET_PATTERNS = [
+    (re.compile(r"\bgluten[\s-]*free\b|\b(?:no|without)\s+gluten\b|\bceliac\b|\bcoeliac\b"), GLUTEN_FREE, "gluten-free"),
+    (re.compile(r"\b(?:lactose|dairy|milk)[\s-]*free\b|\b(?:no|without)\s+(?:lactose|dairy|milk)\b"), LACTOSE_FREE, "lactose-free"),
+    (re.compile(r"\bsoy[\s-]*free\b|\b(?:no|without)\s+soy\b"), SOY_FREE, "soy-free"),
+    (re.compile(r"\bvegan\b"), VEGAN, "vegan"),
+    (re.compile(r"\bvegetarian\b|\bveggie\b|\bveg\b"), VEGETARIAN, "vegetarian"),
+    (re.compile(r"\bhalal\b"), HALAL, "halal"),
+    (re.compile(r"\bjain\b"), JAIN, "Jain"),
+]
+_AMOUNT = r"(?:\$|₹|rs\.?|inr)?\s*(\d+(?:\.\d+)?)\s*(?:dollars?|bucks|rupees|rs\.?|inr)?"
+_MAX_PRICE = re.compile(r"\b(?:under|below|less\s+than|cheaper\s+than|within|up\s*to|at\s+most|max(?:imum)?|not\s+more\s+than)\s*" + _AMOUNT)
+_MIN_PRICE = re.compile(r"\b(?:over|above|more\s+than|at\s+least|min(?:imum)?)\s*" + _AMOUNT)
+_MENU = re.compile(r"\bmenu\b|\bwhat\s+(?:do|can)\s+(?:you|i)\s+(?:have|serve|offer|get|order|eat)\b|\beverything\b")
+# Words that change the meaning of a filter; such requests go to the model
+_NEGATIONS = {"not", "non", "no", "without", "except", "dont", "don't", "isn't", "nothing", "never"}
+# Words that carry no request of their own
+_GENERIC = {
+    "a", "all", "an", "and", "any", "anything", "are", "available", "can", "could", "dish", "dishes", "do", "does",
+    "entire", "food", "foods", "for", "full", "get", "give", "got", "have", "hello", "hey", "hi", "i", "in", "is",
+    "item", "items", "just", "list", "me", "meal", "meals", "menu", "my", "of", "offer", "on", "one", "ones", "only",
+    "option", "options", "order", "please", "pls", "price", "priced", "prices", "see", "serve", "show", "some",
+    "something", "that", "the", "there", "thing", "things", "to", "today", "we", "what", "what's", "whats",
+    "which", "with", "would", "you", "your", "like", "want", "need", "eat", "complete", "card", "whole", "here",
+    "it", "thanks", "thank",
+}
+_WORD = re.compile(r"[a-z$₹'][a-z0-9.'₹$-]*|\d+(?:\.\d+)?")
+
+# degraded counts answers given while the model was unavailable (app/resilience.py)
+_stats = {"routed": 0, "fallbacks": 0, "degraded": 0, "intents": {}, "fallback_reasons": {}}
+_stats_lock = threading.Lock()
+
+
+def classify_intent(user_input):
+    """(intent, confidence, params) for a chat turn; intent is None when no known intent was found."""
+    text = (user_input or "").lower().replace("’", "'")
+    words = _WORD.findall(text)
+    if not words:
+        return None, 0.0, {}
+
+    params = {"mask": 0, "labels": [], "max_price": None, "min_price": None}
+    remainder = text
+    for pattern, bit, label in _DIET_PATTERNS:
+        if pattern.search(remainder):
+            params["mask"] |= bit
+            params["labels"].append(label)
+            remainder = pattern.sub(" ", remainder)
+    for pattern, key in ((_MAX_PRICE, "max_price"), (_MIN_PRICE, "min_price")):
+        match = pattern.search(remainder)
+        if match:
+            params[key] = float(match.group(1))
+            remainder = pattern.sub(" ", remainder)
+    wants_menu = bool(_MENU.search(remainder))
+    remainder = _MENU.sub(" ", remainder)
+
+    parts = []
+    if params["mask"]:
+        parts.append("diet")
+    if params["max_price"] is not None or params["min_price"] is not None:
+        parts.append("price")
+    if not parts and wants_menu:
+        parts.append("menu")
+    if not parts:
+        return None, 0.0, params
+
+    leftover = _WORD.findall(remainder.replace("-", " "))
+    if any(word in _NEGATIONS for word in leftover):
+        return None, 0.0, params
+    # Share of the request explained by the intent; unknown words usually name a dish or a follow-up
+    unexplained = [word for word in leftover if word not in _GENERIC]
+    confidence = 1 - len(unexplained) / len(words)
+    return "+".join(parts), round(confidence, 3), params
+
+
+def _describe(params):
+    labels = " ".join(params["labels"])
+    description = f"{labels} dishes" if labels else "dishes"
+    if params["min_price"] is not None and params["max_price"] is not None:
+        description += f" between {params['min_price']:g} and {params['max_price']:g}"
+    elif params["max_price"] is not None:
+        description += f" under {params['max_price']:g}"
+    elif params["min_price"] is not None:
+        description += f" over {params['min_price']:g}"
+    return description
+
+
+def _record(intent, reason=None):
+    with _stats_lock:
+        if reason:
+            _stats["fallbacks"] += 1
+            _stats["fallback_reasons"][reason] = _stats["fallback_reasons"].get(reason, 0) + 1
+        else:
+            _stats["routed"] += 1
+            _stats["intents"][intent] = _stats["intents"].get(intent, 0) + 1
+
+
+def route_chat(user_id, rest_id, user_input):
+    """Answer menu and filter requests straight from the Dish table. None means ask the model."""
+    if not app.config['INTENT_ROUTER_ENABLED']:
+        return None
+    intent, confidence, params = classify_intent(user_input)
+    if intent is None:
+        _record(None, "no_intent")
+        return None
+    if confidence < app.config['INTENT_ROUTER_THRESHOLD']:
+        _record(intent, "low_confidence")
+        return None
+
+    _record(intent)
+    return _answer(user_id, rest_id, intent, params)
+
+
+def fallback_reply(user_id, rest_id, user_input):
+    """Best answer from the Dish table when the model is unavailable, whatever the confidence."""
+    intent, _, params = classify_intent(user_input)
+    if intent is None:
+        intent, params = "menu", {"mask": 0, "labels": [], "max_price": None, "min_price": None}
+    with _stats_lock:
+        _stats["degraded"] += 1
+    return _answer(user_id, rest_id, intent, params,
+                   "Our assistant is not available right now, so here is what I found on the menu. ")
+
+
+def _answer(user_id, rest_id, intent, params, prefix=""):
+    max_dishes = app.config['INTENT_ROUTER_MAX_DISHES']
+    # One row past the cap tells whether the list was cut short, without counting every match
+    dishes = get_dishes_for_user(user_id, rest_id=rest_id, extra_mask=params["mask"], max_price=params["max_price"],
+                                 min_price=params["min_price"], on_menu=True, available_only=True,
+                                 limit=max_dishes + 1)
+    truncated = len(dishes) > max_dishes
+    dishes = dishes[:max_dishes]
+    if not dishes:
+        what = "dishes" if intent == "menu" else _describe(params)
+        text = f"Sorry, there are no {what} on the menu that match your preferences right now."
+    elif truncated:
+        what = "dishes on the menu" if intent == "menu" else _describe(params)
+        text = (f"There are more than {max_dishes} {what} that match your preferences. Here are the first "
+                f"{max_dishes}; ask for a dish type or a price range to narrow them down:")
+    elif intent == "menu":
+        text = "Here is the menu based on your preferences:"
+    else:
+        text = f"Here are the {_describe(params)} that match your preferences:"
+    text = prefix + text
+    dish_ids = tuple(dish.id for dish in dishes)
+    raw = json.dumps({"text": text, "dishes": [{"dish_id": dish_id} for dish_id in dish_ids]})
+    return ChatReply(text, dish_ids, raw, True)
+
+
+def intent_router_stats():
+    with _stats_lock:
+        total = _stats["routed"] + _stats["fallbacks"]
+        return {
+            "routed": _stats["routed"],
+            "fallbacks": _stats["fallbacks"],
+            "degraded": _stats["degraded"],
+            "hit_rate": round(_stats["routed"] / total, 4) if total else 0.0,
+            "intents": dict(_stats["intents"]),
+            "fallback_reasons": dict(_stats["fallback_reasons"]),
+        }
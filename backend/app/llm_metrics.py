@@ -0,0 +1,184 @@
+import asyncio
+import math
+import time
+from datetime import datetime, timedelta
+import pytz
+from app import db
+from app.models import LLMCall
+
+ist = pytz.timezone('Asia/Kolkata')
+
+
+def _usage_counts(usage):
+    if usage is None:
+        return None, None, None
+    details = getattr(usage, "prompt_tokens_details", None)
+    cached = getattr(details, "cached_tokens", None) if details else None
+    return usage.prompt_tokens, usage.completion_tokens, cached or 0
+
+
+def record_llm_call(purpose, model, started, usage=None, first_token_at=None, error=None,
+                    rest_id=None, user_id=None, session_id=None):
+    """Append one model call to the llm_call table on its own connection, outside the request transaction."""
+    finished = time.perf_counter()
+    prompt_tokens, completion_tokens, cached_tokens = _usage_counts(usage)
+    values = {
+        "purpose": purpose,
+        "model": model,
+        "rest_id": rest_id,
+        "user_id": user_id,
+        "session_id": session_id,
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "cached_tokens": cached_tokens,
+        "wall_ms": round((finished - started) * 1000, 1),
+        "ttft_ms": round((first_token_at - started) * 1000, 1) if first_token_at else None,
+        "status": "error" if error else "ok",
+        "error": str(error)[:200] if error else None,
+        "created_at": datetime.now(ist),
+    }
+    try:
+        with db.engine.begin() as connection:
+            connection.execute(LLMCall.__table__.insert().values(**values))
+    except Exception as e:
+        print(f"Error recording LLM call: {e}")
+
+
+def create_completion(client, purpose, rest_id=None, user_id=None, session_id=None, **request):
+    """client.chat.completions.create for a non-streamed reply, recorded in llm_call."""
+    started = time.perf_counter()
+    context = {"rest_id": rest_id, "user_id": user_id, "session_id": session_id}
+    try:
+        completion = client.chat.completions.create(**request)
+    except Exception as e:
+        record_llm_call(purpose, request.get("model"), started, error=e, **context)
+        raise
+    # Without streaming the first token arrives with the whole reply
+    record_llm_call(purpose, request.get("model"), started, completion.usage, time.perf_counter(), **context)
+    return completion
+
+
+def stream_completion(client, purpose, rest_id=None, user_id=None, session_id=None, **request):
+    """Streamed client.chat.completions.create; yields the chunks and records the call once the stream ends."""
+    started = time.perf_counter()
+    context = {"rest_id": rest_id, "user_id": user_id, "session_id": session_id}
+    first_token_at = usage = error = None
+    completed = False
+    try:
+        for chunk in client.chat.completions.create(stream=True, **request):
+            if chunk.usage:
+                usage = chunk.usage
+            if first_token_at is None and chunk.choices and chunk.choices[0].delta.content:
+                first_token_at = time.perf_counter()
+            yield chunk
+        completed = True
+    except Exception as e:
+        error = e
+        raise
+    finally:
+        # Also runs when the client disconnects and the generator is closed early
+        if error is None and not completed:
+            error = "stream closed before completion"
+        record_llm_call(purpose, request.get("model"), started, usage, first_token_at, error, **context)
+
+
+async def create_completion_async(client, purpose, rest_id=None, user_id=None, session_id=None, **request):
+    """create_completion for an AsyncOpenAI client; the llm_call insert runs on a worker thread."""
+    started = time.perf_counter()
+    context = {"rest_id": rest_id, "user_id": user_id, "session_id": session_id}
+    try:
+        completion = await client.chat.completions.create(**request)
+    except Exception as e:
+        await asyncio.to_thread(record_llm_call, purpose, request.get("model"), started, error=e, **context)
+        raise
+    await asyncio.to_thread(record_llm_call, purpose, request.get("model"), started, completion.usage,
+                            time.perf_counter(), **context)
+    return completion
+
+
+async def stream_completion_async(client, purpose, rest_id=None, user_id=None, session_id=None, **request):
+    """stream_completion for an AsyncOpenAI client."""
+    started = time.perf_counter()
+    context = {"rest_id": rest_id, "user_id": user_id, "session_id": session_id}
+    first_token_at = usage = error = None
+    completed = False
+    try:
+        async for chunk in await client.chat.completions.create(stream=True, **request):
+            if chunk.usage:
+                usage = chunk.usage
+            if first_token_at is None and chunk.choices and chunk.choices[0].delta.content:
+                first_token_at = time.perf_counter()
+            yield chunk
+        completed = True
+    except BaseException as e:
+        # GeneratorExit and CancelledError land here when the client goes away
+        error = e if isinstance(e, Exception) else "stream closed before completion"
+        raise
+    finally:
+        if error is None and not completed:
+            error = "stream closed before completion"
+        await asyncio.shield(asyncio.to_thread(record_llm_call, purpose, request.get("model"), started, usage,
+                                               first_token_at, error, **context))
+
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of an already sorted list."""
+    if not values:
+        return None
+    rank = max(1, math.ceil(len(values) * fraction))
+    return values[rank - 1]
+
+
+def llm_call_stats(since_hours=24, purpose=None, top_sessions=10, rest_id=None):
+    """Per restaurant call counts, p50/p95 latency and token totals over the last since_hours.
+
+    With rest_id only the calls made for that restaurant are counted.
+    """
+    query = db.session.query(
+        LLMCall.rest_id, LLMCall.session_id, LLMCall.purpose, LLMCall.status, LLMCall.wall_ms, LLMCall.ttft_ms,
+        LLMCall.prompt_tokens, LLMCall.completion_tokens, LLMCall.cached_tokens,
+    ).filter(LLMCall.created_at >= datetime.now(ist) - timedelta(hours=since_hours))
+    if purpose:
+        query = query.filter(LLMCall.purpose == purpose)
+    if rest_id is not None:
+        query = query.filter(LLMCall.rest_id == rest_id)
+
+    restaurants = {}
+    sessions = {}
+    for row in query.all():
+        stats = restaurants.setdefault(row.rest_id, {
+            "calls": 0, "errors": 0, "wall_ms": [], "ttft_ms": [],
+            "prompt_tokens": 0, "completion_tokens": 0, "cached_tokens": 0, "purposes": {},
+        })
+        stats["calls"] += 1
+        stats["purposes"][row.purpose] = stats["purposes"].get(row.purpose, 0) + 1
+        if row.status != "ok":
+            stats["errors"] += 1
+            continue
+        stats["wall_ms"].append(row.wall_ms)
+        if row.ttft_ms is not None:
+            stats["ttft_ms"].append(row.ttft_ms)
+        tokens = (row.prompt_tokens or 0) + (row.completion_tokens or 0)
+        stats["prompt_tokens"] += row.prompt_tokens or 0
+        stats["completion_tokens"] += row.completion_tokens or 0
+        stats["cached_tokens"] += row.cached_tokens or 0
+        if row.session_id is not None:
+            key = (row.rest_id, row.session_id)
+            sessions[key] = sessions.get(key, 0) + tokens
+
+    for stats in restaurants.values():
+        wall_ms = sorted(stats.pop("wall_ms"))
+        ttft_ms = sorted(stats.pop("ttft_ms"))
+        stats.update({
+            "p50_ms": percentile(wall_ms, 0.5),
+            "p95_ms": percentile(wall_ms, 0.95),
+            "p50_ttft_ms": percentile(ttft_ms, 0.5),
+            "p95_ttft_ms": percentile(ttft_ms, 0.95),
+        })
+    busiest = sorted(sessions.items(), key=lambda item: -item[1])[:top_sessions]
+    return {
+        "since_hours": since_hours,
+        "restaurants": {str(rest_id): stats for rest_id, stats in restaurants.items()},
+        "top_sessions": [{"rest_id": rest_id, "session_id": session_id, "tokens": tokens}
+                         for (rest_id, session_id), tokens in busiest],
+    }
@@ -0,0 +1,79 @@
+import threading
+from sqlalchemy import func
+from app import db
+from app.models import Restaurant
+
+MENU_ENCODINGS = ("verbose", "compact")
+
+# rest_id -> {"version": int, "prompts": {variant: text}}
+_menu_prompts = {}
+_stats = {}
+_lock = threading.Lock()
+
+
+def get_menu_version(rest_id):
+    version = db.session.query(Restaurant.menu_version).filter_by(id=rest_id).scalar()
+    return version or 0
+
+
+def bump_menu_version(rest_id):
+    """Mark every cached menu prompt of the restaurant as stale. Call before the route commits."""
+    Restaurant.query.filter_by(id=rest_id).update(
+        {Restaurant.menu_version: func.coalesce(Restaurant.menu_version, 0) + 1},
+        synchronize_session=False
+    )
+
+
+def get_cached_menu_prompt(rest_id, variant, builder, version=None):
+    if version is None:
+        version = get_menu_version(rest_id)
+
+    with _lock:
+        stats = _stats.setdefault(rest_id, {"hits": 0, "misses": 0})
+        entry = _menu_prompts.get(rest_id)
+        if entry and entry["version"] == version and variant in entry["prompts"]:
+            stats["hits"] += 1
+            return entry["prompts"][variant]
+        stats["misses"] += 1
+
+    text = builder()
+
+    with _lock:
+        entry = _menu_prompts.get(rest_id)
+        if not entry or entry["version"] < version:
+            entry = {"version": version, "prompts": {}}
+            _menu_prompts[rest_id] = entry
+        if entry["version"] == version:
+            entry["prompts"][variant] = text
+    return text
+
+
+def clear_menu_prompt_cache():
+    with _lock:
+        _menu_prompts.clear()
+        _stats.clear()
+
+
+def menu_prompt_cache_stats():
+    with _lock:
+        restaurants = {}
+        total_hits = total_misses = 0
+        for rest_id, stats in _stats.items():
+            lookups = stats["hits"] + stats["misses"]
+            entry = _menu_prompts.get(rest_id)
+            restaurants[rest_id] = {
+                "hits": stats["hits"],
+                "misses": stats["misses"],
+                "hit_rate": round(stats["hits"] / lookups, 4) if lookups else 0.0,
+                "menu_version": entry["version"] if entry else None,
+                "cached_prompts": len(entry["prompts"]) if entry else 0,
+            }
+            total_hits += stats["hits"]
+            total_misses += stats["misses"]
+    total = total_hits + total_misses
+    return {
+        "hits": total_hits,
+        "misses": total_misses,
+        "hit_rate": round(total_hits / total, 4) if total else 0.0,
+        "restaurants": restaurants,
+    }
@@ -1,4 +1,5 @@
 from app import db
+from app.dietary import dish_mask, preference_mask
 from datetime import datetime
 import pytz
 ist = pytz.timezone('Asia/Kolkata')
@@ -34,6 +35,7 @@ class Preferences(db.Model):
     is_vegetarian = db.Column(db.Boolean, default=False)
     is_allergic_to_gluten = db.Column(db.Boolean, default=False)
     is_jain = db.Column(db.Boolean, default=False)
+    dietary_mask = db.Column(db.Integer, nullable=False, default=0, server_default='0')
 
     def __repr__(self):
         return (f"<Preferences(id={self.id}, user_id={self.user_id}, preference='{self.preference}', "
@@ -64,10 +66,12 @@ class Restaurant(db.Model):
     is_vegetarian = db.Column(db.Boolean, default=False)
     is_halal = db.Column(db.Boolean, default=False)
     description = db.Column(db.String(200))
+    menu_version = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    menu_encoding = db.Column(db.String(10), nullable=False, default='verbose', server_default='verbose')
     menus = db.relationship('Menu', backref='restaurant', lazy=True, cascade="all, delete-orphan")
 
     def to_dict(self):
-        return {c.name: getattr(self, c.name) for c in self.__table__.columns if (c.name != "password" and c.name != "id")}
+        return {c.name: getattr(self, c.name) for c in self.__table__.columns if (c.name not in ("password", "id", "menu_version", "menu_encoding"))}
 
     def __repr__(self):
         return (f"<Restaurant(id={self.id}, name='{self.name}', cuisine='{self.cuisine}', "
@@ -139,6 +143,8 @@ class Dish(db.Model):
     is_available = db.Column(db.Boolean, default=True)
     image = db.Column(db.String(100))
     rating = db.Column(db.Integer, default=5)
+    dietary_mask = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    __table_args__ = (db.Index('ix_dish_restaurant_id', 'restaurant_id'), db.Index('ix_dish_menu_id', 'menu_id'))
     def to_dict(self):
         return {
             "id": self.id,
@@ -165,6 +171,16 @@ class Dish(db.Model):
             "name": self.dish_name
         }
     
+@db.event.listens_for(Dish, 'before_insert')
+@db.event.listens_for(Dish, 'before_update')
+def _sync_dish_mask(mapper, connection, target):
+    target.dietary_mask = dish_mask(target)
+
+@db.event.listens_for(Preferences, 'before_insert')
+@db.event.listens_for(Preferences, 'before_update')
+def _sync_preference_mask(mapper, connection, target):
+    target.dietary_mask = preference_mask(target)
+
 class Theme(db.Model):
     __tablename__ = 'theme'
     restaurant_id = db.Column(db.Integer, db.ForeignKey('restaurant.id', name='fk_theme_restaurant_id', ondelete='CASCADE'), nullable=False)
@@ -189,10 +205,26 @@ class Conversation(db.Model):
     content = db.Column(db.String(50), nullable=False)
     session_id = db.Column(db.Integer, db.ForeignKey('orders.session_id', name='fk_chat_history_session_id', ondelete='CASCADE'), nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.now(ist))
-    dish_ids = db.Column(db.PickleType, nullable=True)
+    # Dishes recommended by an assistant message, in the order the model listed them
+    recommendations = db.relationship('ConversationDish', lazy=True, cascade="all, delete-orphan",
+                                      order_by='ConversationDish.position', passive_deletes=True)
+    # Transcript lookups filter on all three and order by id, which SQLite keeps at the end of every index
+    __table_args__ = (db.Index('ix_conversation_user_rest_session', 'user_id', 'rest_id', 'session_id'),)
     def __repr__(self):
         return (f"<ChatHistory(id={self.id}, user_id={self.user_id}, message='{self.content}', "
                 f"created_at='{self.created_at}')>")
+
+    @property
+    def dish_ids(self):
+        return [recommendation.dish_id for recommendation in self.recommendations]
+
+    @dish_ids.setter
+    def dish_ids(self, dish_ids):
+        # Ids given as digit strings are stored as integers, anything else is not a dish id
+        dish_ids = [int(dish_id) for dish_id in dish_ids or []
+                    if not isinstance(dish_id, bool) and (isinstance(dish_id, int) or str(dish_id).strip().isdigit())]
+        self.recommendations = [ConversationDish(position=position, dish_id=dish_id)
+                                for position, dish_id in enumerate(dish_ids)]
     
     def get_all_chats(self):
         return {
@@ -201,6 +233,75 @@ class Conversation(db.Model):
             "created_at": self.created_at
         }
 
+class ConversationDish(db.Model):
+    __tablename__ = 'conversation_dish'
+    conversation_id = db.Column(db.Integer, db.ForeignKey('conversation.id', name='fk_conversation_dish_conversation_id', ondelete='CASCADE'), primary_key=True)
+    position = db.Column(db.Integer, primary_key=True)
+    # No foreign key: the model can name dishes that were deleted or never existed, and that must not fail the chat turn
+    dish_id = db.Column(db.Integer, nullable=False)
+    __table_args__ = (db.Index('ix_conversation_dish_dish_id', 'dish_id'),)
+
+    def __repr__(self):
+        return (f"<ConversationDish(conversation_id={self.conversation_id}, position={self.position}, "
+                f"dish_id={self.dish_id})>")
+
+class ConversationSummary(db.Model):
+    __tablename__ = 'conversation_summary'
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id', name='fk_summary_user_id', ondelete='CASCADE'), nullable=False)
+    rest_id = db.Column(db.Integer, db.ForeignKey('restaurant.id', name='fk_summary_rest_id', ondelete='CASCADE'), nullable=False)
+    session_id = db.Column(db.Integer, db.ForeignKey('orders.session_id', name='fk_summary_session_id', ondelete='CASCADE'), nullable=False)
+    summary = db.Column(db.Text, nullable=False, default='')
+    last_message_id = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.now(ist), onupdate=lambda: datetime.now(ist))
+    __table_args__ = (db.UniqueConstraint('user_id', 'rest_id', 'session_id', name='uq_summary_session'),)
+
+    def __repr__(self):
+        return (f"<ConversationSummary(id={self.id}, user_id={self.user_id}, session_id={self.session_id}, "
+                f"last_message_id={self.last_message_id})>")
+
+class DescriptionJob(db.Model):
+    __tablename__ = 'description_job'
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id', name='fk_description_job_user_id', ondelete='CASCADE'), nullable=False)
+    # pending -> running -> done, or back to pending for a retry, or failed once attempts run out
+    status = db.Column(db.String(10), nullable=False, default='pending')
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    last_error = db.Column(db.String(200))
+    run_after = db.Column(db.DateTime, default=lambda: datetime.now(ist))
+    # When a worker moved the job to running; the worker's lease on it ends DESCRIPTION_JOB_LEASE_TIMEOUT later
+    claimed_at = db.Column(db.DateTime)
+    created_at = db.Column(db.DateTime, default=lambda: datetime.now(ist))
+    updated_at = db.Column(db.DateTime, default=lambda: datetime.now(ist), onupdate=lambda: datetime.now(ist))
+    __table_args__ = (db.Index('ix_description_job_status_run_after', 'status', 'run_after'),)
+
+    def __repr__(self):
+        return (f"<DescriptionJob(id={self.id}, user_id={self.user_id}, status='{self.status}', "
+                f"attempts={self.attempts})>")
+
+class LLMCall(db.Model):
+    __tablename__ = 'llm_call'
+    id = db.Column(db.Integer, primary_key=True)
+    # No foreign keys: the log outlives users, restaurants and sessions
+    rest_id = db.Column(db.Integer)
+    user_id = db.Column(db.Integer)
+    session_id = db.Column(db.Integer)
+    purpose = db.Column(db.String(20), nullable=False)
+    model = db.Column(db.String(40))
+    prompt_tokens = db.Column(db.Integer)
+    completion_tokens = db.Column(db.Integer)
+    cached_tokens = db.Column(db.Integer)
+    wall_ms = db.Column(db.Float, nullable=False)
+    ttft_ms = db.Column(db.Float)
+    status = db.Column(db.String(10), nullable=False, default='ok')
+    error = db.Column(db.String(200))
+    created_at = db.Column(db.DateTime, default=lambda: datetime.now(ist))
+    __table_args__ = (db.Index('ix_llm_call_created_at_rest_id', 'created_at', 'rest_id'),)
+
+    def __repr__(self):
+        return (f"<LLMCall(id={self.id}, purpose='{self.purpose}', rest_id={self.rest_id}, "
+                f"wall_ms={self.wall_ms}, status='{self.status}')>")
+
 class Order(db.Model):
     __tablename__ = 'orders'
     
@@ -214,6 +315,8 @@ class Order(db.Model):
     timestamp = db.Column(db.DateTime, default=datetime.now(ist))
     
     items = db.relationship('OrderItem', backref='order', lazy=True, cascade="all, delete-orphan")
+    # Lookups by session_id (and user_id) already use the unique index on session_id
+    __table_args__ = (db.Index('ix_orders_restaurant_id_status', 'restaurant_id', 'status'),)
 
     def __repr__(self):
         return (f"Order(id={self.id}, user_id={self.user_id}, restaurant_id={self.restaurant_id}, "
@@ -267,6 +370,7 @@ class Cart(db.Model):
     session_id = db.Column(db.Integer, db.ForeignKey('orders.session_id', name='fk_cart_session_id', ondelete='CASCADE'), nullable=False)
     items = db.relationship('CartItem', backref='cart', lazy=True, cascade="all, delete-orphan")
     total_cost = db.Column(db.Float, default=0.0)
+    __table_args__ = (db.Index('ix_cart_session_id_user_id', 'session_id', 'user_id'),)
 
     def __repr__(self):
         return f"Cart(id={self.id}, user_id={self.user_id}, session_id={self.session_id}, items_count={len(self.items)})"
@@ -288,6 +392,7 @@ class CartItem(db.Model):
     dish_id = db.Column(db.Integer, db.ForeignKey('dish.id', name = 'fk_cart_dish_name'), nullable=False)
     quantity = db.Column(db.Integer, nullable=False, default=1)
     price = db.Column(db.Float, nullable=False)
+    __table_args__ = (db.Index('ix_cart_items_cart_id_dish_id', 'cart_id', 'dish_id'),)
 
     def __repr__(self):
         return (f"<CartItem(id={self.id}, cart_id={self.cart_id}, dish_id={self.dish_id}, "
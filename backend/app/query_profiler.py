@@ -0,0 +1,112 @@
+import re
+import threading
+import time
+from flask import g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+_LITERAL = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_IN_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_SPACES = re.compile(r"\s+")
+
+_routes = {}
+_routes_lock = threading.Lock()
+_installed = False
+
+
+def fingerprint(statement):
+    """Statement text with literals and IN lists collapsed, so repeats of one query compare equal."""
+    statement = _LITERAL.sub("?", statement)
+    statement = _IN_LIST.sub("(?)", statement)
+    return _SPACES.sub(" ", statement).strip()
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context() and "query_profile" in g:
+        conn.info.setdefault("query_profile_started", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if not has_request_context() or "query_profile" not in g:
+        return
+    started = conn.info.get("query_profile_started")
+    elapsed = time.perf_counter() - started.pop() if started else 0.0
+    profile = g.query_profile
+    profile["count"] += 1
+    profile["seconds"] += elapsed
+    key = fingerprint(statement)
+    profile["statements"][key] = profile["statements"].get(key, 0) + 1
+
+
+def n_plus_one(statements, threshold):
+    """Selects repeated at least threshold times in one request, most repeated first."""
+    repeated = [(key, count) for key, count in statements.items()
+                if count >= threshold and key.lstrip("(").upper().startswith("SELECT")]
+    return sorted(repeated, key=lambda item: -item[1])
+
+
+def _start_profile():
+    g.query_profile = {"count": 0, "seconds": 0.0, "statements": {}}
+
+
+def _finish_profile(response, flask_app):
+    profile = g.pop("query_profile", None)
+    if profile is None:
+        return response
+    threshold = flask_app.config['QUERY_PROFILER_N_PLUS_ONE_THRESHOLD']
+    suspects = n_plus_one(profile["statements"], threshold)
+    route = f"{request.method} {request.url_rule.rule if request.url_rule else request.path}"
+    _record(route, profile, suspects)
+    if suspects:
+        print(f"Possible N+1 in {route}: {suspects[0][1]}x {suspects[0][0][:120]}")
+    if flask_app.debug or flask_app.config['QUERY_PROFILER_HEADERS']:
+        response.headers["X-Query-Count"] = str(profile["count"])
+        response.headers["X-Query-Time-Ms"] = f"{profile['seconds'] * 1000:.1f}"
+        response.headers["X-Query-N-Plus-One"] = str(len(suspects))
+    return response
+
+
+def _record(route, profile, suspects):
+    with _routes_lock:
+        stats = _routes.setdefault(route, {
+            "requests": 0, "queries": 0, "max_queries": 0, "db_ms": 0.0, "n_plus_one_requests": 0, "suspects": {},
+        })
+        stats["requests"] += 1
+        stats["queries"] += profile["count"]
+        stats["max_queries"] = max(stats["max_queries"], profile["count"])
+        stats["db_ms"] += profile["seconds"] * 1000
+        if suspects:
+            stats["n_plus_one_requests"] += 1
+        for key, count in suspects:
+            stats["suspects"][key] = max(stats["suspects"].get(key, 0), count)
+
+
+def init_query_profiler(flask_app):
+    """Profile the SQL of every request of flask_app. Opt-in: QUERY_PROFILER_ENABLED."""
+    global _installed
+    if not _installed:
+        # Listening on the Engine class covers every engine, including the benchmark ones
+        event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+        _installed = True
+    flask_app.before_request(_start_profile)
+    flask_app.after_request(lambda response: _finish_profile(response, flask_app))
+
+
+def query_profile_stats(reset=False):
+    """Per route request count, mean and max queries, DB time and the N+1 suspects seen."""
+    with _routes_lock:
+        routes = {}
+        for route, stats in _routes.items():
+            routes[route] = {
+                "requests": stats["requests"],
+                "mean_queries": round(stats["queries"] / stats["requests"], 2),
+                "max_queries": stats["max_queries"],
+                "mean_db_ms": round(stats["db_ms"] / stats["requests"], 2),
+                "n_plus_one_requests": stats["n_plus_one_requests"],
+                "suspects": [{"statement": key, "max_repeats": count}
+                             for key, count in sorted(stats["suspects"].items(), key=lambda item: -item[1])],
+            }
+        if reset:
+            _routes.clear()
+        return routes
@@ -0,0 +1,258 @@
+import json
+import re
+from dataclasses import dataclass, replace
+
+_WHITESPACE = " \t\r\n"
+_TEXT_SPECIAL = re.compile(r'["\\]')
+_CONTAINER_SPECIAL = re.compile(r'["\\\[\]{}]')
+_CODE_FENCE = re.compile(r"^```[a-zA-Z]*\s*|\s*```$")
+
+
+@dataclass(frozen=True)
+class ChatReply:
+    """A model reply parsed once: the text to show, the recommended dish ids and the raw output.
+
+    valid is True when the raw output matched the {"text": str, "dishes": [{"dish_id": int}, ...]} schema.
+    """
+    text: str
+    dish_ids: tuple
+    raw: str
+    valid: bool
+
+
+def _dish_ids(dishes):
+    dish_ids = []
+    for dish in dishes:
+        if not isinstance(dish, dict):
+            continue
+        dish_id = dish.get("dish_id")
+        if isinstance(dish_id, bool):
+            continue
+        if isinstance(dish_id, int):
+            dish_ids.append(dish_id)
+        elif isinstance(dish_id, float) and dish_id.is_integer():
+            dish_ids.append(int(dish_id))
+        elif isinstance(dish_id, str) and dish_id.strip().isdigit():
+            dish_ids.append(int(dish_id))
+    return tuple(dish_ids)
+
+
+def parse_reply(raw):
+    """Parse a complete model reply. Never raises; malformed output keeps whatever text can be recovered."""
+    raw = raw or ""
+    body = raw.strip()
+    if body.startswith("```"):
+        body = _CODE_FENCE.sub("", body)
+    try:
+        data = json.loads(body)
+    except ValueError:
+        data = None
+    if isinstance(data, dict) and isinstance(data.get("text"), str):
+        dishes = data.get("dishes", [])
+        valid = isinstance(dishes, list)
+        return ChatReply(data["text"], _dish_ids(dishes) if valid else (), raw, valid)
+
+    # Truncated or otherwise broken JSON: take what the incremental parser could read
+    parser = StreamingReplyParser()
+    parser.feed(raw)
+    return replace(parser.close(), valid=False)
+
+
+class StreamingReplyParser:
+    """Incrementally reads a {"text": ..., "dishes": [...]} reply as the model streams it.
+
+    feed() returns the events that became available with the chunk:
+    ("text", delta) for every decoded piece of the text value and
+    ("dishes", (dish_id, ...)) once the dishes array is closed.
+    close() returns the ChatReply for everything fed so far.
+    """
+
+    def __init__(self):
+        self._raw = []
+        self._text = []
+        self.dish_ids = None
+        self._state = "start"
+        self._key = ""
+        self._escape = ""
+        self._value = []
+        self._depth = 0
+        self._in_string = False
+        self._string_escape = False
+        self._text_seen = False
+        self._dishes_valid = True
+
+    @property
+    def raw(self):
+        return "".join(self._raw)
+
+    @property
+    def text(self):
+        return "".join(self._text)
+
+    def feed(self, chunk):
+        events = []
+        self._raw.append(chunk)
+        position, end = 0, len(chunk)
+        while position < end:
+            if self._state == "text" and not self._escape:
+                # Copy plain runs of the text value in one slice instead of character by character
+                match = _TEXT_SPECIAL.search(chunk, position)
+                stop = match.start() if match else end
+                if stop > position:
+                    self._emit_text(chunk[position:stop], events)
+                    position = stop
+                    continue
+            elif self._state == "container" and not self._string_escape:
+                # Same for nested values: only quotes, escapes and brackets change the state
+                special = _TEXT_SPECIAL if self._in_string else _CONTAINER_SPECIAL
+                match = special.search(chunk, position)
+                stop = match.start() if match else end
+                if stop > position:
+                    self._value.append(chunk[position:stop])
+                    position = stop
+                    continue
+            self._step(chunk[position], events)
+            position += 1
+        return events
+
+    def close(self):
+        raw = self.raw
+        if self._state == "start":
+            # Not JSON at all: the model answered in plain text
+            return ChatReply(raw.strip(), (), raw, False)
+        valid = self._state == "done" and self._text_seen and self._dishes_valid
+        return ChatReply(self.text, self.dish_ids or (), raw, valid)
+
+    def _emit_text(self, piece, events):
+        self._text.append(piece)
+        if events and events[-1][0] == "text":
+            events[-1] = ("text", events[-1][1] + piece)
+        else:
+            events.append(("text", piece))
+
+    def _step(self, char, events):
+        state = self._state
+        if state == "start":
+            if char == "{":
+                self._state = "key_or_end"
+        elif state == "key_or_end":
+            if char == '"':
+                self._key = ""
+                self._state = "key"
+            elif char == "}":
+                self._state = "done"
+        elif state == "key":
+            if self._escape:
+                self._escape += char
+                decoded = self._decode_escape()
+                if decoded is not None:
+                    self._key += decoded
+            elif char == "\\":
+                self._escape = "\\"
+            elif char == '"':
+                self._state = "colon"
+            else:
+                self._key += char
+        elif state == "colon":
+            if char == ":":
+                self._state = "value"
+        elif state == "value":
+            if char in _WHITESPACE:
+                return
+            if self._key == "dishes" and char != "[":
+                self._dishes_valid = False
+            if char == '"' and self._key == "text":
+                self._text_seen = True
+                self._state = "text"
+            elif char in "[{":
+                self._value = [char]
+                self._depth = 1
+                self._in_string = False
+                self._string_escape = False
+                self._state = "container"
+            else:
+                self._value = [char]
+                self._in_string = char == '"'
+                self._string_escape = False
+                self._state = "scalar"
+        elif state == "text":
+            if self._escape:
+                self._escape += char
+                decoded = self._decode_escape()
+                if decoded:
+                    self._emit_text(decoded, events)
+            elif char == "\\":
+                self._escape = "\\"
+            elif char == '"':
+                self._state = "after_value"
+            else:
+                self._emit_text(char, events)
+        elif state == "container":
+            self._value.append(char)
+            if self._in_string:
+                if self._string_escape:
+                    self._string_escape = False
+                elif char == "\\":
+                    self._string_escape = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                self._in_string = True
+            elif char in "[{":
+                self._depth += 1
+            elif char in "]}":
+                self._depth -= 1
+                if self._depth == 0:
+                    self._finish_value(events)
+                    self._state = "after_value"
+        elif state == "scalar":
+            if self._in_string:
+                self._value.append(char)
+                if self._string_escape:
+                    self._string_escape = False
+                elif char == "\\":
+                    self._string_escape = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == ",":
+                self._state = "key_or_end"
+            elif char == "}":
+                self._state = "done"
+            else:
+                self._value.append(char)
+        elif state == "after_value":
+            if char == ",":
+                self._state = "key_or_end"
+            elif char == "}":
+                self._state = "done"
+
+    def _decode_escape(self):
+        # Wait for the full escape sequence, including the low half of a surrogate pair
+        escape = self._escape
+        if len(escape) < 2:
+            return None
+        if escape[1] == "u":
+            if len(escape) < 6:
+                return None
+            if escape[2:6].lower().startswith(("d8", "d9", "da", "db")) and len(escape) < 12:
+                return None
+        try:
+            decoded = json.loads(f'"{escape}"')
+        except ValueError:
+            decoded = ""
+        self._escape = ""
+        return decoded
+
+    def _finish_value(self, events):
+        if self._key != "dishes":
+            return
+        try:
+            dishes = json.loads("".join(self._value))
+        except ValueError:
+            self._dishes_valid = False
+            return
+        if isinstance(dishes, list):
+            self.dish_ids = _dish_ids(dishes)
+            events.append(("dishes", self.dish_ids))
+        else:
+            self._dishes_valid = False
@@ -0,0 +1,345 @@
+import asyncio
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import httpx
+import openai
+from app import app
+from app.llm_metrics import create_completion, stream_completion, create_completion_async, stream_completion_async
+
+_RETRYABLE = (openai.APITimeoutError, openai.APIConnectionError, openai.RateLimitError,
+              openai.InternalServerError, httpx.TimeoutException, httpx.TransportError)
+
+
+class LLMUnavailableError(Exception):
+    """The model could not answer within the deadline; callers should fall back."""
+
+
+class CircuitOpenError(LLMUnavailableError):
+    pass
+
+
+def is_retryable(error):
+    if isinstance(error, _RETRYABLE):
+        return True
+    # 408/409 and any other 5xx the SDK does not map to InternalServerError
+    status = getattr(error, "status_code", None)
+    return status in (408, 409) or (status is not None and status >= 500)
+
+
+class CircuitBreaker:
+    """Opens after consecutive retryable failures and fails fast until reset_timeout has passed.
+
+    After the timeout one probe call is let through (half open); its outcome closes or reopens the circuit.
+    """
+
+    def __init__(self, name, failure_threshold=5, reset_timeout=30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = None
+        self.probe_in_flight = False
+        self.total_failures = 0
+        self.rejected = 0
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if self.state == "open" and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = "half_open"
+                self.probe_in_flight = False
+            if self.state == "closed":
+                return True
+            if self.state == "half_open" and not self.probe_in_flight:
+                self.probe_in_flight = True
+                return True
+            self.rejected += 1
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = "closed"
+            self.failures = 0
+            self.probe_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self.total_failures += 1
+            if self.state == "half_open" or self.failures >= self.failure_threshold:
+                if self.state != "open":
+                    print(f"Circuit breaker for {self.name} opened after {self.failures} failures")
+                self.state = "open"
+                self.opened_at = time.monotonic()
+                self.probe_in_flight = False
+
+    def snapshot(self):
+        with self._lock:
+            retry_in = None
+            if self.state == "open":
+                retry_in = round(max(0.0, self.reset_timeout - (time.monotonic() - self.opened_at)), 1)
+            return {
+                "state": self.state,
+                "consecutive_failures": self.failures,
+                "total_failures": self.total_failures,
+                "rejected_calls": self.rejected,
+                "retry_in_seconds": retry_in,
+            }
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+_hedge_pool = ThreadPoolExecutor(max_workers=app.config['LLM_HEDGE_WORKERS'], thread_name_prefix="llm-hedge")
+
+
+def get_breaker(model):
+    with _breakers_lock:
+        breaker = _breakers.get(model)
+        if breaker is None:
+            breaker = CircuitBreaker(model, app.config['LLM_BREAKER_FAILURE_THRESHOLD'], app.config['LLM_BREAKER_RESET_TIMEOUT'])
+            _breakers[model] = breaker
+        return breaker
+
+
+def breaker_states():
+    with _breakers_lock:
+        breakers = list(_breakers.values())
+    return {breaker.name: breaker.snapshot() for breaker in breakers}
+
+
+def _backoff(attempt, remaining, error):
+    retry_after = None
+    response = getattr(error, "response", None)
+    if response is not None:
+        try:
+            retry_after = float(response.headers.get("retry-after"))
+        except (TypeError, ValueError):
+            retry_after = None
+    # Full jitter keeps many workers from retrying in lockstep
+    delay = retry_after if retry_after is not None else random.uniform(
+        0, min(app.config['LLM_RETRY_MAX_DELAY'], app.config['LLM_RETRY_BASE_DELAY'] * 2 ** attempt))
+    return delay if delay < remaining else None
+
+
+def _hedged(call, hedge_after, remaining):
+    """Run call inline; if it has not returned after hedge_after seconds, start a copy on the hedge pool.
+
+    Only copies use the pool, so its size never limits the calls themselves. A blocking call cannot
+    be interrupted, so the copy's answer is taken when the inline call fails. A copy still queued
+    when the inline call returns is cancelled, one already running is left to finish and dropped.
+    """
+    deadline = time.monotonic() + remaining
+    hedges = []
+    lock = threading.Lock()
+
+    def in_context():
+        with app.app_context():
+            return call(max(0.0, deadline - time.monotonic()))
+
+    def start_hedge():
+        with lock:
+            if hedges is not None:
+                hedges.append(_hedge_pool.submit(in_context))
+
+    timer = threading.Timer(hedge_after, start_hedge)
+    timer.daemon = True
+    timer.start()
+    try:
+        return call()
+    except Exception as e:
+        timer.cancel()
+        with lock:
+            started = list(hedges)
+        if not started or not is_retryable(e):
+            raise
+        try:
+            return started[0].result(timeout=max(0.0, deadline - time.monotonic()))
+        except Exception:
+            raise e
+    finally:
+        timer.cancel()
+        with lock:
+            started, hedges = hedges, None
+        for future in started:
+            future.cancel()
+
+
+def resilient_completion(client, purpose, deadline=None, hedge=True, **request):
+    """create_completion with a total deadline, jittered retries, optional hedging and a per-model circuit breaker.
+
+    Raises LLMUnavailableError when the model cannot answer in time; other API errors propagate unchanged.
+    """
+    breaker = get_breaker(request.get("model"))
+    deadline_at = time.monotonic() + (deadline or app.config['LLM_DEADLINE'])
+    hedge_after = app.config['LLM_HEDGE_AFTER'] if hedge else None
+    attempt = 0
+    while True:
+        if not breaker.allow():
+            raise CircuitOpenError(f"Circuit for {breaker.name} is open")
+        remaining = deadline_at - time.monotonic()
+        call = lambda timeout=remaining: create_completion(client, purpose, timeout=timeout, **request)
+        try:
+            if hedge_after and hedge_after < remaining:
+                completion = _hedged(call, hedge_after, remaining)
+            else:
+                completion = call()
+        except Exception as e:
+            if not is_retryable(e):
+                breaker.record_success()
+                raise
+            breaker.record_failure()
+            attempt += 1
+            remaining = deadline_at - time.monotonic()
+            delay = _backoff(attempt, remaining, e) if attempt < app.config['LLM_MAX_ATTEMPTS'] else None
+            if delay is None:
+                raise LLMUnavailableError(str(e)) from e
+            time.sleep(delay)
+            continue
+        breaker.record_success()
+        return completion
+
+
+def resilient_stream(client, purpose, deadline=None, **request):
+    """stream_completion with the same policy. Only the wait for the first chunk is retried;
+    a stream that fails after output has been sent raises the original error."""
+    breaker = get_breaker(request.get("model"))
+    deadline_at = time.monotonic() + (deadline or app.config['LLM_DEADLINE'])
+    attempt = 0
+    while True:
+        if not breaker.allow():
+            raise CircuitOpenError(f"Circuit for {breaker.name} is open")
+        remaining = deadline_at - time.monotonic()
+        stream = stream_completion(client, purpose, timeout=remaining, **request)
+        try:
+            first = next(stream)
+        except StopIteration:
+            breaker.record_success()
+            return
+        except Exception as e:
+            if not is_retryable(e):
+                breaker.record_success()
+                raise
+            breaker.record_failure()
+            attempt += 1
+            remaining = deadline_at - time.monotonic()
+            delay = _backoff(attempt, remaining, e) if attempt < app.config['LLM_MAX_ATTEMPTS'] else None
+            if delay is None:
+                raise LLMUnavailableError(str(e)) from e
+            time.sleep(delay)
+            continue
+        break
+
+    # A first chunk means the service answers; recording it now also releases a half-open probe
+    # when the client disconnects before the stream ends
+    breaker.record_success()
+    yield first
+    try:
+        yield from stream
+    except Exception as e:
+        if is_retryable(e):
+            breaker.record_failure()
+        raise
+
+
+async def _hedged_async(call, hedge_after, remaining):
+    """_hedged for coroutines. Both calls are tasks on the running loop, so the first answer wins
+    and the other request is cancelled, which closes its connection."""
+    deadline = time.monotonic() + remaining
+    tasks = [asyncio.ensure_future(call())]
+    error = None
+    try:
+        done, _ = await asyncio.wait(tasks, timeout=hedge_after)
+        if not done:
+            tasks.append(asyncio.ensure_future(call(max(0.0, deadline - time.monotonic()))))
+        pending = set(tasks)
+        while pending:
+            done, pending = await asyncio.wait(pending, timeout=max(0.0, deadline - time.monotonic()),
+                                               return_when=asyncio.FIRST_COMPLETED)
+            if not done:
+                break
+            for task in done:
+                if task.exception() is None:
+                    return task.result()
+                error = task.exception()
+    finally:
+        # Also runs when the caller is cancelled, e.g. the client went away
+        for task in tasks:
+            task.cancel()
+    raise error or openai.APITimeoutError(request=httpx.Request("POST", "/chat/completions"))
+
+
+async def resilient_completion_async(client, purpose, deadline=None, hedge=True, **request):
+    """resilient_completion for an AsyncOpenAI client; shares the circuit breakers with the sync path."""
+    breaker = get_breaker(request.get("model"))
+    deadline_at = time.monotonic() + (deadline or app.config['LLM_DEADLINE'])
+    hedge_after = app.config['LLM_HEDGE_AFTER'] if hedge else None
+    attempt = 0
+    while True:
+        if not breaker.allow():
+            raise CircuitOpenError(f"Circuit for {breaker.name} is open")
+        remaining = deadline_at - time.monotonic()
+        call = lambda timeout=remaining: create_completion_async(client, purpose, timeout=timeout, **request)
+        try:
+            if hedge_after and hedge_after < remaining:
+                completion = await _hedged_async(call, hedge_after, remaining)
+            else:
+                completion = await call()
+        except Exception as e:
+            if not is_retryable(e):
+                breaker.record_success()
+                raise
+            breaker.record_failure()
+            attempt += 1
+            remaining = deadline_at - time.monotonic()
+            delay = _backoff(attempt, remaining, e) if attempt < app.config['LLM_MAX_ATTEMPTS'] else None
+            if delay is None:
+                raise LLMUnavailableError(str(e)) from e
+            await asyncio.sleep(delay)
+            continue
+        breaker.record_success()
+        return completion
+
+
+async def resilient_stream_async(client, purpose, deadline=None, **request):
+    """resilient_stream for an AsyncOpenAI client."""
+    breaker = get_breaker(request.get("model"))
+    deadline_at = time.monotonic() + (deadline or app.config['LLM_DEADLINE'])
+    attempt = 0
+    while True:
+        if not breaker.allow():
+            raise CircuitOpenError(f"Circuit for {breaker.name} is open")
+        remaining = deadline_at - time.monotonic()
+        stream = stream_completion_async(client, purpose, timeout=remaining, **request)
+        try:
+            first = await stream.__anext__()
+        except StopAsyncIteration:
+            breaker.record_success()
+            return
+        except Exception as e:
+            if not is_retryable(e):
+                breaker.record_success()
+                raise
+            breaker.record_failure()
+            attempt += 1
+            remaining = deadline_at - time.monotonic()
+            delay = _backoff(attempt, remaining, e) if attempt < app.config['LLM_MAX_ATTEMPTS'] else None
+            if delay is None:
+                raise LLMUnavailableError(str(e)) from e
+            await asyncio.sleep(delay)
+            continue
+        break
+
+    breaker.record_success()
+    try:
+        yield first
+        async for chunk in stream:
+            yield chunk
+    except Exception as e:
+        if is_retryable(e):
+            breaker.record_failure()
+        raise
+    finally:
+        await stream.aclose()
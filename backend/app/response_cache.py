@@ -0,0 +1,102 @@
+import hashlib
+import re
+import threading
+import time
+from collections import OrderedDict
+from app import app
+
+_CONTRACTIONS = {
+    "what's": "what is", "whats": "what is", "what're": "what are", "i'd": "i would", "i'm": "i am",
+    "don't": "do not", "dont": "do not", "isn't": "is not", "aren't": "are not", "there's": "there is",
+    "u": "you", "pls": "please", "plz": "please",
+}
+_FILLER = {"please", "hi", "hey", "hello", "thanks", "thank", "you", "can", "could", "would", "me", "the", "a", "an", "some", "any"}
+# Words that point back at earlier turns; questions using them depend on the conversation
+_REFERENTIAL = {"it", "its", "that", "those", "them", "this", "these", "they", "one", "ones", "more", "another",
+                "again", "else", "instead", "also", "above", "previous", "earlier", "last", "first", "second",
+                "same", "other", "others", "cheaper", "bigger", "smaller"}
+
+
+def normalize_question(user_input):
+    text = (user_input or "").lower().replace("’", "'")
+    words = [_CONTRACTIONS.get(word, word) for word in text.split()]
+    text = re.sub(r"[^a-z0-9$.\s]", " ", " ".join(words)).replace(". ", " ").rstrip(".")
+    return " ".join(word for word in text.split() if word not in _FILLER)
+
+
+def is_context_free(user_input):
+    words = re.sub(r"[^a-z0-9\s]", " ", (user_input or "").lower()).split()
+    return bool(words) and not any(word in _REFERENTIAL for word in words)
+
+
+class ResponseCache:
+    """Thread-safe LRU cache of model replies with a per-entry time to live."""
+
+    def __init__(self, max_entries=1000, ttl=600):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+response_cache = ResponseCache(app.config['RESPONSE_CACHE_MAX_ENTRIES'], app.config['RESPONSE_CACHE_TTL'])
+
+
+def _profile_digest(context):
+    """Hash of the free-text preference and user description, which go into the prompt besides the mask."""
+    profile = f"{context.preference_text}\0{context.user_description or ''}"
+    return hashlib.sha256(profile.encode()).hexdigest()[:16]
+
+
+def get_response_cache_key(context, user_input):
+    """Cache key for the turn, or None when the reply may depend on the conversation so far.
+
+    Diners share an entry only when their dietary mask, free-text preference and description all match,
+    so a reply written around one diner's allergy is never served to another.
+    """
+    if not app.config['RESPONSE_CACHE_ENABLED']:
+        return None
+    question = normalize_question(user_input)
+    if not question:
+        return None
+    if not context.is_first_turn and not is_context_free(user_input):
+        return None
+    return context.rest_id, context.menu_version, context.preference_mask, _profile_digest(context), question
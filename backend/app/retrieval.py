@@ -0,0 +1,106 @@
+import math
+import re
+import threading
+from collections import Counter
+from app import app
+from app.models import Dish
+from app.functions import compact_dish_row
+
+_STOPWORDS = {
+    "a", "an", "and", "any", "are", "can", "do", "dish", "dishes", "for", "have", "i", "in", "is", "it", "me",
+    "of", "on", "or", "please", "show", "some", "something", "the", "to", "want", "what", "with", "you", "your",
+    "like", "would", "get", "give", "there", "today", "recommend", "suggest", "assistant", "user",
+}
+_TOKEN = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text):
+    tokens = []
+    for token in _TOKEN.findall((text or "").lower()):
+        if token in _STOPWORDS or len(token) < 2 or token.isdigit():
+            continue
+        # Light plural folding so "noodles" matches "noodle"
+        if len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+            token = token[:-1]
+        tokens.append(token)
+    return tokens
+
+
+class DishIndex:
+    """In-process TF-IDF index over dish names and descriptions of one restaurant."""
+
+    def __init__(self, dishes):
+        self.dish_ids = []
+        self.rows = {}
+        self.masks = {}
+        documents = []
+        for dish in dishes:
+            self.dish_ids.append(dish.id)
+            self.rows[dish.id] = compact_dish_row(dish)
+            self.masks[dish.id] = dish.dietary_mask or 0
+            # Names count double: they are what diners ask for
+            documents.append(Counter(tokenize(dish.dish_name) * 2 + tokenize(dish.description)))
+
+        total = len(documents)
+        document_frequency = Counter(term for document in documents for term in document)
+        self.idf = {term: math.log((1 + total) / (1 + df)) + 1 for term, df in document_frequency.items()}
+        self.postings = {}
+        for position, document in enumerate(documents):
+            weights = {term: (1 + math.log(count)) * self.idf[term] for term, count in document.items()}
+            norm = math.sqrt(sum(weight * weight for weight in weights.values())) or 1.0
+            for term, weight in weights.items():
+                self.postings.setdefault(term, []).append((position, weight / norm))
+
+    def __len__(self):
+        return len(self.dish_ids)
+
+    def search(self, weighted_texts, k):
+        """Top-k dish ids for [(text, weight), ...]; index order fills up when nothing matches."""
+        query = Counter()
+        for text, weight in weighted_texts:
+            for term in tokenize(text):
+                if term in self.idf:
+                    query[term] += weight * self.idf[term]
+        scores = Counter()
+        for term, query_weight in query.items():
+            for position, weight in self.postings[term]:
+                scores[position] += query_weight * weight
+
+        ranked = [position for position, _ in scores.most_common(k)]
+        if len(ranked) < k:
+            seen = set(ranked)
+            ranked += [position for position in range(len(self.dish_ids)) if position not in seen][:k - len(ranked)]
+        return [self.dish_ids[position] for position in ranked]
+
+
+_indexes = {}
+_lock = threading.Lock()
+
+
+def get_dish_index(rest_id, version):
+    entry = _indexes.get(rest_id)
+    if entry and entry[0] == version:
+        return entry[1]
+    dishes = (Dish.query
+              .filter(Dish.restaurant_id == rest_id, Dish.menu_id.isnot(None))
+              .order_by(Dish.id)
+              .all())
+    index = DishIndex(dishes)
+    with _lock:
+        current = _indexes.get(rest_id)
+        if not current or current[0] <= version:
+            _indexes[rest_id] = (version, index)
+    return index
+
+
+def get_relevant_menu_for_chatbot(index, required, user_input, history):
+    """Compact rows of the dishes most relevant to the input and recent history, with a match flag."""
+    recent = [message["content"] for message in history if message["role"] in ("user", "assistant")][-4:]
+    weighted = [(user_input, 1.0)] + [(text, 0.5) for text in recent]
+    dish_ids = index.search(weighted, app.config['RETRIEVAL_TOP_K'])
+
+    lines = ["Most relevant dishes for this request (last column: Y if it fits the user's dietary preferences):"]
+    for dish_id in dish_ids:
+        matches = index.masks[dish_id] & required == required
+        lines.append(f"{index.rows[dish_id]}|{'Y' if matches else 'N'}")
+    return "\n".join(lines)
@@ -1,13 +1,24 @@
-from flask import jsonify, request, json, send_file, current_app
+from flask import jsonify, request, json, send_file, current_app, Response, stream_with_context
 import os
 from app import app, db
 from app.models import User, Preferences, Restaurant, Menu, Dish, Theme, Order, OrderItem, Conversation, Favorites, Conversation,Cart,CartItem
-from ai import create_user_description,chatbot_chat
+from ai import chatbot_chat,chatbot_chat_stream
 from werkzeug.security import generate_password_hash, check_password_hash
 from flask_jwt_extended import create_access_token, jwt_required, get_jwt_identity, get_jwt
 from datetime import timedelta
-from app.functions import sort_user_preferences, generate_session_id,hash_filename,generate_random_string,return_link,clear_cart
-from openai import OpenAIError
+from app.functions import sort_user_preferences, generate_session_id,hash_filename,generate_random_string,return_link,clear_cart,get_dish_cards,get_message_dish_cards,get_recommendation_analytics
+from app.menu_cache import bump_menu_version, menu_prompt_cache_stats, MENU_ENCODINGS
+from app.ai_client import prompt_usage_stats
+from app.llm_metrics import llm_call_stats
+from app.intent_router import intent_router_stats
+from app.resilience import breaker_states
+from sqlalchemy import text
+from app.response_cache import response_cache
+from app.description_jobs import enqueue_description_job, notify_description_workers
+from app.chat_store import chat_write_stats, chat_session_exists
+from app.query_profiler import query_profile_stats
+from app.db_routing import read_replica
+from app.auth import role_required, current_role, RESTAURANT, ADMIN
 from dotenv import load_dotenv
 import openai
 
@@ -70,14 +81,12 @@ def register_user():
             is_jain=is_jain
         )
         db.session.add(preferences)
-
-        try:
-            user.user_description = create_user_description(user.id, app.config['OPENAI_API_KEY'])
-        except OpenAIError as e:
-            return jsonify({'error': str(e)}), 500
+        # The description is generated in the background; the user row does not wait for it
+        enqueue_description_job(user.id)
 
         db.session.add(user)
         db.session.commit()
+        notify_description_workers()
         if profile_photo:
             ext = profile_photo.filename.split('.')[-1]
             unique_filename = f"{generate_random_string(16)}.{ext}"
@@ -93,6 +102,22 @@ def register_user():
         db.session.rollback()
         return jsonify({'message': str(e)}), 500
     
+# Open to load balancers and uptime checks, so it only says what is up; the reasons go to the log
+@app.route('/api/health', methods=['GET'])
+def health():
+    try:
+        db.session.execute(text("SELECT 1"))
+        database = "ok"
+    except Exception:
+        db.session.rollback()
+        app.logger.exception("Health check could not reach the database")
+        database = "unavailable"
+    breakers = {name: {"state": breaker["state"], "retry_in_seconds": breaker["retry_in_seconds"]}
+                for name, breaker in breaker_states().items()}
+    degraded = any(breaker["state"] != "closed" for breaker in breakers.values())
+    status = "ok" if database == "ok" and not degraded else ("degraded" if database == "ok" else "down")
+    return jsonify({"status": status, "database": database, "llm": breakers}), 503 if status == "down" else 200
+
 @app.route('/api/role', methods=['GET'])
 @jwt_required()
 def get_user_role():
@@ -105,13 +130,17 @@ def get_user_role():
 def get_user():
     user_id = get_jwt_identity()
     try:
-        
-        user = User.query.get(user_id)
-        if not user:
+        # Five queries whatever the history size: user with preferences, then the last orders,
+        # favorites, favorite dishes and last conversations, each joined to the restaurant name
+        row = (db.session.query(User, Preferences)
+               .outerjoin(Preferences, Preferences.user_id == User.id)
+               .filter(User.id == user_id)
+               .order_by(Preferences.id)
+               .first())
+        if not row:
             return jsonify({'message': 'User not found'}), 404
+        user, preferences = row
 
-        
-        preferences = Preferences.query.filter_by(user_id=user_id).first()
         preferences_data = {
             "is_lactose_intolerant": preferences.is_lactose_intolerant if preferences else None,
             "is_halal": preferences.is_halal if preferences else None,
@@ -124,44 +153,48 @@ def get_user():
         other_preferences_data = {
             "preference": preferences.preference if preferences else None,
         }
-        
-        orders = user.orders[-5:]
+
+        orders = (db.session.query(Order.id, Order.restaurant_id, Restaurant.name, Order.total_cost, Order.timestamp)
+                  .join(Restaurant, Restaurant.id == Order.restaurant_id)
+                  .filter(Order.user_id == user_id)
+                  .order_by(Order.id.desc())
+                  .limit(5)
+                  .all())
         orders_data = [
             {
                 "id": order.id,
                 "restaurant_id": order.restaurant_id,
-                "restaurant_name": Restaurant.query.get(order.restaurant_id).name,
+                "restaurant_name": order.name,
                 "total_cost": order.total_cost,
                 "timestamp": order.timestamp.strftime("%Y-%m-%d %H:%M:%S")
             }
-            for order in orders
+            for order in reversed(orders)
         ]
 
-        
-        favorite_restaurants = [
-            {
-                "id": fav.restaurant_id,
-                "name": Restaurant.query.get(fav.restaurant_id).name
-            }
-            for fav in Favorites.query.filter_by(user_id=user_id).all()
-        ]
+        favorites = (db.session.query(Favorites.restaurant_id, Restaurant.name)
+                     .join(Restaurant, Restaurant.id == Favorites.restaurant_id)
+                     .filter(Favorites.user_id == user_id)
+                     .order_by(Favorites.id)
+                     .all())
+        favorite_restaurants = [{"id": fav.restaurant_id, "name": fav.name} for fav in favorites]
+        favorite_ids = db.session.query(Favorites.id).filter(Favorites.user_id == user_id)
         favorite_dishes = [
-            {
-                "id": dish.id,
-                "name": dish.dish_name
-            }
-            for dish in Dish.query.filter(Dish.favorites_id.in_(
-                [fav.id for fav in Favorites.query.filter_by(user_id=user_id).all()]
-            )).all()
+            {"id": dish.id, "name": dish.dish_name}
+            for dish in db.session.query(Dish.id, Dish.dish_name).filter(Dish.favorites_id.in_(favorite_ids.scalar_subquery()))
         ]
 
-
-        conversations = Conversation.query.filter_by(user_id=user_id).order_by(Conversation.created_at.desc()).limit(5).all()
+        conversations = (db.session.query(Conversation.id, Conversation.rest_id, Restaurant.name, Conversation.content,
+                                          Conversation.created_at)
+                         .join(Restaurant, Restaurant.id == Conversation.rest_id)
+                         .filter(Conversation.user_id == user_id)
+                         .order_by(Conversation.created_at.desc(), Conversation.id.desc())
+                         .limit(5)
+                         .all())
         conversations_data = [
             {
                 "id": convo.id,
                 "rest_id": convo.rest_id,
-                "restaurant_name": Restaurant.query.get(convo.rest_id).name,
+                "restaurant_name": convo.name,
                 "content": convo.content,
                 "created_at": convo.created_at.strftime("%Y-%m-%d %H:%M:%S"),
             }
@@ -267,8 +300,9 @@ def edit_user():
         user_pref.is_allergic_to_gluten = is_allergic_to_gluten or user_pref.is_allergic_to_gluten
         user_pref.is_jain = is_jain or user_pref.is_jain
         if preference or is_lactose_intolerant or is_halal or is_vegan or is_vegetarian or is_allergic_to_gluten or is_jain:
-            user.user_description = create_user_description(user.id,app.config['OPENAI_API_KEY'])
+            enqueue_description_job(user.id)
         db.session.commit()
+        notify_description_workers()
         return jsonify({"message": "User updated successfully"}), 200
     except Exception as e:
         db.session.rollback()
@@ -386,11 +420,15 @@ def edit_restaurant():
     is_vegan = data.get('is_vegan')
     is_halal = data.get('is_halal')
     description = data.get('description')
+    menu_encoding = data.get('menu_encoding')
     banner = request.files.get('banner')
     profile_picture = request.files.get('profile_picture')
     banner_path = None
     profile_picture_path = None
 
+    if menu_encoding and menu_encoding not in MENU_ENCODINGS:
+        return jsonify({"message": f"menu_encoding must be one of: {', '.join(MENU_ENCODINGS)}"}), 400
+
     if banner:
         old_banner = restaurant.banner
         if old_banner:
@@ -422,6 +460,7 @@ def edit_restaurant():
         restaurant.is_vegan = is_vegan or restaurant.is_vegan
         restaurant.is_halal = is_halal or restaurant.is_halal
         restaurant.description = description or restaurant.description
+        restaurant.menu_encoding = menu_encoding or restaurant.menu_encoding
         restaurant.banner = banner_path or restaurant.banner
         restaurant.profile_picture = profile_picture_path or restaurant.profile_picture
         db.session.commit()
@@ -431,6 +470,7 @@ def edit_restaurant():
         return jsonify({"message": str(e)}), 500
     
 @app.route('/api/restaurant/landing/<int:rest_id>',methods=['GET'])
+@read_replica
 def get_restaurant(rest_id):
     print(Menu.query.filter_by(restaurant_id=rest_id).all())
     restaurant = Restaurant.query.get(rest_id)
@@ -475,11 +515,13 @@ def create_menu():
         return jsonify({"message": "Please provide menu type."}), 401
     new_menu = Menu(menu_type=menu_type, restaurant_id=rest_id)
     db.session.add(new_menu)
+    bump_menu_version(rest_id)
     db.session.commit()
     return jsonify({"message": "Menu created successfully"}), 201
 
 @app.route('/api/get_menu',methods=['GET'])
 @jwt_required()
+@read_replica
 def get_menus():
     rest_id = get_jwt_identity()
     menu = Menu.query.filter_by(restaurant_id=rest_id).all()
@@ -496,6 +538,7 @@ def delete_menu(menu_id):
         return jsonify({"message": "Menu not found"}), 404
     try:
         db.session.delete(menu)
+        bump_menu_version(menu.restaurant_id)
         db.session.commit()
         return jsonify({"message": "Menu deleted successfully"}), 200
     except Exception as e:
@@ -557,6 +600,7 @@ def create_dish():
         image=image_path)
     try:
         db.session.add(new_dish)
+        bump_menu_version(rest_id)
         db.session.commit()
         return jsonify({"message": "Dish created successfully"}), 201
     except Exception as e:
@@ -565,6 +609,7 @@ def create_dish():
 
 @app.route('/api/get_all_dishes',methods=['GET'])
 @jwt_required()
+@read_replica
 def get_dishes():
     rest_id = get_jwt_identity()
     dishes = Dish.query.filter_by(restaurant_id=rest_id).all()
@@ -630,6 +675,7 @@ def add_to_menu():
         return jsonify({"message": "Dish is already in the specified menu"}), 400
     try:
         dish.menu_id = menu_id  
+        bump_menu_version(rest_id)
         db.session.commit()
     except Exception as e:
         db.session.rollback()
@@ -885,93 +931,134 @@ def chat(rest_id):
     user = db.session.get(User, user_id)
     if not user:
         return jsonify({"message": "User not found"}), 404
+    if not chat_session_exists(user_id, rest_id, session_id):
+        return jsonify({"message": "Chat session not found"}), 404
     data = request.get_json()
     user_input = data.get('user_input')
     try:
-        try:
+        reply = chatbot_chat(user_id, rest_id, user_input, session_id, app.config['OPENAI_API_KEY'])
+    except Exception as e:
+        print(str(e))
+        return jsonify({"message": "Error with chat", "error": str(e)}), 500
+    try:
+        return_dishes = get_dish_cards(reply.dish_ids)
+        return jsonify({"text": reply.text, "dish_details": return_dishes}), 200
+    except Exception as e:
+        return jsonify({"message": "Error processing chat", "error": str(e)}), 500
+    
+@app.route('/api/chat/<int:rest_id>/stream', methods=['POST'])
+@jwt_required()
+def chat_stream(rest_id):
+    user_id = get_jwt_identity()
+    data = request.get_json()
+    session_id = data.get('session_id')
+    if not session_id:
+        return jsonify({"message": "Missing session_id"}), 400
+    user = db.session.get(User, user_id)
+    if not user:
+        return jsonify({"message": "User not found"}), 404
+    if not chat_session_exists(user_id, rest_id, session_id):
+        return jsonify({"message": "Chat session not found"}), 404
+    user_input = data.get('user_input')
 
-            chat_response_tuple = chatbot_chat(user_id, rest_id, user_input, session_id, app.config['OPENAI_API_KEY'])
-            
-            chat_response = chat_response_tuple[0]
-            print(chat_response.get_json()) 
+    def sse(event, payload):
+        return f"event: {event}\ndata: {json.dumps(payload)}\n\n"
 
-            chat_reply = chat_response.json.get("reply", "{}")
-            chat_reply = json.loads(chat_reply)
-    
-        except Exception as e: 
-            print(str(e))
-            return jsonify({"message": "Error with chat", "error": str(e)}), 500
+    def generate():
+        dish_details = None
+        events = chatbot_chat_stream(user_id, rest_id, user_input, session_id, app.config['OPENAI_API_KEY'])
+        try:
+            for event, value in events:
+                if event == "text":
+                    yield sse("delta", {"text": value})
+                elif event == "dishes":
+                    dish_details = get_dish_cards(value)
+                    yield sse("dishes", {"dish_details": dish_details})
+                elif event == "done":
+                    if dish_details is None:
+                        dish_details = get_dish_cards(value.dish_ids)
+                    yield sse("done", {"text": value.text, "dish_details": dish_details})
+                elif event == "error":
+                    # The turn is already saved with the partial reply (ai.py); the details stay in the log
+                    app.logger.error(f"Chat stream for session {session_id} failed: {value}")
+                    yield sse("error", {"message": "Error with chat"})
+        except Exception:
+            app.logger.exception(f"Error relaying chat stream for session {session_id}")
+            yield sse("error", {"message": "Error processing chat"})
+            try:
+                # Let the turn run to the end so it is saved, even though the client gets no more of it
+                for _ in events:
+                    pass
+            except Exception:
+                app.logger.exception(f"Chat turn for session {session_id} did not finish")
+
+    return Response(stream_with_context(generate()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+# Process wide, across restaurants, so for admins only
+@app.route('/api/chat/cache_stats', methods=['GET'])
+@role_required(ADMIN)
+def get_chat_cache_stats():
+    return jsonify({
+        "menu_prompts": menu_prompt_cache_stats(),
+        "prompt_tokens": prompt_usage_stats(),
+        "responses": response_cache.stats(),
+        "intent_router": intent_router_stats(),
+        "chat_writes": chat_write_stats(),
+    }), 200
+
+@app.route('/api/chat/llm_stats', methods=['GET'])
+@role_required(RESTAURANT, ADMIN)
+def get_llm_stats():
+    since_hours = request.args.get('since_hours', default=24, type=float)
+    purpose = request.args.get('purpose')
+    # A restaurant only sees its own calls; an admin sees every restaurant or the one asked for
+    if current_role() == RESTAURANT:
+        rest_id = int(get_jwt_identity())
+    else:
+        rest_id = request.args.get('rest_id', type=int)
+    return jsonify(llm_call_stats(since_hours, purpose, rest_id=rest_id)), 200
 
-        if not isinstance(chat_reply, dict):
-            return jsonify({"message": "Invalid reply format", "error": "Expected a dictionary"}), 400
+@app.route('/api/debug/query_stats', methods=['GET'])
+@role_required(ADMIN)
+def get_query_stats():
+    if not app.config['QUERY_PROFILER_ENABLED']:
+        return jsonify({"message": "Query profiler is off, start the server with QUERY_PROFILER=1"}), 404
+    reset = request.args.get('reset', default=0, type=int)
+    return jsonify({"routes": query_profile_stats(reset=bool(reset))}), 200
 
-        text = chat_reply.get('text', "")
-        dishes = chat_reply.get('dishes', [])
-        dish_ids = [dish.get("dish_id") for dish in dishes if "dish_id" in dish]
-        queried_dishes = Dish.query.filter(Dish.id.in_(dish_ids)).all()
-        dish_details = [
-            {
-                "dish_id": dish.id,
-                **dish.image_and_name(),
-                "is_vegetarian": dish.is_vegetarian,
-                "price": dish.price
-            }
-            for dish in queried_dishes
-        ]
-        return_dishes = [
-            {
-                "dish_id": dish["dish_id"],
-                "name": dish["name"],
-                "image": return_link(dish["image"]),
-                "is_vegetarian": dish["is_vegetarian"],
-                "price": dish["price"]
-            }
-            for dish in dish_details
-        ]
-        return jsonify({"text": text, "dish_details": return_dishes}), 200
-    except Exception as e:
-        return jsonify({"message": "Error processing chat", "error": str(e)}), 500
-    
 @app.route('/api/chat/<int:rest_id>/session/<string:session_id>', methods=['GET'])
 @jwt_required()
+@read_replica
 def get_chat_session(rest_id, session_id):
     user_id = get_jwt_identity()
+    # Polling clients pass the last message_id they have and only get the newer messages
+    since_message_id = request.args.get('since_message_id', type=int)
     try:
-        messages = Conversation.query.filter_by(
+        query = Conversation.query.filter_by(
             session_id=session_id,
             user_id=user_id,
             rest_id=rest_id
-        ).order_by(Conversation.id.asc()).all()
-        if not messages:
+        )
+        if since_message_id is not None:
+            query = query.filter(Conversation.id > since_message_id)
+        messages = query.order_by(Conversation.id.asc()).all()
+        if not messages and since_message_id is None:
             return jsonify({"message": "No messages found for this session"}), 404
+
+        # Every dish of the transcript in one query instead of one per dish per message
+        cards = get_message_dish_cards(message.id for message in messages)
         formatted_messages = [
             {
-            "message_id": message.id,
-            "sender": message.role,
-            "text": message.content,
-            "dish_ids": message.dish_ids,
+                "message_id": message.id,
+                "sender": message.role,
+                "text": message.content,
+                "dish_details": cards.get(message.id, []),
             }
             for message in messages
         ]
-        print(formatted_messages)
-        
-        for message in formatted_messages:
-            dishes = []
-            for dish_id in message['dish_ids']:
-                if dish_id:
-                    dish = Dish.query.filter_by(id=dish_id).first()
-                    if dish:
-                        dishes.append({
-                            "dish_id": dish.id,
-                            "name": dish.dish_name,
-                            "image": return_link(dish.image),
-                            "is_vegetarian": dish.is_vegetarian,
-                            "price": dish.price
-                        })
-            message["dish_details"] = dishes
-            del message["dish_ids"]
-        print(formatted_messages)
-        return jsonify({"messages": formatted_messages}), 200
+        last_message_id = messages[-1].id if messages else since_message_id
+        return jsonify({"messages": formatted_messages, "last_message_id": last_message_id}), 200
 
     except Exception as e:
         current_app.logger.error(f"Unexpected error: {str(e)}")
@@ -1054,6 +1141,7 @@ def serve_image(filename):
     
 @app.route('/api/restaurant/orders', methods=['GET'])
 @jwt_required()
+@read_replica
 def get_restaurant_orders():
     try:
         restaurant_id = get_jwt_identity()
@@ -1069,6 +1157,18 @@ def get_restaurant_orders():
     except Exception as e:
         return jsonify({"message": f"An error occurred: {str(e)}"}), 500
 
+@app.route('/api/restaurant/recommendations', methods=['GET'])
+@role_required(RESTAURANT)
+@read_replica
+def get_recommendation_stats():
+    # Only ever the analytics of the restaurant the token was issued to
+    restaurant_id = int(get_jwt_identity())
+    sort = request.args.get('sort', default='recommended')
+    if sort not in ('recommended', 'ordered'):
+        return jsonify({"message": "sort must be 'recommended' or 'ordered'."}), 400
+    limit = min(max(request.args.get('limit', default=20, type=int), 1), 100)
+    return jsonify({"dishes": get_recommendation_analytics(restaurant_id, sort=sort, limit=limit)}), 200
+
 
 # @app.route('/api/restaurant/orders/<int:order_id>', methods=['PUT'])
 # @jwt_required()
@@ -0,0 +1,24 @@
+from sqlalchemy import event
+
+
+def apply_sqlite_pragmas(dbapi_connection, pragmas):
+    cursor = dbapi_connection.cursor()
+    try:
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+    finally:
+        cursor.close()
+
+
+def install_sqlite_pragmas(engine, pragmas):
+    """Run the SQLITE_PRAGMAS on every new pooled connection of engine. Other databases are left alone.
+
+    Most pragmas only last for the connection that ran them, so setting them once (as run.py
+    used to do for foreign_keys) misses every other connection in the pool.
+    """
+    if engine.dialect.name != "sqlite" or not pragmas:
+        return
+
+    @event.listens_for(engine, "connect")
+    def set_pragmas(dbapi_connection, connection_record):
+        apply_sqlite_pragmas(dbapi_connection, pragmas)
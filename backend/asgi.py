@@ -0,0 +1,224 @@
+"""ASGI entry point: the chat routes run as coroutines, everything else is the Flask app.
+
+A chat turn spends almost all of its time waiting for the model. Under WSGI that wait pins a
+worker thread per request; here it is an awaited AsyncOpenAI call, and only the short database
+work is handed to worker threads, so one process holds hundreds of open chats while the rest of
+the API keeps answering through the wrapped Flask app.
+
+    uvicorn asgi:application --host 0.0.0.0 --port 5000
+"""
+import asyncio
+import json
+import re
+from asgiref.sync import ThreadSensitiveContext
+from asgiref.wsgi import WsgiToAsgi
+from flask_jwt_extended import decode_token
+from jwt import ExpiredSignatureError, PyJWTError
+from app import app, db
+from app.models import User
+from app.functions import get_dish_cards, run_in_app_context, sync_dietary_masks
+from app.description_jobs import start_description_workers, stop_description_workers
+from app.chat_store import chat_session_exists
+from ai import chatbot_chat_async, chatbot_chat_stream_async
+
+_CHAT_ROUTE = re.compile(r"^/api/chat/(\d+)(/stream)?/?$")
+_MAX_BODY = 1024 * 1024
+flask_app = WsgiToAsgi(app)
+
+
+class _HTTPError(Exception):
+    def __init__(self, status, payload):
+        super().__init__(payload)
+        self.status = status
+        self.payload = payload
+
+
+async def application(scope, receive, send):
+    if scope["type"] == "lifespan":
+        await _lifespan(receive, send)
+        return
+    match = _CHAT_ROUTE.match(scope.get("path", "")) if scope["type"] == "http" else None
+    if match is None or scope["method"] != "POST":
+        # Without a context of its own every WSGI request would share asgiref's single sync thread
+        async with ThreadSensitiveContext():
+            await flask_app(scope, receive, send)
+        return
+    rest_id, stream = int(match.group(1)), bool(match.group(2))
+    headers = {key.decode("latin-1").lower(): value.decode("latin-1") for key, value in scope["headers"]}
+    cors = _cors_headers(headers)
+    # Only for the configuration and JWT decoding; database work gets its own context per step (run_in_app_context)
+    with app.app_context():
+        try:
+            user_id, session_id, user_input = await _chat_request(headers, receive, rest_id)
+        except _HTTPError as e:
+            await _send_json(send, e.status, e.payload, cors)
+            return
+        if stream:
+            await _chat_stream(send, receive, cors, user_id, rest_id, session_id, user_input)
+        else:
+            await _chat(send, cors, user_id, rest_id, session_id, user_input)
+
+
+async def _lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            try:
+                await run_in_app_context(sync_dietary_masks)
+                if app.config['DESCRIPTION_WORKERS_ENABLED']:
+                    await asyncio.to_thread(start_description_workers)
+            except Exception as e:
+                await send({"type": "lifespan.startup.failed", "message": str(e)})
+                return
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            # A job in flight ends within the model call deadline; one cut short is requeued once its lease expires
+            await asyncio.to_thread(stop_description_workers, app.config['LLM_DEADLINE'])
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+def _cors_headers(headers):
+    # Same answer Flask-CORS gives the rest of the API (supports_credentials=True, any origin)
+    origin = headers.get("origin")
+    if not origin:
+        return []
+    return [(b"access-control-allow-origin", origin.encode("latin-1")),
+            (b"access-control-allow-credentials", b"true"),
+            (b"vary", b"Origin")]
+
+
+def _identity(headers):
+    authorization = headers.get("authorization", "")
+    if not authorization:
+        raise _HTTPError(401, {"msg": "Missing Authorization Header"})
+    scheme, _, token = authorization.partition(" ")
+    if scheme != "Bearer" or not token:
+        raise _HTTPError(422, {"msg": "Bad Authorization header. Expected 'Authorization: Bearer <JWT>'"})
+    try:
+        claims = decode_token(token)
+    except ExpiredSignatureError:
+        raise _HTTPError(401, {"msg": "Token has expired"})
+    except PyJWTError as e:
+        raise _HTTPError(422, {"msg": str(e)})
+    if claims.get("type") != "access":
+        raise _HTTPError(422, {"msg": "Only non-refresh tokens are allowed"})
+    return claims[app.config["JWT_IDENTITY_CLAIM"]]
+
+
+async def _read_body(receive):
+    body = bytearray()
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            raise _HTTPError(400, {"message": "Client disconnected"})
+        body += message.get("body", b"")
+        if len(body) > _MAX_BODY:
+            raise _HTTPError(413, {"message": "Request body too large"})
+        if not message.get("more_body"):
+            return bytes(body)
+
+
+async def _chat_request(headers, receive, rest_id):
+    user_id = _identity(headers)
+    try:
+        data = json.loads(await _read_body(receive) or b"null")
+    except ValueError:
+        raise _HTTPError(400, {"message": "Invalid JSON"})
+    if not isinstance(data, dict):
+        raise _HTTPError(400, {"message": "Invalid JSON"})
+    session_id = data.get("session_id")
+    if not session_id:
+        raise _HTTPError(400, {"message": "Missing session_id"})
+    user = await run_in_app_context(db.session.get, User, user_id)
+    if not user:
+        raise _HTTPError(404, {"message": "User not found"})
+    if not await run_in_app_context(chat_session_exists, user_id, rest_id, session_id):
+        raise _HTTPError(404, {"message": "Chat session not found"})
+    return user_id, session_id, data.get("user_input")
+
+
+async def _send_json(send, status, payload, extra_headers=()):
+    body = json.dumps(payload).encode()
+    await send({"type": "http.response.start", "status": status,
+                "headers": [(b"content-type", b"application/json"),
+                            (b"content-length", str(len(body)).encode()), *extra_headers]})
+    await send({"type": "http.response.body", "body": body})
+
+
+async def _chat(send, cors, user_id, rest_id, session_id, user_input):
+    try:
+        reply = await chatbot_chat_async(user_id, rest_id, user_input, session_id, app.config['OPENAI_API_KEY'])
+    except Exception:
+        app.logger.exception(f"Error with chat for session {session_id}")
+        await _send_json(send, 500, {"message": "Error with chat"}, cors)
+        return
+    try:
+        return_dishes = await run_in_app_context(get_dish_cards, reply.dish_ids)
+    except Exception:
+        app.logger.exception(f"Error processing chat for session {session_id}")
+        await _send_json(send, 500, {"message": "Error processing chat"}, cors)
+        return
+    await _send_json(send, 200, {"text": reply.text, "dish_details": return_dishes}, cors)
+
+
+def _sse(event, payload):
+    return f"event: {event}\ndata: {json.dumps(payload)}\n\n".encode()
+
+
+async def _chat_stream(send, receive, cors, user_id, rest_id, session_id, user_input):
+    await send({"type": "http.response.start", "status": 200,
+                "headers": [(b"content-type", b"text/event-stream; charset=utf-8"), (b"cache-control", b"no-cache"),
+                            (b"x-accel-buffering", b"no"), *cors]})
+    relay = asyncio.ensure_future(_relay_events(send, user_id, rest_id, session_id, user_input))
+    disconnect = asyncio.ensure_future(_wait_for_disconnect(receive))
+    done, _ = await asyncio.wait({relay, disconnect}, return_when=asyncio.FIRST_COMPLETED)
+    if relay in done:
+        disconnect.cancel()
+        relay.result()
+        await send({"type": "http.response.body", "body": b""})
+        return
+    # The client went away: cancelling stops the model stream and records the cut-off call
+    relay.cancel()
+    try:
+        await relay
+    except asyncio.CancelledError:
+        pass
+
+
+async def _wait_for_disconnect(receive):
+    while (await receive())["type"] != "http.disconnect":
+        pass
+
+
+async def _relay_events(send, user_id, rest_id, session_id, user_input):
+    dish_details = None
+    events = chatbot_chat_stream_async(user_id, rest_id, user_input, session_id, app.config['OPENAI_API_KEY'])
+    try:
+        async for event, value in events:
+            if event == "text":
+                chunk = _sse("delta", {"text": value})
+            elif event == "dishes":
+                dish_details = await run_in_app_context(get_dish_cards, value)
+                chunk = _sse("dishes", {"dish_details": dish_details})
+            elif event == "done":
+                if dish_details is None:
+                    dish_details = await run_in_app_context(get_dish_cards, value.dish_ids)
+                chunk = _sse("done", {"text": value.text, "dish_details": dish_details})
+            else:
+                # The turn is already saved with the partial reply (ai.py); the details stay in the log
+                app.logger.error(f"Chat stream for session {session_id} failed: {value}")
+                chunk = _sse("error", {"message": "Error with chat"})
+            await send({"type": "http.response.body", "body": chunk, "more_body": True})
+    except Exception:
+        app.logger.exception(f"Error relaying chat stream for session {session_id}")
+        await send({"type": "http.response.body", "body": _sse("error", {"message": "Error processing chat"}),
+                    "more_body": True})
+        try:
+            # Let the turn run to the end so it is saved, even though the client gets no more of it
+            async for _ in events:
+                pass
+        except Exception:
+            app.logger.exception(f"Chat turn for session {session_id} did not finish")
+    finally:
+        await events.aclose()
@@ -0,0 +1,89 @@
+"""Per-request overhead of building an OpenAI client and tokenizer versus reusing the shared ones.
+
+Runs against a local HTTP server that answers /v1/chat/completions, so no API key or network
+access is needed. Run from the backend directory: python -m benchmarks.ai_client_overhead
+"""
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import tiktoken
+from openai import OpenAI
+from app import app
+from app.ai_client import get_openai_client, get_tokenizer, close_openai_clients
+
+REQUESTS = 200
+MESSAGES = [{"role": "system", "content": "You are a restaurant assistant chatbot. " * 40},
+            {"role": "user", "content": "What vegan dishes do you have?"}]
+REPLY = json.dumps({
+    "id": "chatcmpl-bench", "object": "chat.completion", "created": 0, "model": "gpt-4o",
+    "choices": [{"index": 0, "finish_reason": "stop",
+                 "message": {"role": "assistant", "content": "{\"text\": \"Hi\", \"dishes\": []}"}}],
+    "usage": {"prompt_tokens": 1, "completion_tokens": 1, "total_tokens": 2},
+}).encode()
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    connections = set()
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        Handler.connections.add(self.client_address)
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(REPLY)))
+        self.end_headers()
+        self.wfile.write(REPLY)
+
+    def log_message(self, *args):
+        pass
+
+
+def per_request(label, fn):
+    start = time.perf_counter()
+    for _ in range(REQUESTS):
+        fn()
+    elapsed = (time.perf_counter() - start) / REQUESTS
+    print(f"{label:<42} {elapsed * 1000:>8.3f} ms/request")
+    return elapsed
+
+
+def main():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_port}/v1"
+
+    def call(client):
+        client.chat.completions.create(messages=MESSAGES, model="gpt-4o", max_tokens=5)
+
+    Handler.connections.clear()
+    fresh = per_request("new OpenAI client per request", lambda: call(OpenAI(api_key="bench", base_url=base_url)))
+    fresh_connections = len(Handler.connections)
+
+    with app.app_context():
+        shared_client = get_openai_client("bench").with_options()
+    shared_client.base_url = base_url
+    Handler.connections.clear()
+    shared = per_request("shared keep-alive client", lambda: call(shared_client))
+    print(f"TCP connections opened: {fresh_connections} fresh vs {len(Handler.connections)} shared; "
+          f"saved {(fresh - shared) * 1000:.3f} ms/request")
+    close_openai_clients()
+    server.shutdown()
+
+    try:
+        tiktoken.get_encoding("o200k_base")
+    except Exception as e:
+        print(f"tokenizer comparison skipped, encoding unavailable: {e}")
+        return
+    text = [m["content"] for m in MESSAGES]
+    loaded = per_request("tiktoken.get_encoding + encode per call",
+                         lambda: [len(tiktoken.get_encoding("o200k_base").encode(t)) for t in text])
+    cached = per_request("cached get_tokenizer + encode",
+                         lambda: [len(get_tokenizer("gpt-4o").encode(t)) for t in text])
+    print(f"saved {(loaded - cached) * 1000:.3f} ms/request on token counting")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+"""Load the chat routes end to end against the offline model stub (llm_stub.py).
+
+Seeds a restaurant, a user and a chat session in a temporary SQLite file, starts the stub and
+the backend as subprocesses, then sends concurrent turns to /api/chat/<rest_id> and
+/api/chat/<rest_id>/stream. Prints latency percentiles per route and exits non-zero when a turn
+failed: a status other than 200, a reply without text, or a stream without its done event.
+
+Run from the backend directory: python -m benchmarks.chat_load [--server wsgi] [--chats 200]
+"""
+import argparse
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+_directory = tempfile.TemporaryDirectory()
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_directory.name, 'chat_load.sqlite3')}"
+os.environ.pop("DATABASE_REPLICA_URL", None)
+os.environ["DESCRIPTION_WORKERS_ENABLED"] = "0"
+
+import httpx
+from flask_jwt_extended import create_access_token
+from app import app, db
+from app.models import Order
+from benchmarks.common import seed_restaurant, seed_user
+
+SESSION_ID = 7000
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def seed():
+    with app.app_context():
+        db.create_all()
+        rest_id = seed_restaurant(60).id
+        user_id = seed_user().id
+        db.session.add(Order(user_id=user_id, restaurant_id=rest_id, session_id=SESSION_ID, status=True))
+        db.session.commit()
+        return rest_id, create_access_token(identity=user_id, additional_claims={"role": "user"})
+
+
+def start(command, env):
+    return subprocess.Popen(command, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.STDOUT)
+
+
+def wait_until_up(url, process, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"{' '.join(process.args)} exited with {process.returncode}")
+        try:
+            httpx.get(url, timeout=1)
+            return
+        except httpx.TransportError:
+            time.sleep(0.2)
+    raise RuntimeError(f"{url} did not answer within {timeout}s")
+
+
+async def turn(client, url, token, i, stream):
+    body = {"session_id": SESSION_ID, "user_input": f"Something light and vegetarian, please ({i})"}
+    started = time.perf_counter()
+    response = await client.post(url + ("/stream" if stream else ""), json=body,
+                                 headers={"Authorization": f"Bearer {token}"})
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    if response.status_code != 200:
+        return elapsed_ms, f"status {response.status_code}: {response.text[:200]}"
+    if stream:
+        if "event: done" not in response.text or "event: error" in response.text:
+            return elapsed_ms, f"stream did not finish: {response.text[-200:]}"
+    elif not response.json().get("text"):
+        return elapsed_ms, f"reply without text: {response.text[:200]}"
+    return elapsed_ms, None
+
+
+async def load(base_url, rest_id, token, chats, concurrency):
+    url = f"{base_url}/api/chat/{rest_id}"
+    gate = asyncio.Semaphore(concurrency)
+
+    async def limited(i, stream):
+        async with gate:
+            return stream, await turn(client, url, token, i, stream)
+
+    async with httpx.AsyncClient(timeout=120, limits=httpx.Limits(max_connections=concurrency)) as client:
+        return await asyncio.gather(*(limited(i, i % 2 == 1) for i in range(chats)))
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--server", choices=["asgi", "wsgi"], default="asgi")
+    parser.add_argument("--chats", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--profile", default="fast", help="llm_stub.py latency profile")
+    args = parser.parse_args(argv)
+
+    rest_id, token = seed()
+    stub_port, server_port = free_port(), free_port()
+    # The database the app was configured with at import, which may predate this module's default
+    env = dict(os.environ, DATABASE_URL=app.config['SQLALCHEMY_DATABASE_URI'],
+               OPENAI_BASE_URL=f"http://127.0.0.1:{stub_port}/v1", API_KEY="load-test")
+    if args.server == "asgi":
+        server = [sys.executable, "-m", "uvicorn", "asgi:application", "--port", str(server_port), "--log-level", "warning"]
+    else:
+        server = [sys.executable, "-m", "flask", "--app", "app", "run", "--port", str(server_port)]
+    processes = [start([sys.executable, "llm_stub.py", "--port", str(stub_port), "--profile", args.profile], env)]
+    try:
+        wait_until_up(f"http://127.0.0.1:{stub_port}/v1/models", processes[0])
+        processes.append(start(server, env))
+        base_url = f"http://127.0.0.1:{server_port}"
+        wait_until_up(f"{base_url}/api/health", processes[1])
+        started = time.perf_counter()
+        results = asyncio.run(load(base_url, rest_id, token, args.chats, args.concurrency))
+        elapsed = time.perf_counter() - started
+    finally:
+        for process in processes:
+            process.terminate()
+            process.wait(timeout=10)
+
+    print(f"{args.chats} chats on {args.server} in {elapsed:.1f}s ({args.chats / elapsed:.1f}/s)")
+    failures = [error for _, (_, error) in results if error]
+    for stream, route in ((False, "/api/chat"), (True, "/api/chat/stream")):
+        timings = [elapsed_ms for is_stream, (elapsed_ms, _) in results if is_stream == stream]
+        print(f"  {route:<18} p50 {percentile(timings, 0.5):7.0f} ms   p95 {percentile(timings, 0.95):7.0f} ms")
+    for error in failures[:5]:
+        print("  FAILED:", error)
+    if failures:
+        print(f"{len(failures)} of {args.chats} chats failed")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,101 @@
+"""SQLite commit throughput for chat turns: a commit per message, a commit per turn, and the write-behind buffer.
+
+Concurrent threads each store a number of turns (user message plus reply) in a file-backed
+database, as chat requests from different sessions would. Prints turns per second, commits
+issued and whether any turn was stored without its reply.
+
+Run from the backend directory: python -m benchmarks.chat_write_throughput
+"""
+import os
+import tempfile
+import threading
+import time
+from sqlalchemy import event
+from app import db
+from app.models import Order, Conversation, ConversationDish
+from app.chat_store import ChatWriteBuffer, write_chat_turn
+from app.functions import save_message
+from app.reply_parser import ChatReply
+from benchmarks.common import make_app, seed_restaurant, seed_user
+
+THREADS = 16
+TURNS_PER_THREAD = 50
+REPLY = ChatReply("Here are a few dishes you might enjoy.", (1, 2, 3), "", True)
+
+
+def per_message(user_id, rest_id, session_id, user_input):
+    save_message(user_id, rest_id, session_id, "user", user_input)
+    save_message(user_id, rest_id, session_id, "assistant", REPLY)
+
+
+def per_turn(user_id, rest_id, session_id, user_input):
+    write_chat_turn(user_id, rest_id, session_id, user_input, REPLY)
+
+
+def run(bench_app, label, save, sessions):
+    with bench_app.app_context():
+        ConversationDish.query.delete()
+        Conversation.query.delete()
+        db.session.commit()
+        commits = {"count": 0}
+
+        def on_commit(connection):
+            commits["count"] += 1
+
+        event.listen(db.engine, "commit", on_commit)
+    errors = []
+
+    def worker(session_id, user_id, rest_id):
+        with bench_app.app_context():
+            for i in range(TURNS_PER_THREAD):
+                try:
+                    save(user_id, rest_id, session_id, f"Question {i}")
+                except Exception as e:
+                    errors.append(e)
+
+    threads = [threading.Thread(target=worker, args=session) for session in sessions]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    with bench_app.app_context():
+        event.remove(db.engine, "commit", on_commit)
+        users = Conversation.query.filter_by(role="user").count()
+        replies = Conversation.query.filter_by(role="assistant").count()
+    expected = len(sessions) * TURNS_PER_THREAD
+    print(f"{label:<16} {expected / elapsed:>10.0f} {commits['count']:>8} {users:>6}/{expected:<6} "
+          f"{users - replies:>9} {len(errors):>7}")
+
+
+def main():
+    with tempfile.TemporaryDirectory() as directory:
+        bench_app = make_app(f"sqlite:///{os.path.join(directory, 'bench.sqlite3')}")
+        with bench_app.app_context():
+            rest_id = seed_restaurant(10).id
+            sessions = []
+            for number in range(THREADS):
+                user_id = seed_user().id
+                db.session.add(Order(user_id=user_id, restaurant_id=rest_id, session_id=5000 + number, status=True))
+                sessions.append((5000 + number, user_id, rest_id))
+            db.session.commit()
+
+        buffer = ChatWriteBuffer(bench_app)
+
+        def write_behind(user_id, rest_id, session_id, user_input):
+            buffer.submit(user_id, rest_id, session_id, user_input, REPLY).result()
+
+        print(f"{THREADS} threads x {TURNS_PER_THREAD} turns")
+        print(f"{'mode':<16} {'turns/s':>10} {'commits':>8} {'stored':>13} {'orphaned':>9} {'errors':>7}")
+        run(bench_app, "commit/message", per_message, sessions)
+        run(bench_app, "commit/turn", per_turn, sessions)
+        run(bench_app, "write-behind", write_behind, sessions)
+        print(f"write-behind batches: {buffer.stats()}")
+        with bench_app.app_context():
+            db.engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
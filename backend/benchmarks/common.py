@@ -0,0 +1,83 @@
+import random
+import time
+from contextlib import contextmanager
+from flask import Flask
+from sqlalchemy import event
+from app import db
+from app.models import User, Preferences, Restaurant, Menu, Dish
+
+
+def make_app(database_uri="sqlite://"):
+    bench_app = Flask("benchmarks")
+    bench_app.config['SQLALCHEMY_DATABASE_URI'] = database_uri
+    bench_app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    db.init_app(bench_app)
+    with bench_app.app_context():
+        db.create_all()
+    return bench_app
+
+
+def seed_restaurant(n_dishes, n_menus=5, seed=0):
+    rng = random.Random(seed)
+    index = Restaurant.query.count() + 1
+    rest = Restaurant(name=f"Bench {index}", password="x", address="Bench street",
+                      phone=f"9{index:09d}", email=f"bench{index}@example.com", cuisine="Italian")
+    db.session.add(rest)
+    db.session.flush()
+    menus = [Menu(menu_type=f"Menu {i}", restaurant_id=rest.id) for i in range(n_menus)]
+    db.session.add_all(menus)
+    db.session.flush()
+    words = ["pasta", "pizza", "salad", "soup", "curry", "paneer", "tofu", "chicken", "spicy", "sweet",
+             "cake", "grilled", "fried", "rice", "noodles", "cheese", "garlic", "lemon", "mushroom", "burger"]
+    dishes = []
+    for i in range(n_dishes):
+        name = " ".join(rng.sample(words, 2)).title()
+        dishes.append(Dish(
+            dish_name=f"{name} {i}",
+            description=" ".join(rng.sample(words, 6)),
+            restaurant_id=rest.id,
+            menu_id=menus[i % n_menus].id,
+            price=round(rng.uniform(3, 30), 2),
+            protein=rng.randint(1, 40), fat=rng.randint(1, 40), carbs=rng.randint(1, 80), energy=rng.randint(100, 900),
+            is_lactose_free=rng.random() < 0.5, is_halal=rng.random() < 0.6, is_vegan=rng.random() < 0.3,
+            is_vegetarian=rng.random() < 0.6, is_gluten_free=rng.random() < 0.4, is_jain=rng.random() < 0.2,
+            is_soy_free=rng.random() < 0.7,
+        ))
+    db.session.add_all(dishes)
+    db.session.commit()
+    return rest
+
+
+def seed_user(**preferences):
+    index = User.query.count() + 1
+    user = User(name=f"Bench user {index}", email=f"user{index}@example.com", phone=f"8{index:09d}",
+                password=f"x{index}", user_description="Bench user.")
+    db.session.add(user)
+    db.session.flush()
+    db.session.add(Preferences(user_id=user.id, preference="none", **preferences))
+    db.session.commit()
+    return user
+
+
+@contextmanager
+def count_queries():
+    counter = {"count": 0}
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        counter["count"] += 1
+
+    event.listen(db.engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield counter
+    finally:
+        event.remove(db.engine, "before_cursor_execute", before_cursor_execute)
+
+
+def timed(fn, repeat=5):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
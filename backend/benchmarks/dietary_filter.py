@@ -0,0 +1,61 @@
+"""Compare the per-dish sort_user_preferences loop with the single-query bitmask filter.
+
+Run from the backend directory: python -m benchmarks.dietary_filter
+"""
+from app import db
+from app.models import Preferences, Menu, Dish
+from app.functions import get_dishes_for_user
+from benchmarks.common import make_app, seed_restaurant, seed_user, count_queries, timed
+
+SIZES = (50, 500, 5000)
+
+
+def legacy_filter(user_id, rest_id):
+    # The pre-bitmask path: one call per menu, one query per dish.
+    user_preferences = Preferences.query.filter_by(user_id=user_id).first()
+    matched = []
+    for menu in Menu.query.filter_by(restaurant_id=rest_id).all():
+        menu = Menu.query.filter_by(id=menu.id).first()
+        for dish in menu.dishes:
+            dish = Dish.query.filter_by(id=dish.id).first()
+            if user_preferences.is_lactose_intolerant and not dish.is_lactose_free:
+                continue
+            if user_preferences.is_halal and not dish.is_halal:
+                continue
+            if user_preferences.is_vegan and not dish.is_vegan:
+                continue
+            if user_preferences.is_vegetarian and not dish.is_vegetarian:
+                continue
+            if user_preferences.is_allergic_to_gluten and not dish.is_gluten_free:
+                continue
+            if user_preferences.is_jain and not dish.is_jain:
+                continue
+            matched.append(dish)
+    return matched
+
+
+def main():
+    bench_app = make_app()
+    with bench_app.app_context():
+        user_id = seed_user(is_vegetarian=True, is_halal=True).id
+        print(f"{'dishes':>7} {'legacy ms':>10} {'legacy q':>9} {'bitmask ms':>11} {'bitmask q':>10} {'matches':>8}")
+        for size in SIZES:
+            rest_id = seed_restaurant(size).id
+
+            db.session.expunge_all()
+            with count_queries() as legacy_queries:
+                legacy_filter(user_id, rest_id)
+            legacy_time, legacy = timed(lambda: (db.session.expunge_all(), legacy_filter(user_id, rest_id))[1])
+
+            db.session.expunge_all()
+            with count_queries() as bitmask_queries:
+                get_dishes_for_user(user_id, rest_id=rest_id)
+            bitmask_time, bitmask = timed(lambda: (db.session.expunge_all(), get_dishes_for_user(user_id, rest_id=rest_id))[1])
+
+            assert sorted(d.id for d in legacy) == [d.id for d in bitmask]
+            print(f"{size:>7} {legacy_time * 1000:>10.1f} {legacy_queries['count']:>9} "
+                  f"{bitmask_time * 1000:>11.1f} {bitmask_queries['count']:>10} {len(bitmask):>8}")
+
+
+if __name__ == "__main__":
+    main()
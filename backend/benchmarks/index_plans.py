@@ -0,0 +1,149 @@
+"""Query plans and latencies of the hot lookups without and with the composite indexes.
+
+Seeds a large file-backed SQLite database, drops the indexes declared for the hot paths
+(ix_conversation_user_rest_session and friends, added by the bb0c1122a613 migration), runs
+each lookup, then recreates the indexes and runs them again. Prints the plan SQLite chose and
+the mean latency of each lookup for both runs.
+
+Run from the backend directory: python -m benchmarks.index_plans
+"""
+import os
+import random
+import tempfile
+import time
+from sqlalchemy import select, text
+from app import db
+from app.models import Restaurant, User, Menu, Dish, Order, Cart, CartItem, Conversation
+from benchmarks.common import make_app
+
+RESTAURANTS = 200
+MENUS_PER_RESTAURANT = 5
+DISHES_PER_RESTAURANT = 100
+USERS = 5000
+ORDERS = 40000
+CART_ITEMS_PER_CART = 4
+CONVERSATIONS = 200000
+LOOKUPS = 300
+HOT_INDEXES = {
+    "ix_conversation_user_rest_session", "ix_orders_restaurant_id_status", "ix_cart_session_id_user_id",
+    "ix_cart_items_cart_id_dish_id", "ix_dish_restaurant_id", "ix_dish_menu_id",
+}
+
+
+def insert(connection, model, rows):
+    if rows:
+        connection.execute(model.__table__.insert(), rows)
+
+
+def seed(connection, rng):
+    insert(connection, Restaurant, [
+        {"id": i, "name": f"R{i}", "password": f"x{i}", "address": "a", "phone": f"9{i:09d}", "email": f"r{i}@x",
+         "cuisine": "Italian"} for i in range(1, RESTAURANTS + 1)])
+    insert(connection, User, [
+        {"id": i, "name": f"U{i}", "email": f"u{i}@x", "phone": f"8{i:09d}", "password": f"x{i}"}
+        for i in range(1, USERS + 1)])
+    menus = RESTAURANTS * MENUS_PER_RESTAURANT
+    insert(connection, Menu, [{"id": i, "menu_type": "Main", "restaurant_id": (i - 1) // MENUS_PER_RESTAURANT + 1}
+                              for i in range(1, menus + 1)])
+    dishes = RESTAURANTS * DISHES_PER_RESTAURANT
+    insert(connection, Dish, [
+        {"id": i, "dish_name": f"D{i}", "restaurant_id": (i - 1) // DISHES_PER_RESTAURANT + 1,
+         "menu_id": ((i - 1) // DISHES_PER_RESTAURANT) * MENUS_PER_RESTAURANT + i % MENUS_PER_RESTAURANT + 1,
+         "price": 10.0} for i in range(1, dishes + 1)])
+    orders = [{"id": i, "user_id": rng.randint(1, USERS), "restaurant_id": rng.randint(1, RESTAURANTS),
+               "session_id": 100000 + i, "status": rng.random() < 0.1, "total_cost": 0.0}
+              for i in range(1, ORDERS + 1)]
+    insert(connection, Order, orders)
+    insert(connection, Cart, [{"id": o["id"], "user_id": o["user_id"], "session_id": o["session_id"]} for o in orders])
+    insert(connection, CartItem, [
+        {"cart_id": o["id"], "dish_id": rng.randint(1, dishes), "quantity": 1, "price": 10.0}
+        for o in orders for _ in range(CART_ITEMS_PER_CART)])
+    conversations = []
+    for i in range(CONVERSATIONS):
+        order = orders[rng.randrange(ORDERS // 4)]
+        conversations.append({"user_id": order["user_id"], "rest_id": order["restaurant_id"],
+                              "session_id": order["session_id"], "role": "user" if i % 2 else "assistant",
+                              "content": "Hello"})
+    insert(connection, Conversation, conversations)
+    return orders
+
+
+def lookups(orders, rng):
+    """(name, statement, parameter sets) for each hot path."""
+    sample = [rng.choice(orders[:ORDERS // 4]) for _ in range(LOOKUPS)]
+    return [
+        ("chat transcript",
+         select(Conversation.id).where(Conversation.user_id == db.bindparam("u"), Conversation.rest_id == db.bindparam("r"),
+                                       Conversation.session_id == db.bindparam("s")).order_by(Conversation.id),
+         [{"u": o["user_id"], "r": o["restaurant_id"], "s": o["session_id"]} for o in sample]),
+        ("active orders",
+         select(Order.id).where(Order.restaurant_id == db.bindparam("r"), Order.status == True),
+         [{"r": o["restaurant_id"]} for o in sample]),
+        # Served by the unique index on orders.session_id in both runs
+        ("order by session+user",
+         select(Order.id).where(Order.session_id == db.bindparam("s"), Order.user_id == db.bindparam("u")),
+         [{"s": o["session_id"], "u": o["user_id"]} for o in sample]),
+        ("cart by session+user",
+         select(Cart.id).where(Cart.session_id == db.bindparam("s"), Cart.user_id == db.bindparam("u")),
+         [{"s": o["session_id"], "u": o["user_id"]} for o in sample]),
+        ("cart item by dish",
+         select(CartItem.id).where(CartItem.cart_id == db.bindparam("c"), CartItem.dish_id == db.bindparam("d")),
+         [{"c": o["id"], "d": rng.randint(1, RESTAURANTS * DISHES_PER_RESTAURANT)} for o in sample]),
+        ("dishes of restaurant",
+         select(Dish.id).where(Dish.restaurant_id == db.bindparam("r")),
+         [{"r": o["restaurant_id"]} for o in sample]),
+        ("dishes of menu",
+         select(Dish.id).where(Dish.menu_id == db.bindparam("m")),
+         [{"m": rng.randint(1, RESTAURANTS * MENUS_PER_RESTAURANT)} for _ in sample]),
+    ]
+
+
+def measure(connection, cases):
+    results = {}
+    for name, statement, params in cases:
+        compiled = statement.params(**params[0]).compile(connection, compile_kwargs={"literal_binds": True})
+        plan = connection.exec_driver_sql(f"EXPLAIN QUERY PLAN {compiled}").fetchall()
+        started = time.perf_counter()
+        for values in params:
+            connection.execute(statement, values).fetchall()
+        mean_us = (time.perf_counter() - started) / len(params) * 1e6
+        results[name] = (" / ".join(row[-1] for row in plan), mean_us)
+    return results
+
+
+def main():
+    rng = random.Random(0)
+    with tempfile.TemporaryDirectory() as directory:
+        bench_app = make_app(f"sqlite:///{os.path.join(directory, 'plans.sqlite3')}")
+        with bench_app.app_context():
+            started = time.perf_counter()
+            with db.engine.begin() as connection:
+                orders = seed(connection, rng)
+            print(f"Seeded {ORDERS} orders, {CONVERSATIONS} messages, {RESTAURANTS * DISHES_PER_RESTAURANT} dishes "
+                  f"in {time.perf_counter() - started:.1f}s")
+            cases = lookups(orders, rng)
+            indexes = [index for table in db.metadata.tables.values() for index in table.indexes
+                       if index.name in HOT_INDEXES]
+
+            with db.engine.begin() as connection:
+                for index in indexes:
+                    index.drop(connection)
+                connection.execute(text("ANALYZE"))
+                before = measure(connection, cases)
+            with db.engine.begin() as connection:
+                for index in indexes:
+                    index.create(connection)
+                connection.execute(text("ANALYZE"))
+                after = measure(connection, cases)
+
+            print(f"{'lookup':<22} {'before us':>10} {'after us':>9} {'speedup':>8}")
+            for name, _, _ in cases:
+                print(f"{name:<22} {before[name][1]:>10.0f} {after[name][1]:>9.0f} {before[name][1] / after[name][1]:>7.1f}x")
+            print()
+            for name, _, _ in cases:
+                print(f"{name}\n  before: {before[name][0]}\n  after:  {after[name][0]}")
+            db.engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+"""Prompt tokens of the verbose (filtered + unfiltered) and compact menu encodings per restaurant.
+
+Run from the backend directory:
+    python -m benchmarks.menu_token_report [--database-uri sqlite:///path/db.sqlite3] [--user-id 3]
+Without --database-uri the app's own database is used. --user-id picks whose preferences drive
+the filtered menu and the matching dish list; by default no dietary restrictions are applied.
+"""
+import argparse
+from app import app
+from app.models import Restaurant
+from app.functions import get_menu_for_chatbot, get_filtered_menu_for_chatbot, get_compact_menu_for_chatbot, get_matching_dishes_for_chatbot, count_tokens
+from app.ai_client import get_tokenizer
+from benchmarks.common import make_app
+
+
+def report(user_id):
+    if get_tokenizer("gpt-4o") is None:
+        print("note: gpt-4o tokenizer unavailable, counts are approximate")
+    print(f"{'id':>5} {'restaurant':<30} {'verbose':>9} {'compact':>9} {'saved':>7}")
+    total_verbose = total_compact = 0
+    for rest in Restaurant.query.order_by(Restaurant.id).all():
+        verbose = count_tokens([
+            {"content": f"The filtered menu is: {get_filtered_menu_for_chatbot(rest.id, user_id)}"},
+            {"content": f"The unfiltered menu is: {get_menu_for_chatbot(rest.id)}"},
+        ])
+        compact = count_tokens([
+            {"content": f"The menu is: {get_compact_menu_for_chatbot(rest.id)}"},
+            {"content": get_matching_dishes_for_chatbot(rest.id, user_id)},
+        ])
+        total_verbose += verbose
+        total_compact += compact
+        saved = 1 - compact / verbose if verbose else 0
+        print(f"{rest.id:>5} {rest.name[:30]:<30} {verbose:>9} {compact:>9} {saved:>7.1%}")
+    if total_verbose:
+        print(f"{'':>5} {'total':<30} {total_verbose:>9} {total_compact:>9} {1 - total_compact / total_verbose:>7.1%}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--database-uri")
+    parser.add_argument("--user-id", type=int, default=0)
+    args = parser.parse_args()
+    target_app = make_app(args.database_uri) if args.database_uri else app
+    with target_app.app_context():
+        report(args.user_id)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""Check that the @read_replica routes read from the replica bind and that writes stay on the primary.
+
+Runs the app against two SQLite files: the primary, and a replica refreshed from it with the
+SQLite backup API after seeding. Counts the statements each engine runs for every route and
+exits non-zero when a route used the wrong database. To try a real server instead, export
+DATABASE_URL and DATABASE_REPLICA_URL (e.g. postgresql+psycopg2://...) before running it; the
+replica must then already hold the primary's schema and data.
+
+Run from the backend directory: python -m benchmarks.replica_routing
+"""
+import os
+import sqlite3
+import tempfile
+
+_directory = tempfile.TemporaryDirectory()
+_local = "DATABASE_REPLICA_URL" not in os.environ
+if _local:
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_directory.name, 'primary.sqlite3')}"
+    os.environ["DATABASE_REPLICA_URL"] = f"sqlite:///{os.path.join(_directory.name, 'replica.sqlite3')}"
+# Description workers would query the primary from their own threads while statements are counted
+os.environ["DESCRIPTION_WORKERS_ENABLED"] = "0"
+
+from flask_jwt_extended import create_access_token
+from sqlalchemy import event
+from app import app, db
+from app.db_routing import REPLICA_BIND
+from app.models import Order, Conversation, Dish
+from benchmarks.common import seed_restaurant, seed_user
+
+# (expected database, method, path, token name, JSON body)
+CALLS = [
+    ("replica", "GET", "/api/restaurant/landing/{rest_id}", None, None),
+    ("replica", "GET", "/api/get_menu", "rest", None),
+    ("replica", "GET", "/api/get_all_dishes", "rest", None),
+    ("replica", "GET", "/api/chat/{rest_id}/session/8000", "user", None),
+    ("replica", "GET", "/api/restaurant/orders", "rest", None),
+    ("primary", "GET", "/api/user/get", "user", None),
+    ("primary", "POST", "/api/create_menu", "rest", {"menu_type": "Specials"}),
+]
+
+
+def seed():
+    rest = seed_restaurant(12)
+    user = seed_user()
+    dishes = Dish.query.filter_by(restaurant_id=rest.id).all()
+    db.session.add(Order(user_id=user.id, restaurant_id=rest.id, session_id=8000, status=True, total_cost=10.0))
+    db.session.flush()
+    db.session.add(Conversation(user_id=user.id, rest_id=rest.id, session_id=8000, role="user",
+                                content="Something vegetarian?", dish_ids=[]))
+    db.session.add(Conversation(user_id=user.id, rest_id=rest.id, session_id=8000, role="assistant",
+                                content="Try these.", dish_ids=[dish.id for dish in dishes[:3]]))
+    db.session.commit()
+    return user.id, rest.id
+
+
+def replicate():
+    """Copy the primary SQLite file into the replica, as a replication stream would."""
+    db.engine.dispose()
+    db.engines[REPLICA_BIND].dispose()
+    source = sqlite3.connect(db.engine.url.database)
+    target = sqlite3.connect(db.engines[REPLICA_BIND].url.database)
+    with target:
+        source.backup(target)
+    source.close()
+    target.close()
+
+
+def main():
+    with app.app_context():
+        if REPLICA_BIND not in db.engines:
+            raise SystemExit("DATABASE_REPLICA_URL is not set")
+        if _local:
+            db.create_all()
+            user_id, rest_id = seed()
+            replicate()
+        else:
+            user_id, rest_id = seed()
+        tokens = {
+            "user": create_access_token(identity=str(user_id)),
+            "rest": create_access_token(identity=str(rest_id), additional_claims={"role": "restaurant"}),
+        }
+        engines = {"primary": db.engine, "replica": db.engines[REPLICA_BIND]}
+    counts = {name: 0 for name in engines}
+
+    def counter(name):
+        def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            counts[name] += 1
+        return before_cursor_execute
+
+    listeners = [(engine, counter(name)) for name, engine in engines.items()]
+    for engine, listener in listeners:
+        event.listen(engine, "before_cursor_execute", listener)
+
+    client = app.test_client()
+    failures = []
+    print(f"{'route':<42} {'status':>6} {'primary':>8} {'replica':>8} {'expected':>9}")
+    for expected, method, path, token, body in CALLS:
+        path = path.format(rest_id=rest_id)
+        headers = {"Authorization": f"Bearer {tokens[token]}"} if token else {}
+        for name in counts:
+            counts[name] = 0
+        response = client.open(path, method=method, headers=headers, json=body)
+        other = "primary" if expected == "replica" else "replica"
+        ok = response.status_code < 400 and counts[expected] > 0 and counts[other] == 0
+        print(f"{method + ' ' + path:<42} {response.status_code:>6} {counts['primary']:>8} {counts['replica']:>8} "
+              f"{expected:>9}{'' if ok else '  FAIL'}")
+        if not ok:
+            failures.append(path)
+
+    for engine, listener in listeners:
+        event.remove(engine, "before_cursor_execute", listener)
+    with app.app_context():
+        for engine in db.engines.values():
+            engine.dispose()
+    raise SystemExit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""Time reply parsing for normal and very large model replies.
+
+Compares the old three-pass handling of a reply (json.loads in the route, json.loads in
+save_message, regex in format_response) with one parse_reply call, and measures the
+streaming parser at model-sized chunks.
+
+Run from the backend directory: python -m benchmarks.reply_parser_bench
+"""
+import json
+import re
+from app.reply_parser import StreamingReplyParser, parse_reply
+from benchmarks.common import timed
+
+# (label, characters of text, number of dishes)
+CASES = (("typical", 300, 5), ("long text", 100_000, 5), ("many dishes", 300, 20_000), ("huge", 1_000_000, 50_000))
+
+
+def make_reply(text_length, n_dishes):
+    sentence = 'Try the "chef\'s special" \\ a local favourite. '
+    text = (sentence * (text_length // len(sentence) + 1))[:text_length]
+    return json.dumps({"text": text, "dishes": [{"dish_id": i} for i in range(1, n_dishes + 1)]})
+
+
+def legacy_parse(raw):
+    reply = json.loads(raw)
+    text = reply.get("text", "")
+    dish_ids = [dish.get("dish_id") for dish in reply.get("dishes", []) if "dish_id" in dish]
+    stored_ids = [item["dish_id"] for item in json.loads(raw)["dishes"]]
+    match = re.search(r'"text":\s*"([^"]*)"', raw)
+    stored_text = match.group(1) if match else None
+    return text, dish_ids, stored_text, stored_ids
+
+
+def stream_parse(raw, chunk_size=4):
+    parser = StreamingReplyParser()
+    for start in range(0, len(raw), chunk_size):
+        parser.feed(raw[start:start + chunk_size])
+    return parser.close()
+
+
+def main():
+    print(f"{'case':<12} {'size':>10} {'legacy 3-pass':>14} {'parse_reply':>12} {'stream (4 ch)':>14}")
+    for label, text_length, n_dishes in CASES:
+        raw = make_reply(text_length, n_dishes)
+        repeat = 200 if len(raw) < 10_000 else 3
+        legacy_ms = timed(lambda: legacy_parse(raw), repeat)[0] * 1000
+        single_ms = timed(lambda: parse_reply(raw), repeat)[0] * 1000
+        stream_ms = timed(lambda: stream_parse(raw), max(1, repeat // 10))[0] * 1000
+
+        reply = parse_reply(raw)
+        streamed = stream_parse(raw)
+        assert reply.valid and streamed.valid and streamed.text == reply.text and streamed.dish_ids == reply.dish_ids
+        # The regex stops at the first escaped quote, so the old path stored a truncated message
+        stored_text = legacy_parse(raw)[2]
+        truncated = " (legacy stored text truncated)" if stored_text != reply.text else ""
+        print(f"{label:<12} {len(raw):>10} {legacy_ms:>12.2f}ms {single_ms:>10.2f}ms {stream_ms:>12.2f}ms{truncated}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""Concurrent write throughput of SQLite with the default settings and with SQLITE_PRAGMAS.
+
+Writer threads store chat turns and bump cart quantities, as chat and cart requests do,
+while reader threads replay transcripts. Each configuration gets a fresh file-backed database.
+Prints write transactions and reads per second, write latency and how many writes failed
+with "database is locked".
+
+Run from the backend directory: python -m benchmarks.sqlite_concurrency
+"""
+import os
+import tempfile
+import threading
+import time
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+from app import app, db
+from app.models import Order, Cart, CartItem, Conversation, Dish
+from app.sqlite_tuning import install_sqlite_pragmas
+from app.llm_metrics import percentile
+from benchmarks.common import make_app, seed_restaurant, seed_user
+
+WRITERS = 8
+READERS = 4
+WRITES_PER_WRITER = 150
+
+
+def seed_sessions():
+    rest = seed_restaurant(20)
+    dish = Dish.query.filter_by(restaurant_id=rest.id).first()
+    sessions = []
+    for number in range(WRITERS):
+        user_id = seed_user().id
+        session_id = 9000 + number
+        db.session.add(Order(user_id=user_id, restaurant_id=rest.id, session_id=session_id, status=True))
+        db.session.flush()
+        cart = Cart(user_id=user_id, session_id=session_id)
+        db.session.add(cart)
+        db.session.flush()
+        db.session.add(CartItem(cart_id=cart.id, dish_id=dish.id, quantity=1, price=dish.price))
+        sessions.append((user_id, rest.id, session_id, cart.id))
+    db.session.commit()
+    return sessions
+
+
+def run(label, pragmas):
+    with tempfile.TemporaryDirectory() as directory:
+        bench_app = make_app(f"sqlite:///{os.path.join(directory, 'concurrency.sqlite3')}")
+        with bench_app.app_context():
+            install_sqlite_pragmas(db.engine, pragmas)
+            db.engine.dispose()
+            sessions = seed_sessions()
+            journal_mode = db.session.execute(text("PRAGMA journal_mode")).scalar()
+
+        latencies, errors, reads = [], [], [0]
+        done = threading.Event()
+
+        def writer(user_id, rest_id, session_id, cart_id):
+            with bench_app.app_context():
+                for i in range(WRITES_PER_WRITER):
+                    started = time.perf_counter()
+                    try:
+                        if i % 2:
+                            db.session.add_all([
+                                Conversation(user_id=user_id, rest_id=rest_id, session_id=session_id, role="user",
+                                             content=f"Question {i}", dish_ids=[]),
+                                Conversation(user_id=user_id, rest_id=rest_id, session_id=session_id, role="assistant",
+                                             content=f"Answer {i}", dish_ids=[1, 2]),
+                            ])
+                        else:
+                            item = CartItem.query.filter_by(cart_id=cart_id).first()
+                            item.quantity += 1
+                        db.session.commit()
+                        latencies.append(time.perf_counter() - started)
+                    except OperationalError as e:
+                        db.session.rollback()
+                        errors.append(str(e.orig))
+
+        def reader(user_id, rest_id, session_id, cart_id):
+            with bench_app.app_context():
+                while not done.is_set():
+                    try:
+                        Conversation.query.filter_by(user_id=user_id, rest_id=rest_id, session_id=session_id).all()
+                        reads[0] += 1
+                    except OperationalError as e:
+                        errors.append(str(e.orig))
+                    db.session.rollback()
+
+        writers = [threading.Thread(target=writer, args=session) for session in sessions]
+        readers = [threading.Thread(target=reader, args=sessions[i % len(sessions)]) for i in range(READERS)]
+        started = time.perf_counter()
+        for thread in writers + readers:
+            thread.start()
+        for thread in writers:
+            thread.join()
+        elapsed = time.perf_counter() - started
+        done.set()
+        for thread in readers:
+            thread.join()
+        with bench_app.app_context():
+            db.engine.dispose()
+
+    latencies.sort()
+    locked = sum("locked" in error for error in errors)
+    print(f"{label:<9} {journal_mode:<8} {len(latencies) / elapsed:>9.0f} {reads[0] / elapsed:>8.0f} "
+          f"{percentile(latencies, 0.5) * 1000:>7.1f} {percentile(latencies, 0.99) * 1000:>7.1f} {locked:>7}")
+
+
+def main():
+    print(f"{WRITERS} writers x {WRITES_PER_WRITER} transactions, {READERS} readers")
+    print(f"{'settings':<9} {'journal':<8} {'writes/s':>9} {'reads/s':>8} {'p50 ms':>7} {'p99 ms':>7} {'locked':>7}")
+    run("default", {})
+    run("tuned", app.config['SQLITE_PRAGMAS'])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+"""Offline stand-in for the OpenAI chat completions API.
+
+Start it and point the backend at it through OPENAI_BASE_URL:
+
+    python llm_stub.py --port 8001 --profile realistic
+    OPENAI_BASE_URL=http://127.0.0.1:8001/v1 python run.py
+
+Chat prompts get a schema-valid {"text", "dishes"} reply built from dish ids found in the menu;
+every other prompt (summaries, user descriptions) gets a short plain-text reply.
+"""
+import argparse
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from flask import Flask, Response, jsonify, request
+
+# Time to first token in seconds and output tokens per second
+PROFILES = {
+    "instant": {"ttft": 0.0, "tokens_per_second": 0, "jitter": 0.0},
+    "fast": {"ttft": 0.15, "tokens_per_second": 200, "jitter": 0.1},
+    "realistic": {"ttft": 0.6, "tokens_per_second": 60, "jitter": 0.3},
+    "slow": {"ttft": 2.5, "tokens_per_second": 20, "jitter": 0.5},
+}
+
+_VERBOSE_DISH = re.compile(r"Dish ID: (\d+)\s*\n\s*Dish Name: ([^\n]*)\n\s*Description: ([^\n]*)")
+_COMPACT_DISH = re.compile(r"^(\d+)\|([^|\n]*)\|([^|\n]*)", re.MULTILINE)
+_WORD = re.compile(r"[a-z]+")
+
+stub = Flask(__name__)
+stub.config["PROFILE"] = dict(PROFILES["instant"])
+# Prefix hashes of earlier prompts, least recently used first. Providers evict cached prefixes too;
+# the cap keeps a long load run from growing this without bound
+MAX_SEEN_PREFIXES = 50_000
+_seen_prefixes = OrderedDict()
+_seen_lock = threading.Lock()
+stub.config["MAX_SEEN_PREFIXES"] = MAX_SEEN_PREFIXES
+
+
+def estimate_tokens(text):
+    return len(text) // 4 + 1
+
+
+def cached_prompt_tokens(messages):
+    """Mimic provider prefix caching: tokens of the longest message prefix seen in an earlier prompt."""
+    digest = hashlib.sha256()
+    cached = tokens = 0
+    hashes = []
+    for message in messages:
+        digest.update(json.dumps(message, sort_keys=True).encode())
+        tokens += estimate_tokens(message.get("content") or "")
+        hashes.append((digest.hexdigest(), tokens))
+    with _seen_lock:
+        for prefix_hash, prefix_tokens in hashes:
+            if prefix_hash not in _seen_prefixes:
+                break
+            cached = prefix_tokens
+        for prefix_hash, _ in hashes:
+            _seen_prefixes[prefix_hash] = True
+            _seen_prefixes.move_to_end(prefix_hash)
+        while len(_seen_prefixes) > stub.config["MAX_SEEN_PREFIXES"]:
+            _seen_prefixes.popitem(last=False)
+    # Providers only cache prefixes of at least 1024 tokens, in 128 token steps
+    return cached // 128 * 128 if cached >= 1024 else 0
+
+
+def build_reply(messages):
+    prompt = "\n".join(message.get("content") or "" for message in messages)
+    if '"dishes"' not in prompt:
+        return "Stub summary: the diner is browsing the menu and has no further notes."
+
+    dishes = {}
+    for dish_id, name, description in _VERBOSE_DISH.findall(prompt) + _COMPACT_DISH.findall(prompt):
+        dishes[int(dish_id)] = f"{name} {description}"
+
+    user_input = next((m.get("content") or "" for m in reversed(messages) if m.get("role") == "user"), "")
+    words = set(_WORD.findall(user_input.lower()))
+    ranked = sorted(dishes, key=lambda dish_id: -len(words & set(_WORD.findall(dishes[dish_id].lower()))))
+    picked = ranked[:3]
+    text = "Here are a few dishes you might enjoy." if picked else "Sorry, I could not find any dishes on the menu."
+    return json.dumps({"text": text, "dishes": [{"dish_id": dish_id} for dish_id in picked]})
+
+
+def pace(profile, seconds):
+    if seconds > 0:
+        time.sleep(seconds * (1 + random.uniform(-profile["jitter"], profile["jitter"])))
+
+
+def usage_for(messages, completion):
+    prompt_tokens = sum(estimate_tokens(message.get("content") or "") for message in messages)
+    completion_tokens = estimate_tokens(completion)
+    return {
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "total_tokens": prompt_tokens + completion_tokens,
+        "prompt_tokens_details": {"cached_tokens": cached_prompt_tokens(messages)},
+    }
+
+
+@stub.route("/v1/chat/completions", methods=["POST"])
+def chat_completions():
+    body = request.get_json()
+    messages = body.get("messages", [])
+    model = body.get("model", "gpt-4o")
+    profile = stub.config["PROFILE"]
+    reply = build_reply(messages)
+    usage = usage_for(messages, reply)
+    completion_id = f"chatcmpl-{uuid.uuid4().hex[:24]}"
+    created = int(time.time())
+    per_token = 1 / profile["tokens_per_second"] if profile["tokens_per_second"] else 0
+
+    if not body.get("stream"):
+        pace(profile, profile["ttft"] + per_token * usage["completion_tokens"])
+        return jsonify({
+            "id": completion_id, "object": "chat.completion", "created": created, "model": model,
+            "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": reply}}],
+            "usage": usage,
+        })
+
+    include_usage = (body.get("stream_options") or {}).get("include_usage")
+
+    def chunk(delta, finish_reason=None, chunk_usage=None, choices=True):
+        payload = {"id": completion_id, "object": "chat.completion.chunk", "created": created, "model": model,
+                   "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}] if choices else [],
+                   "usage": chunk_usage}
+        return f"data: {json.dumps(payload)}\n\n"
+
+    def generate():
+        pace(profile, profile["ttft"])
+        yield chunk({"role": "assistant", "content": ""})
+        # Roughly one token per four characters
+        for start in range(0, len(reply), 4):
+            yield chunk({"content": reply[start:start + 4]})
+            pace(profile, per_token)
+        yield chunk({}, finish_reason="stop")
+        if include_usage:
+            yield chunk(None, chunk_usage=usage, choices=False)
+        yield "data: [DONE]\n\n"
+
+    return Response(generate(), mimetype="text/event-stream")
+
+
+@stub.route("/v1/models", methods=["GET"])
+def models():
+    return jsonify({"object": "list", "data": [{"id": "gpt-4o", "object": "model"}, {"id": "gpt-3.5-turbo", "object": "model"}]})
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline OpenAI-compatible stub for load tests.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--profile", choices=sorted(PROFILES), default="realistic")
+    parser.add_argument("--ttft", type=float, help="seconds before the first token, overrides the profile")
+    parser.add_argument("--tokens-per-second", type=float, help="output rate, overrides the profile")
+    parser.add_argument("--jitter", type=float, help="relative random variation of every delay, e.g. 0.2")
+    parser.add_argument("--max-prefixes", type=int, default=MAX_SEEN_PREFIXES,
+                        help="prompt prefixes remembered for cached token counts, least recently used are dropped")
+    args = parser.parse_args()
+
+    profile = dict(PROFILES[args.profile])
+    for key in ("ttft", "tokens_per_second", "jitter"):
+        if getattr(args, key) is not None:
+            profile[key] = getattr(args, key)
+    stub.config["PROFILE"] = profile
+    stub.config["MAX_SEEN_PREFIXES"] = args.max_prefixes
+    stub.run(host=args.host, port=args.port, threaded=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,31 @@
+"""add description_job claimed_at
+
+When a worker claimed a running job. Only jobs claimed more than DESCRIPTION_JOB_LEASE_TIMEOUT
+ago are requeued, so a starting process no longer takes over the jobs of another live one.
+Running jobs from before this revision have no claim time and are requeued on the next check.
+
+Revision ID: 27c3113c88f2
+Revises: 985f9103316d
+Create Date: 2026-10-19 10:05:34.190862
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '27c3113c88f2'
+down_revision = '985f9103316d'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    columns = {column['name'] for column in sa.inspect(op.get_bind()).get_columns('description_job')}
+    if 'claimed_at' not in columns:
+        op.add_column('description_job', sa.Column('claimed_at', sa.DateTime(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('description_job') as batch_op:
+        batch_op.drop_column('claimed_at')
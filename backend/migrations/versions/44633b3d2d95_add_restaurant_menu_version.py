@@ -0,0 +1,31 @@
+"""add restaurant menu_version
+
+Bumped on every menu change so cached menu prompts and replies of the old menu are never
+served. Existing restaurants start at 0. Databases created with db.create_all() already have
+the column, so it is only added when missing.
+
+Revision ID: 44633b3d2d95
+Revises: 54083ed07c5a
+Create Date: 2026-10-19 09:12:41.518203
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '44633b3d2d95'
+down_revision = '54083ed07c5a'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    columns = {column['name'] for column in sa.inspect(op.get_bind()).get_columns('restaurant')}
+    if 'menu_version' not in columns:
+        op.add_column('restaurant', sa.Column('menu_version', sa.Integer(), nullable=False, server_default='0'))
+
+
+def downgrade():
+    with op.batch_alter_table('restaurant') as batch_op:
+        batch_op.drop_column('menu_version')
@@ -0,0 +1,92 @@
+"""move dish ids to conversation_dish
+
+Conversation.dish_ids was a pickled list. Each id becomes a conversation_dish row keeping its
+position, then the column is dropped. Ids that are not integers are skipped. Databases created
+with db.create_all() after this revision already have the table and no column, so both steps
+check first.
+
+Revision ID: 54083ed07c5a
+Revises: bb0c1122a613
+Create Date: 2026-10-18 18:31:38.332069
+
+"""
+import pickle
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '54083ed07c5a'
+down_revision = 'bb0c1122a613'
+branch_labels = None
+depends_on = None
+
+
+def _as_int(dish_id):
+    if isinstance(dish_id, bool):
+        return None
+    if isinstance(dish_id, int):
+        return dish_id
+    if isinstance(dish_id, str) and dish_id.strip().isdigit():
+        return int(dish_id)
+    return None
+
+
+def _pickled_rows(connection):
+    rows = []
+    for conversation_id, blob in connection.execute(
+            sa.text("SELECT id, dish_ids FROM conversation WHERE dish_ids IS NOT NULL")):
+        try:
+            dish_ids = pickle.loads(blob) or []
+        except Exception as e:
+            print(f"Skipping dish_ids of conversation {conversation_id}: {e}")
+            continue
+        dish_ids = [dish_id for dish_id in map(_as_int, dish_ids) if dish_id is not None]
+        rows += [{"conversation_id": conversation_id, "position": position, "dish_id": dish_id}
+                 for position, dish_id in enumerate(dish_ids)]
+    return rows
+
+
+def upgrade():
+    connection = op.get_bind()
+    inspector = sa.inspect(connection)
+    rows = []
+    # Read the ids before the column goes: on SQLite dropping it rebuilds the conversation table
+    if 'dish_ids' in {column['name'] for column in inspector.get_columns('conversation')}:
+        rows = _pickled_rows(connection)
+        with op.batch_alter_table('conversation') as batch_op:
+            batch_op.drop_column('dish_ids')
+
+    if not inspector.has_table('conversation_dish'):
+        op.create_table(
+            'conversation_dish',
+            sa.Column('conversation_id', sa.Integer(), nullable=False),
+            sa.Column('position', sa.Integer(), nullable=False),
+            sa.Column('dish_id', sa.Integer(), nullable=False),
+            sa.ForeignKeyConstraint(['conversation_id'], ['conversation.id'],
+                                    name='fk_conversation_dish_conversation_id', ondelete='CASCADE'),
+            sa.PrimaryKeyConstraint('conversation_id', 'position'),
+        )
+    op.create_index('ix_conversation_dish_dish_id', 'conversation_dish', ['dish_id'], unique=False, if_not_exists=True)
+
+    if rows:
+        conversation_dish = sa.table('conversation_dish', sa.column('conversation_id', sa.Integer),
+                                     sa.column('position', sa.Integer), sa.column('dish_id', sa.Integer))
+        op.bulk_insert(conversation_dish, rows)
+
+
+def downgrade():
+    connection = op.get_bind()
+    dish_ids = {}
+    for conversation_id, dish_id in connection.execute(
+            sa.text("SELECT conversation_id, dish_id FROM conversation_dish ORDER BY conversation_id, position")):
+        dish_ids.setdefault(conversation_id, []).append(dish_id)
+
+    op.drop_index('ix_conversation_dish_dish_id', table_name='conversation_dish', if_exists=True)
+    op.drop_table('conversation_dish')
+    with op.batch_alter_table('conversation') as batch_op:
+        batch_op.add_column(sa.Column('dish_ids', sa.PickleType(), nullable=True))
+
+    conversation = sa.table('conversation', sa.column('id', sa.Integer), sa.column('dish_ids', sa.PickleType))
+    for conversation_id, ids in dish_ids.items():
+        connection.execute(conversation.update().where(conversation.c.id == conversation_id).values(dish_ids=ids))
@@ -0,0 +1,89 @@
+"""add conversation_summary, description_job and llm_call
+
+conversation_summary holds the folded older turns of a chat session (app/history.py),
+description_job the queue of user description refreshes (app/description_jobs.py) and llm_call
+one row per model call (app/llm_metrics.py). Databases created with db.create_all() already have
+the tables, so each is only created when missing.
+
+Revision ID: 985f9103316d
+Revises: fc57304ed00f
+Create Date: 2026-10-19 09:41:22.675390
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '985f9103316d'
+down_revision = 'fc57304ed00f'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    if not inspector.has_table('conversation_summary'):
+        op.create_table(
+            'conversation_summary',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('user_id', sa.Integer(), nullable=False),
+            sa.Column('rest_id', sa.Integer(), nullable=False),
+            sa.Column('session_id', sa.Integer(), nullable=False),
+            sa.Column('summary', sa.Text(), nullable=False),
+            sa.Column('last_message_id', sa.Integer(), nullable=False),
+            sa.Column('updated_at', sa.DateTime(), nullable=True),
+            sa.ForeignKeyConstraint(['user_id'], ['user.id'], name='fk_summary_user_id', ondelete='CASCADE'),
+            sa.ForeignKeyConstraint(['rest_id'], ['restaurant.id'], name='fk_summary_rest_id', ondelete='CASCADE'),
+            sa.ForeignKeyConstraint(['session_id'], ['orders.session_id'], name='fk_summary_session_id',
+                                    ondelete='CASCADE'),
+            sa.PrimaryKeyConstraint('id'),
+            sa.UniqueConstraint('user_id', 'rest_id', 'session_id', name='uq_summary_session'),
+        )
+
+    if not inspector.has_table('description_job'):
+        op.create_table(
+            'description_job',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('user_id', sa.Integer(), nullable=False),
+            sa.Column('status', sa.String(length=10), nullable=False),
+            sa.Column('attempts', sa.Integer(), nullable=False),
+            sa.Column('last_error', sa.String(length=200), nullable=True),
+            sa.Column('run_after', sa.DateTime(), nullable=True),
+            sa.Column('created_at', sa.DateTime(), nullable=True),
+            sa.Column('updated_at', sa.DateTime(), nullable=True),
+            sa.ForeignKeyConstraint(['user_id'], ['user.id'], name='fk_description_job_user_id', ondelete='CASCADE'),
+            sa.PrimaryKeyConstraint('id'),
+        )
+    op.create_index('ix_description_job_status_run_after', 'description_job', ['status', 'run_after'],
+                    unique=False, if_not_exists=True)
+
+    if not inspector.has_table('llm_call'):
+        op.create_table(
+            'llm_call',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('rest_id', sa.Integer(), nullable=True),
+            sa.Column('user_id', sa.Integer(), nullable=True),
+            sa.Column('session_id', sa.Integer(), nullable=True),
+            sa.Column('purpose', sa.String(length=20), nullable=False),
+            sa.Column('model', sa.String(length=40), nullable=True),
+            sa.Column('prompt_tokens', sa.Integer(), nullable=True),
+            sa.Column('completion_tokens', sa.Integer(), nullable=True),
+            sa.Column('cached_tokens', sa.Integer(), nullable=True),
+            sa.Column('wall_ms', sa.Float(), nullable=False),
+            sa.Column('ttft_ms', sa.Float(), nullable=True),
+            sa.Column('status', sa.String(length=10), nullable=False),
+            sa.Column('error', sa.String(length=200), nullable=True),
+            sa.Column('created_at', sa.DateTime(), nullable=True),
+            sa.PrimaryKeyConstraint('id'),
+        )
+    op.create_index('ix_llm_call_created_at_rest_id', 'llm_call', ['created_at', 'rest_id'],
+                    unique=False, if_not_exists=True)
+
+
+def downgrade():
+    op.drop_index('ix_llm_call_created_at_rest_id', table_name='llm_call', if_exists=True)
+    op.drop_table('llm_call')
+    op.drop_index('ix_description_job_status_run_after', table_name='description_job', if_exists=True)
+    op.drop_table('description_job')
+    op.drop_table('conversation_summary')
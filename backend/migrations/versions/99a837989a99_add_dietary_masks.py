@@ -0,0 +1,60 @@
+"""add dietary masks
+
+dish.dietary_mask and preferences.dietary_mask pack the boolean dietary flags into one integer
+(app/dietary.py). Existing rows are backfilled from their flags. The bits are copied here
+rather than imported so this revision keeps working if app/dietary.py changes. Databases created
+with db.create_all() already have the columns; they are only backfilled.
+
+Revision ID: 99a837989a99
+Revises: 44633b3d2d95
+Create Date: 2026-10-19 09:20:07.264519
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '99a837989a99'
+down_revision = '44633b3d2d95'
+branch_labels = None
+depends_on = None
+
+
+# column -> bit, as in app/dietary.py when this revision was written
+DISH_FLAGS = {
+    'is_lactose_free': 1 << 0,
+    'is_halal': 1 << 1,
+    'is_vegan': 1 << 2,
+    'is_vegetarian': 1 << 3,
+    'is_gluten_free': 1 << 4,
+    'is_jain': 1 << 5,
+    'is_soy_free': 1 << 6,
+}
+PREFERENCE_FLAGS = {
+    'is_lactose_intolerant': 1 << 0,
+    'is_halal': 1 << 1,
+    'is_vegan': 1 << 2,
+    'is_vegetarian': 1 << 3,
+    'is_allergic_to_gluten': 1 << 4,
+    'is_jain': 1 << 5,
+}
+TABLES = [('dish', DISH_FLAGS), ('preferences', PREFERENCE_FLAGS)]
+
+
+def upgrade():
+    connection = op.get_bind()
+    inspector = sa.inspect(connection)
+    for name, flags in TABLES:
+        if 'dietary_mask' not in {column['name'] for column in inspector.get_columns(name)}:
+            op.add_column(name, sa.Column('dietary_mask', sa.Integer(), nullable=False, server_default='0'))
+        table = sa.table(name, sa.column('dietary_mask', sa.Integer),
+                         *(sa.column(flag, sa.Boolean) for flag in flags))
+        mask = sum(sa.case((table.c[flag] == sa.true(), bit), else_=0) for flag, bit in flags.items())
+        connection.execute(table.update().values(dietary_mask=mask))
+
+
+def downgrade():
+    for name, _ in reversed(TABLES):
+        with op.batch_alter_table(name) as batch_op:
+            batch_op.drop_column('dietary_mask')
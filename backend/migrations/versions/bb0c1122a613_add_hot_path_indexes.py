@@ -0,0 +1,39 @@
+"""add hot path indexes
+
+Composite indexes for the columns the chat, cart and order routes filter on. Databases created
+with db.create_all() before this revision have none of them; newer ones already do, hence
+if_not_exists.
+
+Revision ID: bb0c1122a613
+Revises: 
+Create Date: 2026-10-18 18:22:05.907864
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'bb0c1122a613'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+INDEXES = [
+    ('ix_conversation_user_rest_session', 'conversation', ['user_id', 'rest_id', 'session_id']),
+    ('ix_orders_restaurant_id_status', 'orders', ['restaurant_id', 'status']),
+    ('ix_cart_session_id_user_id', 'cart', ['session_id', 'user_id']),
+    ('ix_cart_items_cart_id_dish_id', 'cart_items', ['cart_id', 'dish_id']),
+    ('ix_dish_restaurant_id', 'dish', ['restaurant_id']),
+    ('ix_dish_menu_id', 'dish', ['menu_id']),
+]
+
+
+def upgrade():
+    for name, table, columns in INDEXES:
+        op.create_index(name, table, columns, unique=False, if_not_exists=True)
+
+
+def downgrade():
+    for name, table, _ in reversed(INDEXES):
+        op.drop_index(name, table_name=table, if_exists=True)
@@ -0,0 +1,32 @@
+"""add restaurant menu_encoding
+
+How the menu is written into the chat prompt: 'verbose' (the original text) or 'compact'.
+Existing restaurants keep 'verbose'. Databases created with db.create_all() already have the
+column, so it is only added when missing.
+
+Revision ID: fc57304ed00f
+Revises: 99a837989a99
+Create Date: 2026-10-19 09:27:53.840117
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'fc57304ed00f'
+down_revision = '99a837989a99'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    columns = {column['name'] for column in sa.inspect(op.get_bind()).get_columns('restaurant')}
+    if 'menu_encoding' not in columns:
+        op.add_column('restaurant', sa.Column('menu_encoding', sa.String(length=10), nullable=False,
+                                              server_default='verbose'))
+
+
+def downgrade():
+    with op.batch_alter_table('restaurant') as batch_op:
+        batch_op.drop_column('menu_encoding')
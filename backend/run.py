@@ -1,11 +1,11 @@
 from app import db,app
-from sqlalchemy import text
+from app.functions import sync_dietary_masks
 
 
 if __name__ == "__main__":
     with app.app_context():
-        
-        with db.engine.connect() as connection:
-            connection.execute(text("PRAGMA foreign_keys = ON"))
+        # Foreign keys and the other SQLite pragmas are set per connection (app/sqlite_tuning.py)
         db.create_all()
+        sync_dietary_masks()
+    # The description workers start with the first request served (DESCRIPTION_WORKERS_ENABLED)
     app.run(debug=True)
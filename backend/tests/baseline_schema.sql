@@ -0,0 +1,181 @@
+-- Tables db.create_all() made on SQLite before the first migration, for tests/test_migrations.py
+
+CREATE TABLE restaurant (
+	id INTEGER NOT NULL, 
+	banner VARCHAR(100), 
+	profile_photo VARCHAR(100), 
+	password VARCHAR(120) NOT NULL, 
+	name VARCHAR(50) NOT NULL, 
+	address VARCHAR(120) NOT NULL, 
+	phone VARCHAR(12) NOT NULL, 
+	email VARCHAR(40) NOT NULL, 
+	cuisine VARCHAR(50) NOT NULL, 
+	rating FLOAT, 
+	is_vegan BOOLEAN, 
+	is_vegetarian BOOLEAN, 
+	is_halal BOOLEAN, 
+	description VARCHAR(200), 
+	PRIMARY KEY (id), 
+	UNIQUE (phone), 
+	UNIQUE (email)
+);
+
+CREATE TABLE user (
+	id INTEGER NOT NULL, 
+	name VARCHAR(80) NOT NULL, 
+	phone VARCHAR(15), 
+	password VARCHAR(120), 
+	email VARCHAR(60), 
+	user_description VARCHAR(200), 
+	profile_photo VARCHAR(100), 
+	PRIMARY KEY (id), 
+	UNIQUE (phone), 
+	UNIQUE (password), 
+	UNIQUE (email)
+);
+
+CREATE TABLE favorites (
+	id INTEGER NOT NULL, 
+	user_id INTEGER NOT NULL, 
+	restaurant_id INTEGER NOT NULL, 
+	category VARCHAR(20), 
+	PRIMARY KEY (id), 
+	CONSTRAINT fk_favorites_user_id FOREIGN KEY(user_id) REFERENCES user (id) ON DELETE CASCADE, 
+	CONSTRAINT fk_favorites_restaurant_id FOREIGN KEY(restaurant_id) REFERENCES restaurant (id) ON DELETE CASCADE
+);
+
+CREATE TABLE menu (
+	id INTEGER NOT NULL, 
+	menu_type VARCHAR(20) NOT NULL, 
+	restaurant_id INTEGER NOT NULL, 
+	PRIMARY KEY (id), 
+	CONSTRAINT fk_menu_restaurant_id FOREIGN KEY(restaurant_id) REFERENCES restaurant (id)
+);
+
+CREATE TABLE orders (
+	id INTEGER NOT NULL, 
+	user_id INTEGER NOT NULL, 
+	restaurant_id INTEGER NOT NULL, 
+	session_id INTEGER NOT NULL, 
+	status BOOLEAN NOT NULL, 
+	order_status INTEGER, 
+	total_cost FLOAT, 
+	timestamp DATETIME, 
+	PRIMARY KEY (id), 
+	CONSTRAINT fk_orders_user_id FOREIGN KEY(user_id) REFERENCES user (id) ON DELETE CASCADE, 
+	CONSTRAINT fk_orders_restaurant_id FOREIGN KEY(restaurant_id) REFERENCES restaurant (id) ON DELETE CASCADE, 
+	UNIQUE (session_id)
+);
+
+CREATE TABLE preferences (
+	id INTEGER NOT NULL, 
+	user_id INTEGER NOT NULL, 
+	preference VARCHAR(120) NOT NULL, 
+	is_lactose_intolerant BOOLEAN, 
+	is_halal BOOLEAN, 
+	is_vegan BOOLEAN, 
+	is_vegetarian BOOLEAN, 
+	is_allergic_to_gluten BOOLEAN, 
+	is_jain BOOLEAN, 
+	PRIMARY KEY (id), 
+	CONSTRAINT fk_preferences_user_id FOREIGN KEY(user_id) REFERENCES user (id) ON DELETE CASCADE
+);
+
+CREATE TABLE review (
+	id INTEGER NOT NULL, 
+	user_id INTEGER NOT NULL, 
+	restaurant_id INTEGER NOT NULL, 
+	comment VARCHAR(200), 
+	rating INTEGER NOT NULL, 
+	PRIMARY KEY (id), 
+	CONSTRAINT fk_review_user_id FOREIGN KEY(user_id) REFERENCES user (id) ON DELETE CASCADE, 
+	CONSTRAINT fk_review_restaurant_id FOREIGN KEY(restaurant_id) REFERENCES restaurant (id) ON DELETE CASCADE
+);
+
+CREATE TABLE theme (
+	restaurant_id INTEGER NOT NULL, 
+	id INTEGER NOT NULL, 
+	bgcolor VARCHAR(50), 
+	accentcolor1 VARCHAR(50), 
+	accentcolor2 VARCHAR(50), 
+	logo1 VARCHAR(100), 
+	logo2 VARCHAR(100), 
+	PRIMARY KEY (id), 
+	CONSTRAINT fk_theme_restaurant_id FOREIGN KEY(restaurant_id) REFERENCES restaurant (id) ON DELETE CASCADE
+);
+
+CREATE TABLE cart (
+	id INTEGER NOT NULL, 
+	user_id INTEGER NOT NULL, 
+	session_id INTEGER NOT NULL, 
+	total_cost FLOAT, 
+	PRIMARY KEY (id), 
+	CONSTRAINT fk_cart_user_id FOREIGN KEY(user_id) REFERENCES user (id) ON DELETE CASCADE, 
+	CONSTRAINT fk_cart_session_id FOREIGN KEY(session_id) REFERENCES orders (session_id) ON DELETE CASCADE
+);
+
+CREATE TABLE conversation (
+	id INTEGER NOT NULL, 
+	user_id INTEGER NOT NULL, 
+	rest_id INTEGER NOT NULL, 
+	role VARCHAR(20) NOT NULL, 
+	content VARCHAR(50) NOT NULL, 
+	session_id INTEGER NOT NULL, 
+	created_at DATETIME, 
+	dish_ids BLOB, 
+	PRIMARY KEY (id), 
+	CONSTRAINT fk_chat_history_user_id FOREIGN KEY(user_id) REFERENCES user (id) ON DELETE CASCADE, 
+	CONSTRAINT fk_chat_history_rest_id FOREIGN KEY(rest_id) REFERENCES restaurant (id) ON DELETE CASCADE, 
+	CONSTRAINT fk_chat_history_session_id FOREIGN KEY(session_id) REFERENCES orders (session_id) ON DELETE CASCADE
+);
+
+CREATE TABLE dish (
+	id INTEGER NOT NULL, 
+	dish_name VARCHAR(100) NOT NULL, 
+	restaurant_id INTEGER NOT NULL, 
+	favorites_id INTEGER, 
+	menu_id INTEGER, 
+	description VARCHAR(200), 
+	price FLOAT, 
+	protein FLOAT, 
+	fat FLOAT, 
+	energy FLOAT, 
+	carbs FLOAT, 
+	is_lactose_free BOOLEAN, 
+	is_halal BOOLEAN, 
+	is_vegan BOOLEAN, 
+	is_vegetarian BOOLEAN, 
+	is_gluten_free BOOLEAN, 
+	is_jain BOOLEAN, 
+	is_soy_free BOOLEAN, 
+	is_available BOOLEAN, 
+	image VARCHAR(100), 
+	rating INTEGER, 
+	PRIMARY KEY (id), 
+	CONSTRAINT fk_dish_restaurant_id FOREIGN KEY(restaurant_id) REFERENCES restaurant (id) ON DELETE CASCADE, 
+	FOREIGN KEY(favorites_id) REFERENCES favorites (id) ON DELETE CASCADE, 
+	CONSTRAINT fk_dish_menu_id FOREIGN KEY(menu_id) REFERENCES menu (id)
+);
+
+CREATE TABLE cart_items (
+	id INTEGER NOT NULL, 
+	cart_id INTEGER NOT NULL, 
+	dish_id INTEGER NOT NULL, 
+	quantity INTEGER NOT NULL, 
+	price FLOAT NOT NULL, 
+	PRIMARY KEY (id), 
+	CONSTRAINT fk_cart_id FOREIGN KEY(cart_id) REFERENCES cart (id) ON DELETE CASCADE, 
+	CONSTRAINT fk_cart_dish_name FOREIGN KEY(dish_id) REFERENCES dish (id)
+);
+
+CREATE TABLE order_items (
+	id INTEGER NOT NULL, 
+	order_id INTEGER NOT NULL, 
+	dish_id INTEGER NOT NULL, 
+	quantity INTEGER NOT NULL, 
+	price FLOAT NOT NULL, 
+	order_time DATETIME, 
+	PRIMARY KEY (id), 
+	FOREIGN KEY(order_id) REFERENCES orders (id) ON DELETE CASCADE, 
+	FOREIGN KEY(dish_id) REFERENCES dish (id)
+);
@@ -0,0 +1,35 @@
+import os
+import tempfile
+
+# The app reads its configuration from the environment at import time
+_directory = tempfile.TemporaryDirectory()
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_directory.name, 'tests.sqlite3')}"
+os.environ.pop("DATABASE_REPLICA_URL", None)
+os.environ["QUERY_PROFILER"] = "1"
+os.environ["DESCRIPTION_WORKERS_ENABLED"] = "0"
+
+from contextlib import contextmanager
+import pytest
+from flask import g
+from app import app as flask_app, db
+
+
+@pytest.fixture
+def app():
+    """The app on an empty database, in an app context."""
+    with flask_app.app_context():
+        db.create_all()
+        yield flask_app
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture
+def query_profile(app):
+    """Profile the statements run inside a block as the request profiler (app/query_profiler.py) does."""
+    @contextmanager
+    def profile():
+        with app.test_request_context():
+            app.preprocess_request()
+            yield g.query_profile
+    return profile
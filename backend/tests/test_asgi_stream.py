@@ -0,0 +1,39 @@
+import asyncio
+import asgi
+from app.reply_parser import ChatReply
+
+
+def relay(app, monkeypatch, events):
+    finished = []
+
+    async def chat_stream(*args):
+        for event in events:
+            yield event
+        finished.append(True)
+
+    sent = []
+
+    async def send(message):
+        sent.append(message["body"].decode())
+
+    monkeypatch.setattr(asgi, "chatbot_chat_stream_async", chat_stream)
+    with app.app_context():
+        asyncio.run(asgi._relay_events(send, 1, 1, 9200, "hello"))
+    return "".join(sent), bool(finished)
+
+
+def test_stream_error_keeps_its_details_out_of_the_response(app, monkeypatch):
+    body, _ = relay(app, monkeypatch, [("text", "Try the "), ("error", "password authentication failed for user app")])
+    assert 'event: error\ndata: {"message": "Error with chat"}' in body
+    assert "password" not in body
+
+
+def test_failed_dish_lookup_still_lets_the_turn_finish(app, monkeypatch):
+    def broken_dish_cards(dish_ids):
+        raise RuntimeError("no such table: dish")
+
+    monkeypatch.setattr(asgi, "get_dish_cards", broken_dish_cards)
+    reply = ChatReply("Try these.", (1, 2), "", True)
+    body, finished = relay(app, monkeypatch, [("text", "Try these."), ("dishes", (1, 2)), ("done", reply)])
+    assert 'data: {"message": "Error processing chat"}' in body and "no such table" not in body
+    assert finished
@@ -0,0 +1,51 @@
+"""How many SQL queries one chat turn issues before the model is called."""
+import pytest
+from app import db
+from app.models import Order, Conversation
+from app.chat_context import load_chat_context
+from app.menu_cache import clear_menu_prompt_cache
+from ai import build_chat_messages
+from benchmarks.common import seed_restaurant, seed_user
+
+# Queries allowed for the context and for prompt assembly, per menu cache state. A cold cache
+# builds the dish index and at most two menu texts (menus, then their dishes, for each).
+CONTEXT_QUERIES = 2
+PROMPT_QUERIES = {"cold": 5, "warm": 0}
+TURNS = 6
+
+
+def seed_session(user_id, rest_id, session_id):
+    db.session.add(Order(user_id=user_id, restaurant_id=rest_id, session_id=session_id, status=True))
+    db.session.flush()
+    for i in range(TURNS):
+        db.session.add(Conversation(user_id=user_id, rest_id=rest_id, session_id=session_id, role="user",
+                                    content=f"Question {i}"))
+        db.session.add(Conversation(user_id=user_id, rest_id=rest_id, session_id=session_id, role="assistant",
+                                    content=f"Answer {i}", dish_ids=[1, 2]))
+    db.session.commit()
+
+
+@pytest.mark.parametrize("n_dishes, encoding", [(40, "verbose"), (40, "compact"), (200, "verbose")],
+                         ids=["verbose", "compact", "retrieval"])
+def test_chat_turn_query_budget(app, query_profile, n_dishes, encoding):
+    user_id = seed_user(is_vegetarian=True).id
+    rest = seed_restaurant(n_dishes)
+    rest.menu_encoding = encoding
+    db.session.commit()
+    rest_id, session_id = rest.id, 1000 + rest.id
+    seed_session(user_id, rest_id, session_id)
+    db.session.expunge_all()
+    clear_menu_prompt_cache()
+
+    for cache_state in ("cold", "warm"):
+        with query_profile() as profile:
+            context = load_chat_context(user_id, rest_id, session_id)
+            context_queries = profile["count"]
+            messages, _ = build_chat_messages(context, "Something vegetarian please", client=None)
+            prompt_queries = profile["count"] - context_queries
+        db.session.expunge_all()
+
+        assert context_queries <= CONTEXT_QUERIES, cache_state
+        assert prompt_queries <= PROMPT_QUERIES[cache_state], cache_state
+        assert len(context.messages) == TURNS * 2
+        assert messages[-1]["content"] == "Something vegetarian please"
@@ -0,0 +1,8 @@
+import pytest
+from benchmarks import chat_load
+
+
+@pytest.mark.load
+@pytest.mark.parametrize("server", ["asgi", "wsgi"])
+def test_chat_routes_hold_up_under_load(app, server):
+    assert chat_load.main(["--server", server, "--chats", "40", "--concurrency", "10", "--profile", "instant"]) == 0
@@ -0,0 +1,68 @@
+import asyncio
+from types import SimpleNamespace
+import pytest
+import ai
+from flask_jwt_extended import create_access_token
+from app import db
+from app.models import Conversation, Order
+from benchmarks.common import seed_restaurant, seed_user
+
+PARTIAL = ['{"text": "Try the ', 'paneer curry']
+
+
+def chunk(content):
+    return SimpleNamespace(usage=None, choices=[SimpleNamespace(delta=SimpleNamespace(content=content))])
+
+
+def broken_stream(*args, **kwargs):
+    for content in PARTIAL:
+        yield chunk(content)
+    raise ConnectionError("connection reset")
+
+
+async def broken_stream_async(*args, **kwargs):
+    for content in PARTIAL:
+        yield chunk(content)
+    raise ConnectionError("connection reset")
+
+
+@pytest.fixture
+def session(app):
+    user_id, rest_id = seed_user().id, seed_restaurant(5).id
+    db.session.add(Order(user_id=user_id, restaurant_id=rest_id, session_id=9100, status=True))
+    db.session.commit()
+    return user_id, rest_id, 9100
+
+
+async def collect(events):
+    return [event async for event in events]
+
+
+@pytest.mark.parametrize("run", ["sync", "async"])
+def test_stream_cut_short_keeps_the_turn(app, session, monkeypatch, run):
+    monkeypatch.setattr(ai, "resilient_stream", broken_stream)
+    monkeypatch.setattr(ai, "resilient_stream_async", broken_stream_async)
+    user_id, rest_id, session_id = session
+    question = "Something warm for a cold evening?"
+    if run == "sync":
+        events = list(ai.chatbot_chat_stream(user_id, rest_id, question, session_id, "test"))
+    else:
+        events = asyncio.run(collect(ai.chatbot_chat_stream_async(user_id, rest_id, question, session_id, "test")))
+
+    assert events[-1][0] == "error"
+    db.session.expire_all()
+    turn = Conversation.query.filter_by(session_id=session_id).order_by(Conversation.id).all()
+    assert [(message.role, message.content) for message in turn] == [
+        ("user", question), ("assistant", "Try the paneer curry")]
+
+
+def test_stream_route_keeps_error_details_out_of_the_response(app, session, monkeypatch):
+    monkeypatch.setattr(ai, "resilient_stream", broken_stream)
+    monkeypatch.setitem(app.config, 'OPENAI_API_KEY', "test")
+    user_id, rest_id, session_id = session
+    token = create_access_token(identity=user_id, additional_claims={"role": "user"})
+    response = app.test_client().post(f"/api/chat/{rest_id}/stream", headers={"Authorization": f"Bearer {token}"},
+                                      json={"session_id": session_id, "user_input": "Something warm?"})
+    body = response.get_data(as_text=True)
+    assert 'event: error\ndata: {"message": "Error with chat"}' in body
+    assert "connection reset" not in body
@@ -0,0 +1,31 @@
+from datetime import timedelta
+from app import db
+from app.models import DescriptionJob
+from app.description_jobs import _now, claim_next_job, enqueue_description_job, requeue_stale_jobs
+from benchmarks.common import seed_user
+
+
+def test_claim_records_claim_time(app):
+    user_id = seed_user().id
+    enqueue_description_job(user_id)
+    db.session.commit()
+
+    job_id = claim_next_job()
+    job = db.session.get(DescriptionJob, job_id)
+    assert job.status == 'running' and job.claimed_at is not None
+
+
+def test_requeue_only_takes_expired_leases(app):
+    lease = timedelta(seconds=app.config['DESCRIPTION_JOB_LEASE_TIMEOUT'])
+    claims = {"live": _now(), "expired": _now() - lease * 2, "unclaimed": None}
+    job_ids = {}
+    for name, claimed_at in claims.items():
+        job = DescriptionJob(user_id=seed_user().id, status='running', claimed_at=claimed_at)
+        db.session.add(job)
+        db.session.commit()
+        job_ids[name] = job.id
+
+    assert requeue_stale_jobs() == 2
+    db.session.expire_all()
+    statuses = {name: db.session.get(DescriptionJob, job_id).status for name, job_id in job_ids.items()}
+    assert statuses == {"live": 'running', "expired": 'pending', "unclaimed": 'pending'}
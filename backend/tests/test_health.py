@@ -0,0 +1,18 @@
+from sqlalchemy.exc import OperationalError
+from app import db
+
+
+def test_health_hides_database_errors(app, monkeypatch):
+    def unreachable(*args, **kwargs):
+        raise OperationalError("SELECT 1", {}, Exception("password authentication failed for user app"))
+
+    monkeypatch.setattr(db.session, "execute", unreachable)
+    response = app.test_client().get("/api/health")
+    assert response.status_code == 503
+    assert response.get_json()["database"] == "unavailable"
+    assert "password" not in response.get_data(as_text=True)
+
+
+def test_health_is_ok_with_a_database(app):
+    response = app.test_client().get("/api/health")
+    assert response.status_code == 200 and response.get_json()["database"] == "ok"
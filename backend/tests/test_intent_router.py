@@ -0,0 +1,23 @@
+import pytest
+from app.intent_router import route_chat
+from benchmarks.common import seed_restaurant, seed_user
+
+
+@pytest.fixture
+def diner(app):
+    """A diner without restrictions and a restaurant with 60 available dishes on its menus."""
+    return seed_user().id, seed_restaurant(60).id
+
+
+def test_menu_over_the_cap_says_it_is_cut_short(app, diner, monkeypatch):
+    monkeypatch.setitem(app.config, 'INTENT_ROUTER_MAX_DISHES', 50)
+    reply = route_chat(*diner, "show me the menu")
+    assert len(reply.dish_ids) == 50
+    assert reply.text.startswith("There are more than 50 dishes on the menu")
+
+
+def test_menu_within_the_cap_is_complete(app, diner, monkeypatch):
+    monkeypatch.setitem(app.config, 'INTENT_ROUTER_MAX_DISHES', 60)
+    reply = route_chat(*diner, "show me the menu")
+    assert len(reply.dish_ids) == 60
+    assert reply.text == "Here is the menu based on your preferences:"
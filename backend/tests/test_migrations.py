@@ -0,0 +1,51 @@
+"""flask db upgrade on a database created before the first migration."""
+from pathlib import Path
+import pytest
+from alembic.autogenerate import compare_metadata
+from alembic.migration import MigrationContext
+from flask_migrate import upgrade
+from app import db
+from app.models import Dish, Preferences
+
+MIGRATIONS = Path(__file__).parents[1] / "migrations"
+BASELINE_SCHEMA = Path(__file__).with_name("baseline_schema.sql")
+
+
+def execute_script(script):
+    connection = db.engine.raw_connection()
+    try:
+        connection.driver_connection.executescript(script)
+        connection.commit()
+    finally:
+        connection.close()
+
+
+@pytest.fixture
+def baseline_db(app):
+    db.drop_all()
+    execute_script(BASELINE_SCHEMA.read_text())
+    yield
+    execute_script("DROP TABLE IF EXISTS alembic_version;")
+
+
+def test_upgrade_matches_models(baseline_db):
+    upgrade(directory=str(MIGRATIONS))
+    with db.engine.connect() as connection:
+        assert compare_metadata(MigrationContext.configure(connection), db.metadata) == []
+
+
+def test_upgrade_backfills_dietary_masks(baseline_db):
+    execute_script("""
+        INSERT INTO restaurant (id, password, name, address, phone, email, cuisine)
+            VALUES (1, 'x', 'Baseline', 'Street', '900', 'rest@example.com', 'Italian');
+        INSERT INTO dish (id, dish_name, restaurant_id, is_vegan, is_vegetarian, is_soy_free)
+            VALUES (1, 'Salad', 1, 1, 1, 1);
+        INSERT INTO dish (id, dish_name, restaurant_id) VALUES (2, 'Plain', 1);
+        INSERT INTO user (id, name, phone, password, email) VALUES (1, 'Diner', '800', 'x', 'user@example.com');
+        INSERT INTO preferences (id, user_id, preference, is_vegetarian, is_allergic_to_gluten)
+            VALUES (1, 1, 'none', 1, 1);
+    """)
+    upgrade(directory=str(MIGRATIONS))
+    masks = dict(db.session.query(Dish.id, Dish.dietary_mask))
+    assert masks == {1: 0b1001100, 2: 0}
+    assert db.session.query(Preferences.dietary_mask).scalar() == 0b11000
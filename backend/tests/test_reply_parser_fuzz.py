@@ -0,0 +1,112 @@
+"""Fuzz the chat reply parser with random, malformed and arbitrarily chunked model output.
+
+parse_reply and StreamingReplyParser must never raise, every way of chunking a reply must give
+the same result, and schema-valid replies must round-trip exactly.
+"""
+import json
+import random
+import pytest
+from app.reply_parser import ChatReply, StreamingReplyParser, parse_reply
+
+ITERATIONS = 2000
+
+_ALPHABET = 'abc XYZ 019 "\\/{}[]:,\n\té€\U0001f355'
+
+
+def random_text(rng):
+    length = rng.choice((0, 1, 5, 40, 300))
+    return "".join(rng.choice(_ALPHABET) for _ in range(length))
+
+
+def random_reply(rng):
+    reply = {"text": random_text(rng), "dishes": [{"dish_id": rng.randint(1, 10_000)} for _ in range(rng.randint(0, 8))]}
+    if rng.random() < 0.3:
+        # Key order and extra fields must not matter
+        reply = {"dishes": reply["dishes"], "note": {"nested": [1, "}"]}, "text": reply["text"]}
+    return reply, json.dumps(reply, ensure_ascii=rng.random() < 0.5, indent=rng.choice((None, 2)))
+
+
+def mutate(rng, raw):
+    raw = list(raw)
+    for _ in range(rng.randint(1, 4)):
+        action = rng.choice(("drop", "insert", "swap", "truncate"))
+        if not raw:
+            break
+        position = rng.randrange(len(raw))
+        if action == "drop":
+            del raw[position]
+        elif action == "insert":
+            raw.insert(position, rng.choice(_ALPHABET))
+        elif action == "swap":
+            raw[position] = rng.choice(_ALPHABET)
+        else:
+            del raw[position:]
+    return "".join(raw)
+
+
+def random_chunks(rng, raw):
+    chunks, position = [], 0
+    while position < len(raw):
+        size = rng.choice((1, 2, 3, 7, 64))
+        chunks.append(raw[position:position + size])
+        position += size
+    return chunks
+
+
+def stream(chunks):
+    parser = StreamingReplyParser()
+    text = []
+    dish_events = []
+    for chunk in chunks:
+        for event, value in parser.feed(chunk):
+            if event == "text":
+                text.append(value)
+            else:
+                dish_events.append(value)
+    reply = parser.close()
+    return reply, "".join(text), dish_events
+
+
+def check_valid(rng, failures):
+    expected, raw = random_reply(rng)
+    one_shot = parse_reply(raw)
+    whole, _, _ = stream([raw])
+    chunked, streamed_text, dish_events = stream(random_chunks(rng, raw))
+    expected_ids = tuple(dish["dish_id"] for dish in expected["dishes"])
+    for name, reply in (("parse_reply", one_shot), ("stream", whole), ("chunked stream", chunked)):
+        if not (reply.valid and reply.text == expected["text"] and reply.dish_ids == expected_ids):
+            failures.append((name, raw, reply))
+    if streamed_text != expected["text"] or dish_events != [expected_ids]:
+        failures.append(("stream events", raw, (streamed_text, dish_events)))
+
+
+def check_malformed(rng, failures):
+    _, raw = random_reply(rng)
+    raw = mutate(rng, raw) if rng.random() < 0.8 else random_text(rng)
+    try:
+        one_shot = parse_reply(raw)
+        whole, _, _ = stream([raw])
+        chunked, _, _ = stream(random_chunks(rng, raw))
+    except Exception as e:
+        failures.append(("exception", raw, repr(e)))
+        return
+    if not all(isinstance(reply, ChatReply) and isinstance(reply.text, str) for reply in (one_shot, whole, chunked)):
+        failures.append(("type", raw, one_shot))
+    if (whole.text, whole.dish_ids, whole.valid) != (chunked.text, chunked.dish_ids, chunked.valid):
+        failures.append(("chunking changed the result", raw, (whole, chunked)))
+    try:
+        data = json.loads(raw)
+    except ValueError:
+        data = None
+    if one_shot.valid and not (isinstance(data, dict) and data.get("text") == one_shot.text):
+        failures.append(("accepted invalid reply", raw, one_shot))
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_reply_parser_fuzz(seed):
+    rng = random.Random(seed)
+    failures = []
+    for _ in range(ITERATIONS):
+        check_valid(rng, failures)
+        check_malformed(rng, failures)
+    assert not [(name, raw[:120], f"{detail!r:.200}") for name, raw, detail in failures[:10]]
@@ -0,0 +1,57 @@
+import asyncio
+import threading
+import time
+import httpx
+import openai
+from app.resilience import _hedged, _hedged_async
+
+
+def timeout_error():
+    return openai.APITimeoutError(request=httpx.Request("POST", "/chat/completions"))
+
+
+def test_hedge_runs_first_call_inline(app):
+    threads = []
+
+    def call(timeout=None):
+        threads.append(threading.current_thread())
+        return "first"
+
+    assert _hedged(call, hedge_after=1.0, remaining=5.0) == "first"
+    time.sleep(1.2)
+    assert threads == [threading.current_thread()]
+
+
+def test_hedge_answers_when_first_call_fails(app):
+    calls = []
+
+    def call(timeout=None):
+        calls.append(threading.current_thread().name)
+        if len(calls) == 1:
+            time.sleep(0.2)
+            raise timeout_error()
+        return "hedge"
+
+    assert _hedged(call, hedge_after=0.05, remaining=5.0) == "hedge"
+    assert calls[1].startswith("llm-hedge")
+
+
+def test_async_hedge_takes_first_answer_and_cancels_the_other(app):
+    cancelled = []
+
+    async def call(timeout=None):
+        # The first call gets the default timeout, the copy the time left
+        try:
+            await asyncio.sleep(1.0 if timeout is None else 0.01)
+        except asyncio.CancelledError:
+            cancelled.append("slow")
+            raise
+        return "hedge"
+
+    async def run():
+        result = await _hedged_async(call, hedge_after=0.05, remaining=5.0)
+        await asyncio.sleep(0)
+        return result
+
+    assert asyncio.run(run()) == "hedge"
+    assert cancelled == ["slow"]
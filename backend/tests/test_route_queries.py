@@ -0,0 +1,88 @@
+"""SQL issued by the read routes, counted by the request query profiler (app/query_profiler.py)."""
+import pytest
+from flask_jwt_extended import create_access_token
+from app import db
+from app.models import Order, OrderItem, Conversation, Favorites, Dish
+from app.query_profiler import query_profile_stats
+from benchmarks.common import seed_restaurant, seed_user
+
+ORDERS = 24
+TURNS = 10
+# Routes that still query once per row; remove an entry once its route is fixed
+KNOWN_N_PLUS_ONE = {
+    "GET /api/restaurant/orders",
+    "GET /api/get_active_orders",
+    "GET /api/get_menu",
+}
+# Statements per request for routes rebuilt on a fixed set of queries, independent of the seeded row counts
+QUERY_BUDGETS = {
+    "GET /api/user/get": 5,
+    "GET /api/chat/<int:rest_id>/session/<string:session_id>": 2,
+    "GET /api/restaurant/recommendations": 1,
+}
+
+
+def seed():
+    restaurants = [seed_restaurant(30, seed=i) for i in range(3)]
+    user = seed_user(is_vegetarian=True)
+    dishes = Dish.query.filter_by(restaurant_id=restaurants[0].id).all()
+    for i in range(ORDERS):
+        rest = restaurants[i % len(restaurants)]
+        order = Order(user_id=user.id, restaurant_id=rest.id, session_id=7000 + i, status=True, total_cost=10.0)
+        db.session.add(order)
+        db.session.flush()
+        for dish in dishes[:3]:
+            db.session.add(OrderItem(order_id=order.id, dish_id=dish.id, quantity=1, price=dish.price))
+    for rest in restaurants:
+        favorite = Favorites(user_id=user.id, restaurant_id=rest.id, category="dish")
+        db.session.add(favorite)
+        db.session.flush()
+        for dish in Dish.query.filter_by(restaurant_id=rest.id).limit(3):
+            dish.favorites_id = favorite.id
+    for i in range(TURNS):
+        db.session.add(Conversation(user_id=user.id, rest_id=restaurants[0].id, session_id=7000, role="user",
+                                    content=f"Question {i}", dish_ids=[]))
+        db.session.add(Conversation(user_id=user.id, rest_id=restaurants[0].id, session_id=7000, role="assistant",
+                                    content=f"Answer {i}", dish_ids=[dish.id for dish in dishes[i:i + 4]]))
+    db.session.commit()
+    return user.id, restaurants[0].id
+
+
+@pytest.fixture
+def route_stats(app):
+    """Call every read route once on seeded data and return the profiler's per route stats."""
+    user_id, rest_id = seed()
+    user_token = create_access_token(identity=str(user_id))
+    rest_token = create_access_token(identity=str(rest_id), additional_claims={"role": "restaurant"})
+    calls = [
+        (user_token, "/api/user/get"),
+        (user_token, f"/api/chat/{rest_id}/session/7000"),
+        (user_token, f"/api/chat/{rest_id}/session/7000?since_message_id={TURNS * 2 - 4}"),
+        (user_token, f"/api/favorites/{rest_id}"),
+        (None, f"/api/restaurant/landing/{rest_id}"),
+        (rest_token, "/api/get_menu"),
+        (rest_token, "/api/get_all_dishes"),
+        (rest_token, "/api/get_active_orders"),
+        (rest_token, "/api/restaurant/orders"),
+        (rest_token, "/api/restaurant/recommendations"),
+    ]
+    query_profile_stats(reset=True)
+    client = app.test_client()
+    for token, path in calls:
+        headers = {"Authorization": f"Bearer {token}"} if token else {}
+        response = client.get(path, headers=headers)
+        assert response.status_code == 200, path
+    return query_profile_stats(reset=True)
+
+
+def test_no_new_n_plus_one(route_stats):
+    new = {route: stats["suspects"][0] for route, stats in route_stats.items()
+           if stats["suspects"] and route not in KNOWN_N_PLUS_ONE}
+    assert not new
+
+
+def test_route_query_budgets(route_stats):
+    assert QUERY_BUDGETS.keys() <= route_stats.keys()
+    over = {route: route_stats[route]["max_queries"] for route, budget in QUERY_BUDGETS.items()
+            if route_stats[route]["max_queries"] > budget}
+    assert not over
@@ -0,0 +1,59 @@
+import pytest
+from flask_jwt_extended import create_access_token
+from app import db
+from app.models import LLMCall, Order, Conversation, Dish
+from benchmarks.common import seed_restaurant, seed_user
+
+
+@pytest.fixture
+def tokens(app):
+    return {
+        "user": create_access_token(identity=1, additional_claims={"role": "user"}),
+        "restaurant": create_access_token(identity=1, additional_claims={"role": "restaurant"}),
+        "admin": create_access_token(identity=1, additional_claims={"role": "admin"}),
+    }
+
+
+def get(app, path, token):
+    return app.test_client().get(path, headers={"Authorization": f"Bearer {token}"})
+
+
+@pytest.mark.parametrize("path, allowed", [
+    ("/api/chat/cache_stats", {"admin"}),
+    ("/api/debug/query_stats", {"admin"}),
+    ("/api/chat/llm_stats", {"restaurant", "admin"}),
+])
+def test_stats_answer_403_to_roles_not_allowed(app, tokens, path, allowed):
+    for role, token in tokens.items():
+        assert get(app, path, token).status_code == (200 if role in allowed else 403), role
+
+
+def test_llm_stats_of_a_restaurant_only_cover_its_own_calls(app, tokens):
+    db.session.add_all([LLMCall(rest_id=rest_id, purpose="chat", wall_ms=100.0) for rest_id in (1, 1, 2)])
+    db.session.commit()
+
+    own = get(app, "/api/chat/llm_stats", tokens["restaurant"]).get_json()
+    assert list(own["restaurants"]) == ["1"] and own["restaurants"]["1"]["calls"] == 2
+    every = get(app, "/api/chat/llm_stats", tokens["admin"]).get_json()
+    assert sorted(every["restaurants"]) == ["1", "2"]
+    one = get(app, "/api/chat/llm_stats?rest_id=2", tokens["admin"]).get_json()
+    assert list(one["restaurants"]) == ["2"]
+
+
+def test_recommendations_are_for_the_restaurant_itself(app, tokens):
+    rest_ids = [seed_restaurant(5, seed=i).id for i in range(2)]
+    user_id = seed_user().id
+    recommended = {}
+    for rest_id in rest_ids:
+        db.session.add(Order(user_id=user_id, restaurant_id=rest_id, session_id=9000 + rest_id, status=True))
+        db.session.flush()
+        dish_ids = recommended[rest_id] = [dish.id for dish in Dish.query.filter_by(restaurant_id=rest_id).limit(2)]
+        db.session.add(Conversation(user_id=user_id, rest_id=rest_id, session_id=9000 + rest_id, role="assistant",
+                                    content="Try these.", dish_ids=dish_ids))
+    db.session.commit()
+
+    assert get(app, "/api/restaurant/recommendations", tokens["user"]).status_code == 403
+    assert get(app, "/api/restaurant/recommendations", tokens["admin"]).status_code == 403
+    response = get(app, "/api/restaurant/recommendations", tokens["restaurant"])
+    assert response.status_code == 200
+    assert {dish["dish_id"] for dish in response.get_json()["dishes"]} == set(recommended[rest_ids[0]])